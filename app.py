@@ -1,32 +1,89 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, Response
+from flask.json.provider import DefaultJSONProvider
+from collections.abc import Mapping
 import os
 import json
+import logging
 import io
 import hashlib
 import time
+import threading
 from grafo import GrafoOlx
+from listing_arrow import preferred_data_file
+from ingest import normalize_listing_id
 from interactive_graph import create_interactive_graph
+from response_cache import ResponseCache
+from render_cache import RenderCache
+from jobs import JobScheduler
+from graph_tiles import MAX_VIEWPORT_NODES
+from listing_json import parse_fields
+from export import EXPORT_FORMATS, export_listings, export_edges, gzip_chunks
+from listing_query import LISTING_FILTERS, RANGE_FILTERS, LISTINGS_PAGE_SIZE, LISTINGS_MAX_PAGE_SIZE, InvalidCursor
+
+class ListingJSONProvider(DefaultJSONProvider):
+    # Serializa as visões de anúncios do ListingStore (e outros mapeamentos) como objetos JSON
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+# Nível dos logs pela variável LOG_LEVEL (sem efeito se o logging já foi configurado, como no wsgi.py)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = ListingJSONProvider(app)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 
 # Necessário fazer cache devido ao peso do grafo e das imagens
 CACHE_DIR = 'visualization_cache'
 CACHE_EXPIRY = 3600
-os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_MAX_BYTES = int(os.environ.get('VISUALIZATION_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+render_cache = RenderCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_EXPIRY)
+
+# Processos usados na construção do grafo (as máquinas de produção têm vários núcleos)
+BUILD_WORKERS = int(os.environ.get('GRAFO_BUILD_WORKERS', '1'))
+
+# Snapshots do grafo construído, reaproveitados enquanto os dados e parâmetros não mudam
+SNAPSHOT_DIR = 'graph_snapshots'
+
+# Algoritmo de comunidades: 'components' (padrão) ou 'label_propagation'
+COMMUNITY_METHOD = os.environ.get('GRAFO_COMMUNITY_METHOD', 'components')
+
+# Quantidade de anúncios similares pré-calculados por anúncio
+TOP_K = int(os.environ.get('GRAFO_TOP_K', '10'))
+
+# Respostas de /api/graph-data já serializadas e comprimidas, por filtros e versão do grafo
+graph_data_cache = ResponseCache(max_entries=int(os.environ.get('GRAPH_DATA_CACHE_ENTRIES', '64')))
+
+# Arquivo de anúncios: motos_data.arrow quando gerado pelo initial_populate (e o pyarrow está
+# instalado), senão motos_data.json; ou a saída bruta do spider em .jsonl
+DATA_FILE = os.environ.get('GRAFO_DATA_FILE') or preferred_data_file('motos_data.json')
+
+# Recálculos de layout, comunidades, índice de busca e respostas em cache fora das requisições
+jobs = JobScheduler()
 
 # Inicializa o grafo
-mg = GrafoOlx('motos_data.json')
+mg = GrafoOlx(DATA_FILE, workers=BUILD_WORKERS, snapshot_dir=SNAPSHOT_DIR, community_method=COMMUNITY_METHOD,
+              top_k=TOP_K, jobs=jobs)
+logger.info("Grafo carregado: %d anúncios, %d arestas", len(mg.listings), mg.G.number_of_edges())
+
+# Pronto para receber requisições (ver /readyz): marcado pelo wsgi.py depois do warm_up
+# ou pelo servidor de desenvolvimento abaixo
+graph_ready = threading.Event()
 
 @app.route('/')
 def index():
-    num_listings = len(mg.listings)
-    num_nodes = mg.G.number_of_nodes()
-    num_edges = mg.G.number_of_edges()
+    # Cada requisição lê um único estado publicado do grafo (ver GrafoOlx.view)
+    graph = mg.view()
+    num_listings = len(graph.listings)
+    num_nodes = graph.G.number_of_nodes()
+    num_edges = graph.G.number_of_edges()
     
-    # Obtém estados e marcas para filtragem
-    states = sorted(list(set([m['estado'] for m in mg.listings if m['estado']])))
-    brands = sorted(list(set([m['marca'] for m in mg.listings if m['marca']])))
+    # Obtém estados e marcas para filtragem (chaves dos índices por atributo)
+    states = sorted(state for state in graph.attribute_index('estado') if state)
+    brands = sorted(brand for brand in graph.attribute_index('marca') if brand)
     
     return render_template('index.html', 
                            num_listings=num_listings,
@@ -35,94 +92,111 @@ def index():
                            states=states,
                            brands=brands)
 
+def json_response(body, status=200):
+    # Corpo JSON já serializado (bytes), montado a partir dos fragmentos dos anúncios
+    return Response(body, status=status, mimetype='application/json')
+
+def requested_fields(default='card'):
+    # Projeção pedida em fields= ('card', 'full' ou campos separados por vírgula); None se inválida
+    try:
+        return parse_fields(request.args.get('fields'), default)
+    except ValueError:
+        return None
+
 @app.route('/listings')
 def get_listings():
-    state = request.args.get('state', '')
-    brand = request.args.get('brand', '')
-    
-    filtered_listings = mg.listings
-    
-    if state:
-        filtered_listings = [m for m in filtered_listings if m['estado'] == state]
-    
-    if brand:
-        filtered_listings = [m for m in filtered_listings if m['marca'] == brand]
-    
-    # Ordena por preço
-    filtered_listings = sorted(filtered_listings, key=lambda m: m.get('price_value', 0))
-    
-    # Mapeia 'imagens' para 'images' para consistência
-    for m in filtered_listings:
-        if 'imagens' in m and 'images' not in m:
-            m['images'] = m['imagens']
-    
-    return jsonify(filtered_listings)
+    # Filtros de igualdade (state, brand, model, year) e de intervalo (min_/max_ price, km, year)
+    filters = {name: request.args.get(name, '') for name in LISTING_FILTERS}
+    ranges = {name: (request.args.get(f'min_{name}', type=float), request.args.get(f'max_{name}', type=float))
+              for name in RANGE_FILTERS}
+    limit = min(max(request.args.get('limit', LISTINGS_PAGE_SIZE, type=int), 1), LISTINGS_MAX_PAGE_SIZE)
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Campos inválidos'}), 400
+    
+    # Página ordenada por preço; next_cursor pede a página seguinte
+    graph = mg.view()
+    try:
+        rows, next_cursor, total = graph.query_listings(filters, ranges, request.args.get('cursor') or None, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Cursor inválido'}), 400
+    
+    dumps = graph.listing_fragments.dumps
+    return json_response(b'{"listings":' + graph.listings_json(rows, fields) + b',"next_cursor":' + dumps(next_cursor)
+                         + b',"total":' + dumps(total) + b'}')
 
 @app.route('/listing/<int:listing_id>')
 def get_listing(listing_id):
-    # Converte listing_id para string para depuração
-    str_id = str(listing_id)
-   
-    # Agora tenta a busca regular
-    for m in mg.listings:
-        # Tenta múltiplas comparações para capturar casos especiais
-        if m['listId'] == listing_id:
-            if 'imagens' in m and 'images' not in m:
-                m['images'] = m['imagens']
-            return jsonify(m)
-        elif str(m['listId']) == str_id:
-            if 'imagens' in m and 'images' not in m:
-                m['images'] = m['imagens']
-            return jsonify(m)
-    
-    return jsonify({'error': 'Anúncio não encontrado'}), 404
+    fields = requested_fields('full')
+    if fields is None:
+        return jsonify({'error': 'Campos inválidos'}), 400
+    graph = mg.view()
+    m = graph.get_listing(listing_id)
+    if m is None:
+        return jsonify({'error': 'Anúncio não encontrado'}), 404
+    
+    return json_response(graph.listing_json(m.row, fields))
 
 @app.route('/similar/<int:listing_id>')
 def get_similar(listing_id):
-    listing = None
-    for m in mg.listings:
-        if m['listId'] == listing_id or str(m['listId']) == str(listing_id):
-            listing = m
-            break
-    
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Campos inválidos'}), 400
+    graph = mg.view()
+    listing = graph.get_listing(listing_id)
     if not listing:
         return jsonify([])
         
-    similar = mg.get_similar_listings(listing['listId'])
+    similar = graph.get_similar_listings(listing['listId'])
     
-    full_similar = []
-    for s in similar:
-        for m in mg.listings:
-            if m['listId'] == s['id'] or str(m['listId']) == str(s['id']):
-                if 'imagens' in m and 'images' not in m:
-                    m['images'] = m['imagens']
-                
-                full_similar.append({**s, **m})
-                break
-    return jsonify(full_similar)
+    # Cada similar: id e similaridade seguidos dos campos do anúncio
+    rows = [graph.listing_index[normalize_listing_id(s['id'])] for s in similar]
+    extra = [{'id': s['id'], 'similarity': s['similarity']} for s in similar]
+    return json_response(graph.listings_json(rows, fields, extra))
 
 @app.route('/search')
 def search():
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Campos inválidos'}), 400
     query = request.args.get('q', '')
     if not query:
         return jsonify([])
     
-    results = mg.search_listings(query)
-    
-    valid_results = []
-    for result in results:
-        listing = result['listing']
-        listing_id = listing.get('listId')
-        
-        # Converte para string para comparação
-        str_id = str(listing_id)
-        
-        for m in mg.listings:
-            if m['listId'] == listing_id or str(m['listId']) == str_id:
-                result['listing'] = m
-                valid_results.append(result)
-                break
-    return jsonify(valid_results)
+    # Os resultados já referenciam os anúncios de graph.listings
+    graph = mg.view()
+    dumps = graph.listing_fragments.dumps
+    results = [b'{"listing":' + graph.listing_json(result['listing'].row, fields) + b',"similarity":'
+               + dumps(result['similarity']) + b'}' for result in graph.search_listings(query)]
+    return json_response(b'[' + b','.join(results) + b']')
+
+@app.route('/export/<dataset>')
+def export(dataset):
+    # Todos os anúncios (ou arestas) em NDJSON ou CSV, gerados em blocos; since=<versão> exporta só o delta
+    if dataset not in ('listings', 'edges'):
+        return jsonify({'error': 'Exportação inexistente'}), 404
+    fmt = request.args.get('format', 'ndjson')
+    fields = requested_fields('full')
+    if fmt not in EXPORT_FORMATS or fields is None:
+        return jsonify({'error': 'Formato ou campos inválidos'}), 400
+    
+    view = mg.export_view(request.args.get('since', type=int))
+    if view is None:
+        return jsonify({'error': 'Versão antiga demais para um delta; faça uma exportação completa'}), 410
+    
+    if dataset == 'listings':
+        chunks = export_listings(view, fmt, fields, mg.listing_fragments)
+    else:
+        chunks = export_edges(view, fmt, mg.listing_fragments.dumps)
+    headers = {
+        'X-Graph-Version': str(view.version),
+        'Content-Disposition': f'attachment; filename={dataset}.{fmt}',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.accept_encodings.best_match(['gzip']):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=EXPORT_FORMATS[fmt], headers=headers)
 
 @app.route('/visualize')
 def visualize():
@@ -135,14 +209,6 @@ def visualize():
     
     # Cria uma chave de cache a partir dos parâmetros da requisição
     cache_key = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
-    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.png")
-    
-    # Verifica se existe cache válida
-    if os.path.exists(cache_path):
-        cache_age = time.time() - os.path.getmtime(cache_path)
-        if cache_age < CACHE_EXPIRY:
-            # Retorna imagem salva em cache
-            return send_file(cache_path, mimetype='image/png')
     
     # Converte highlight_id para int se necessário
     if highlight_id and highlight_id.isdigit():
@@ -150,32 +216,40 @@ def visualize():
     else:
         highlight_id = None
     
-    # Gera a visualização
-    if visualization_type == 'graph':
-        plt = mg.create_interactive_graph_data(highlight_id=highlight_id, color_by=color_by)
-    elif visualization_type == 'state':
-        plt = mg.visualize_state_distribution()
-    elif visualization_type == 'brand':
-        plt = mg.visualize_brand_distribution()
-    elif visualization_type == 'price':
-        plt = mg.visualize_price_distribution()
-    else:
-        plt = mg.visualize_graph()
-    
-    # Salva em cache
-    plt.savefig(cache_path, format='png')
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    
-    plt.close()
+    def render():
+        # Gera a visualização uma única vez, direto em memória (o cache grava o arquivo);
+        # cada gráfico é uma Figure própria, então várias threads podem renderizar ao mesmo tempo
+        graph = mg.view()
+        if visualization_type == 'graph':
+            fig = graph.create_interactive_graph_data(highlight_id=highlight_id, color_by=color_by)
+        elif visualization_type == 'state':
+            fig = graph.visualize_state_distribution()
+        elif visualization_type == 'brand':
+            fig = graph.visualize_brand_distribution()
+        elif visualization_type == 'price':
+            fig = graph.visualize_price_distribution()
+        else:
+            fig = graph.visualize_graph()
+        
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        return buf.getvalue()
     
-    return send_file(buf, mimetype='image/png')
+    # Requisições simultâneas da mesma chave esperam uma única renderização
+    image = render_cache.get_or_render(cache_key, render)
+    return send_file(io.BytesIO(image), mimetype='image/png')
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    return jsonify({
+        'visualize': render_cache.stats(),
+        'graph_data': graph_data_cache.stats(),
+    })
 
 @app.route('/communities')
 def communities_page():
-    partition = mg.detect_communities()
+    graph = mg.view()
+    partition = graph.detect_communities()
     
     # Calcula estatísticas para cada comunidade
     communities = {}
@@ -183,7 +257,7 @@ def communities_page():
         if community_id not in communities:
             communities[community_id] = []
         
-        communities[community_id].append(mg.G.nodes[node])
+        communities[community_id].append(graph.G.nodes[node])
     
     # Ordena por tamanho (maior primeiro)
     sorted_communities = sorted(communities.items(), key=lambda x: len(x[1]), reverse=True)
@@ -201,52 +275,72 @@ def get_graph_data():
     brand = request.args.get('brand', '')
     color_by = request.args.get('color_by', 'community')
     
-    # Obtém os dados do grafo
-    graph_data = mg.create_interactive_graph_data(color_by)
+    graph = mg.view()
     
-    # Cria grafo interativo
-    fig, config = create_interactive_graph(graph_data, color_by)
+    def build():
+        # Obtém os dados do grafo e cria o grafo interativo
+        graph_data = graph.create_interactive_graph_data(color_by, state=state, brand=brand)
+        fig, config = create_interactive_graph(graph_data, color_by)
+        # Monta o JSON final direto do texto do Plotly, sem decodificar e codificar de novo
+        return ('{"graph":' + fig.to_json() + ',"config":' + json.dumps(config) + '}').encode('utf-8')
     
-    # Converte para JSON
-    graph_json = fig.to_json()
+    # O JSON é gerado e comprimido uma única vez por combinação de filtros e versão do grafo
+    # Após uma mudança no grafo a resposta anterior continua sendo servida enquanto a nova é gerada
+    cached = graph_data_cache.get_or_build((color_by, state, brand), graph.version, build, revalidate=jobs.submit)
     
+    if request.if_none_match.contains_weak(cached.etag):
+        response = Response(status=304)
+    else:
+        encodings = ['br', 'gzip'] if cached.brotli_body is not None else ['gzip']
+        encoding = request.accept_encodings.best_match(encodings)
+        response = Response(cached.body(encoding), mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(cached.etag, weak=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # O navegador guarda a resposta mas revalida sempre (o ETag muda quando o grafo muda)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/graph-viewport')
+def get_graph_viewport():
+    # Com meta=1 só o tamanho do grafo e o limite de nós, para a página decidir o modo sem baixar nós
+    graph = mg.view()
+    if request.args.get('meta', type=int):
+        return jsonify({'total_nodes': len(graph.listings), 'max_nodes': MAX_VIEWPORT_NODES, 'version': graph.version})
+    # Retângulo visível do layout (coordenadas omitidas = layout inteiro) e nível de zoom opcional
+    x0, y0, x1, y1 = (request.args.get(name, type=float) for name in ('x0', 'y0', 'x1', 'y1'))
+    zoom = request.args.get('zoom', type=int)
+    color_by = request.args.get('color_by', 'community')
+    return jsonify(graph.graph_viewport(x0, y0, x1, y1, zoom=zoom, color_by=color_by))
+
+@app.route('/readyz')
+def readyz():
+    # Usado pelo balanceador/orquestrador: 200 somente com o grafo carregado
+    if not graph_ready.is_set():
+        return jsonify({'status': 'loading'}), 503
+    graph = mg.view()
     return jsonify({
-        'graph': json.loads(graph_json),
-        'config': config
+        'status': 'ready',
+        'pid': os.getpid(),
+        'listings': len(graph.listings),
+        'edges': graph.G.number_of_edges(),
+        'version': graph.version,
     })
 
+@app.route('/api/jobs')
+def jobs_status():
+    # Recálculos em segundo plano: em execução, na fila e histórico de cada job
+    return jsonify({'version': mg.version, **jobs.status()})
+
 @app.route('/api/node/<int:node_id>')
 def get_node_info(node_id):
-    # Obter dados do nó
-    print(f"API - Buscando informações para nó ID: {node_id} (tipo: {type(node_id)})")
-    
-    # Verificar se o nó existe diretamente no grafo
-    node_exists = node_id in mg.G.nodes
-    print(f"Nó existe no grafo diretamente? {node_exists}")
-    
-    # Tentar conversão de string se necessário
-    str_id = str(node_id)
-    str_exists = any(str(n) == str_id for n in mg.G.nodes)
-    print(f"Nó existe como string? {str_exists}")
-    
-    # Mostrar alguns IDs de nós do grafo para depuração
-    node_sample = list(mg.G.nodes)[:5]
-    print(f"Amostra de IDs de nós no grafo: {node_sample} (tipos: {[type(n) for n in node_sample]})")
-    
-    # Se o nó não existe por ID direto, tentar encontrá-lo por comparação de string
-    if not node_exists:
-        for graph_node_id in mg.G.nodes:
-            if str(graph_node_id) == str_id:
-                print(f"Encontrado nó por comparação de string: {graph_node_id}")
-                node_id = graph_node_id  # Usar o ID do nó real do grafo
-                node_exists = True
-                break
-    
-    # Obter dados do nó com nós similares usando nossa implementação personalizada
-    node_data = mg.get_node_data_with_similar(node_id)
+    # Obter dados do nó com nós similares (a busca pelo id passa pelo índice de listIds)
+    logger.debug("API - Buscando informações para nó ID: %s", node_id)
+    node_data = mg.view().get_node_data_with_similar(node_id)
     
     if 'error' in node_data:
-        print(f"Erro ao obter dados do nó: {node_data['error']}")
+        logger.debug("Erro ao obter dados do nó %s: %s", node_id, node_data['error'])
         return jsonify(node_data), 404
     
     # Adicionar o ID do nó à resposta para referência
@@ -261,8 +355,10 @@ def get_node_info(node_id):
             elif 'id' in node:
                 node['id'] = str(node['id'])  # Converter id existente para string
     
-    print(f"Retornando com sucesso dados para o nó {node_id}")
+    logger.debug("Retornando com sucesso dados para o nó %s", node_id)
     return jsonify(node_data)
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento; em produção use o gunicorn (ver wsgi.py)
+    graph_ready.set()
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Tamanho dos arquivos e tempo de carga: motos_data.json vs motos_data.arrow
+
+Para cada tamanho grava os mesmos anúncios sintéticos como JSON (o formato gerado por
+initial_populate até aqui) e como Arrow IPC (write_listings_arrow: anúncios e fotos) e
+mede o tempo de GrafoOlx.load_data mais o índice de listIds em cada formato: json.load,
+limpeza e ListingStore contra a leitura mapeada em memória. A linha "blocos" grava os
+mesmos anúncios com ListingArrowWriter em blocos de NORMALIZE_CHUNK_ROWS, como
+initial_populate (dicionários com deltas; a leitura junta os blocos). Confere (assert)
+que todos os caminhos devolvem os mesmos anúncios.
+
+Uso: python benchmarks/bench_arrow.py [n1 n2 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import write_synthetic_file
+
+from grafo import GraphState, GrafoOlx
+from listing_arrow import ListingArrowWriter, images_path, write_listings_arrow
+from normalize import NORMALIZE_CHUNK_ROWS
+
+
+def load(path):
+    # Apenas a carga dos anúncios, sem montar o grafo
+    mg = GrafoOlx.__new__(GrafoOlx)
+    mg.data_file = path
+    mg.state = GraphState()
+    start = time.perf_counter()
+    mg.load_data()
+    mg.build_listing_index()
+    return mg.listings, time.perf_counter() - start
+
+
+def file_mb(path):
+    return (os.path.getsize(path) + os.path.getsize(images_path(path))) / 1024 / 1024
+
+
+def same_listings(a, b):
+    return len(a) == len(b) and all(x.to_dict() == y.to_dict() for x, y in zip(a, b))
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'formato':>7} {'arquivo (MB)':>13} {'carga (s)':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = write_synthetic_file(os.path.join(tmp, 'motos.json'), n)
+            from_json, json_time = load(json_path)
+            arrow_path = os.path.join(tmp, 'motos.arrow')
+            write_listings_arrow(from_json, arrow_path)
+            from_arrow, arrow_time = load(arrow_path)
+            chunked_path = os.path.join(tmp, 'motos_chunked.arrow')
+            with ListingArrowWriter(chunked_path) as writer:
+                for start in range(0, len(from_json), NORMALIZE_CHUNK_ROWS):
+                    writer.write(from_json.take(np.arange(start, min(start + NORMALIZE_CHUNK_ROWS, len(from_json)))))
+            from_chunks, chunked_time = load(chunked_path)
+
+            print(f"{n:>9} {'json':>7} {os.path.getsize(json_path) / 1024 / 1024:>13.1f} {json_time:>10.2f}")
+            print(f"{n:>9} {'arrow':>7} {file_mb(arrow_path):>13.1f} {arrow_time:>10.2f}")
+            print(f"{n:>9} {'blocos':>7} {file_mb(chunked_path):>13.1f} {chunked_time:>10.2f}")
+            assert same_listings(from_json, from_arrow), 'anúncios divergentes (arrow)'
+            assert same_listings(from_json, from_chunks), 'anúncios divergentes (blocos)'
+            print('  anúncios iguais nos três formatos')
+            del from_arrow, from_chunks
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 50000, 200000])
@@ -0,0 +1,53 @@
+"""Compara a indexação por blocos com a avaliação de todos os pares
+
+Uso: python benchmarks/bench_blocking.py [n1 n2 ...]
+A força bruta só é executada (e comparada) até 20 mil anúncios.
+"""
+import sys
+import time
+
+from synthetic import DATA_FILE, synthetic_listings
+
+from grafo import GrafoOlx
+from similarity import encode_listings, build_edges, candidate_pairs
+
+
+def prepare(listings):
+    for m in listings:
+        m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.')) if m['price'] else 0.0
+    return listings
+
+
+def check(columns, threshold):
+    blocked = build_edges(columns, threshold, blocking=True)
+    brute = build_edges(columns, threshold, blocking=False)
+    for a, b in zip(blocked, brute):
+        assert len(a) == len(b) and (a == b).all(), 'a indexação perdeu arestas'
+
+
+def main(sizes):
+    mg = GrafoOlx(DATA_FILE)
+    check(mg.columns, mg.threshold)
+    print(f'sem arestas perdidas nos {len(mg.listings)} anúncios reais')
+
+    print(f"{'anúncios':>10} {'pares (todos)':>15} {'pares (blocos)':>15} {'força bruta (s)':>16} {'blocos (s)':>11} {'arestas':>10}")
+    for n in sizes:
+        columns = encode_listings(prepare(synthetic_listings(n)))
+        evaluated = sum(len(i) for i, j in candidate_pairs(columns))
+
+        start = time.perf_counter()
+        sources, targets, weights = build_edges(columns, mg.threshold, blocking=True)
+        blocked = time.perf_counter() - start
+
+        brute = float('nan')
+        if n <= 20000:
+            start = time.perf_counter()
+            build_edges(columns, mg.threshold, blocking=False)
+            brute = time.perf_counter() - start
+            check(columns, mg.threshold)
+
+        print(f'{n:>10} {n * (n - 1) // 2:>15} {evaluated:>15} {brute:>16.2f} {blocked:>11.2f} {len(sources):>10}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,107 @@
+"""Gráficos de distribuição: pyplot com contagem em Python (anterior) vs Figure/FigureCanvasAgg
+
+Confere (assert) que as contagens de chart_aggregates são as mesmas da contagem anterior com
+dicionários, mede a renderização sequencial dos dois jeitos e renderiza os três
+gráficos a partir de um pool de threads, conferindo que cada PNG é idêntico ao da
+renderização sequencial (com pyplot as threads compartilhariam a figura atual).
+
+Uso: python benchmarks/bench_charts.py [anúncios] [threads] [renderizações]
+"""
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from synthetic import write_synthetic_file
+
+from grafo import GrafoOlx
+
+CHARTS = {
+    'state': GrafoOlx.visualize_state_distribution,
+    'brand': GrafoOlx.visualize_brand_distribution,
+    'price': GrafoOlx.visualize_price_distribution,
+}
+
+
+def legacy_counts(mg, field):
+    counts = defaultdict(int)
+    for m in mg.listings:
+        if m[field]:
+            counts[m[field]] += 1
+    labels, values = zip(*sorted(counts.items(), key=lambda x: x[1], reverse=True))
+    return list(labels), list(values)
+
+
+def legacy_render(mg, chart):
+    # Versão anterior: contagem a cada requisição e estado global do pyplot
+    if chart == 'price':
+        prices = [m['price_value'] for m in mg.listings if m['price_value'] > 0]
+        plt.figure(figsize=(10, 6))
+        plt.hist(prices, bins=20)
+    else:
+        labels, counts = legacy_counts(mg, 'estado' if chart == 'state' else 'marca')
+        plt.figure(figsize=(10, 6) if chart == 'state' else (12, 6))
+        plt.bar(labels, counts)
+        plt.xticks(rotation=45)
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png')
+    plt.close()
+    return buf.getvalue()
+
+
+def render(mg, chart):
+    buf = io.BytesIO()
+    CHARTS[chart](mg).savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def main(n=20000, threads=8, renders=60):
+    with tempfile.TemporaryDirectory() as tmp:
+        mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+
+    aggregates = mg.chart_aggregates()
+    prices = [m['price_value'] for m in mg.listings if m['price_value'] > 0]
+    assert list(aggregates['state']) == list(legacy_counts(mg, 'estado')), 'contagem por estado divergente'
+    assert list(aggregates['brand']) == list(legacy_counts(mg, 'marca')), 'contagem por marca divergente'
+    assert all(np.array_equal(a, b) for a, b in zip(aggregates['price'], np.histogram(prices, bins=20))), \
+        'histograma de preços divergente'
+    print(f'{len(mg.listings)} anúncios; contagens iguais às anteriores')
+
+    print(f"{'gráfico':>8} {'pyplot (ms)':>12} {'Figure (ms)':>12}")
+    reference = {}
+    for chart in CHARTS:
+        start = time.perf_counter()
+        for _ in range(5):
+            legacy_render(mg, chart)
+        old = (time.perf_counter() - start) / 5 * 1000
+        mg.state.aggregates = None
+        start = time.perf_counter()
+        for _ in range(5):
+            reference[chart] = hashlib.sha256(render(mg, chart)).hexdigest()
+        new = (time.perf_counter() - start) / 5 * 1000
+        print(f'{chart:>8} {old:>12.1f} {new:>12.1f}')
+
+    jobs = [list(CHARTS)[k % len(CHARTS)] for k in range(renders)]
+    for workers in (1, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            digests = list(pool.map(lambda chart: hashlib.sha256(render(mg, chart)).hexdigest(), jobs))
+        elapsed = time.perf_counter() - start
+        for k, (chart, digest) in enumerate(zip(jobs, digests)):
+            assert digest == reference[chart], f'PNG {k} ({chart}) com {workers} thread(s) difere do sequencial'
+        print(f'{workers} thread(s): {renders} gráficos em {elapsed:.2f} s ({renders / elapsed:.1f}/s), '
+              f'PNGs idênticos aos sequenciais')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
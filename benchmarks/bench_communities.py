@@ -0,0 +1,82 @@
+"""Detecção de comunidades: algoritmo anterior (O(V·E)) vs union-find e propagação de rótulos
+
+Uso: python benchmarks/bench_communities.py [n1 n2 ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# Os módulos do projeto ficam na raiz do repositório (os demais benchmarks a acrescentam via synthetic)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from grafo import GrafoCompacto
+
+
+def legacy_components(G):
+    # Implementação anterior de Grafo.detect_communities
+    communities = {node: i for i, node in enumerate(G.nodes)}
+    for node in G.nodes:
+        for neighbor in G.neighbors(node):
+            if communities[node] != communities[neighbor]:
+                old_community = communities[neighbor]
+                new_community = communities[node]
+                for n in G.nodes:
+                    if communities[n] == old_community:
+                        communities[n] = new_community
+    return communities
+
+
+def same_partition(a, b):
+    pairs = set(zip((a[node] for node in a), (b[node] for node in a)))
+    return len(pairs) == len(set(a.values())) == len(set(b.values()))
+
+
+def random_graph(n, degree=8, groups_per_node=0.02, seed=0):
+    # Grafo com grupos plantados: 90% das arestas ligam nós do mesmo grupo
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, max(1, int(n * groups_per_node)), n)
+    order = np.argsort(group, kind='stable')
+    starts = np.searchsorted(group[order], group)
+    sizes = np.bincount(group)[group]
+
+    sources = np.repeat(np.arange(n), degree // 2)
+    inside = order[starts[sources] + rng.integers(0, sizes[sources])]
+    targets = np.where(rng.random(len(sources)) < 0.9, inside, rng.integers(0, n, len(sources)))
+    keep = sources != targets
+
+    G = GrafoCompacto()
+    for i in range(n):
+        G.add_node(i)
+    G.add_edges_by_index(sources[keep], targets[keep], 0.7 + 0.5 * rng.random(keep.sum()))
+    return G
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'nós':>8} {'arestas':>9} {'anterior (s)':>13} {'union-find (s)':>15} {'comp.':>7} {'rótulos (s)':>12} {'comun.':>7} {'cache (ms)':>11}")
+    for n in sizes:
+        G = random_graph(n)
+        G.number_of_edges()
+
+        legacy, legacy_time = (None, float('nan'))
+        if n <= 5000:
+            legacy, legacy_time = timed(lambda: legacy_components(G))
+
+        components, uf_time = timed(lambda: G.detect_communities('components'))
+        if legacy is not None:
+            assert same_partition(legacy, components), 'componentes divergentes'
+        labels, lp_time = timed(lambda: G.detect_communities('label_propagation'))
+        _, cached_time = timed(lambda: G.detect_communities('label_propagation'))
+
+        print(f'{n:>8} {G.number_of_edges():>9} {legacy_time:>13.2f} {uf_time:>15.3f} {len(set(components.values())):>7} '
+              f'{lp_time:>12.3f} {len(set(labels.values())):>7} {cached_time * 1000:>11.4f}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 20000, 100000])
@@ -0,0 +1,83 @@
+"""Memória de pico da exportação em fluxo vs resposta única, com tamanhos crescentes
+
+Para cada tamanho monta um ListingStore de anúncios sintéticos e um grafo aleatório
+(~10 arestas por anúncio) e mede com tracemalloc o pico de memória alocada durante a
+exportação completa de anúncios e de arestas (NDJSON com gzip, os blocos são
+descartados como faria um cliente lento) e durante a resposta anterior de /listings sem
+filtros (um único array JSON). Os dados carregados não entram na conta. O pico da
+exportação deve ficar praticamente constante enquanto o da resposta única cresce com n:
+confere (assert) que, no maior tamanho, o pico de cada exportação fica em até
+PEAK_MAX_RATIO vezes o do menor tamanho.
+
+Uso: python benchmarks/bench_export.py [n1 n2 ...]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.sparse as sp
+
+from synthetic import synthetic_listings
+
+from export import ExportView, export_edges, export_listings, gzip_chunks
+from listing_store import ListingStore
+from normalize import prepare_frame
+
+# Crescimento máximo do pico de memória da exportação entre o menor e o maior tamanho
+PEAK_MAX_RATIO = 2.0
+
+
+def random_csr(n, degree=10, seed=0):
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, n, n * degree // 2)
+    targets = rng.integers(0, n, n * degree // 2)
+    upper = sp.coo_matrix((rng.random(len(sources), dtype=np.float32), (sources, targets)), shape=(n, n)).tocsr()
+    upper.setdiag(0)
+    upper.eliminate_zeros()
+    matrix = (upper + upper.T).tocsr()
+    return matrix.indptr.astype(np.int64), matrix.indices.astype(np.int64), matrix.data
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, size / 1024 / 1024, elapsed
+
+
+def consume(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+
+def main(sizes):
+    peaks = {}
+    print(f"{'anúncios':>9} {'arestas':>9} {'exportação':>14} {'pico (MB)':>10} {'saída (MB)':>11} {'tempo (s)':>10}")
+    for n in sizes:
+        listings = ListingStore.from_frame(prepare_frame(synthetic_listings(n)))
+        csr = random_csr(n)
+        view = ExportView(0, listings, csr, range(n))
+        runs = {
+            'anúncios': lambda: consume(gzip_chunks(export_listings(view))),
+            'arestas': lambda: consume(gzip_chunks(export_edges(view))),
+            'resposta única': lambda: len(json.dumps([dict(m) for m in listings]).encode()),
+        }
+        for name, func in runs.items():
+            peak, size, elapsed = measure(func)
+            print(f'{n:>9} {len(csr[1]) // 2:>9} {name:>14} {peak:>10.1f} {size:>11.1f} {elapsed:>10.1f}')
+            peaks.setdefault(name, []).append(peak)
+
+    for name in ('anúncios', 'arestas'):
+        smallest, largest = peaks[name][0], peaks[name][-1]
+        assert largest <= smallest * PEAK_MAX_RATIO, \
+            f'pico da exportação de {name} cresceu de {smallest:.1f} MB para {largest:.1f} MB'
+        print(f'pico da exportação de {name}: {smallest:.1f} MB -> {largest:.1f} MB '
+              f'({largest / smallest:.2f}x, limite {PEAK_MAX_RATIO:.1f}x)')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000, 80000])
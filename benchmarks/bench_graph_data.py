@@ -0,0 +1,75 @@
+"""/api/graph-data: serialização a cada requisição (anterior) vs cache de respostas comprimidas
+
+Para cada tamanho mede, com o Flask test client:
+- anterior: fig.to_json → json.loads → jsonify, como o handler fazia a cada requisição;
+- fria: primeira requisição após a mudança de versão do grafo (gera e comprime o JSON);
+- quente: requisições seguintes, servidas do cache em gzip;
+- 304: revalidação com If-None-Match.
+Também compara o tamanho do JSON com o do corpo em gzip (e brotli, se instalado).
+
+Uso: python benchmarks/bench_graph_data.py [n1 n2 ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import write_synthetic_file
+
+import app as flask_app
+from grafo import GrafoOlx
+from interactive_graph import create_interactive_graph
+
+COLOR_BY = ['community', 'brand', 'state', 'price']
+
+
+def legacy(mg, color_by):
+    graph_data = mg.create_interactive_graph_data(color_by)
+    fig, config = create_interactive_graph(graph_data, color_by)
+    with flask_app.app.app_context():
+        return flask_app.jsonify({'graph': json.loads(fig.to_json()), 'config': config}).get_data()
+
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def main(sizes, rounds=20):
+    client = flask_app.app.test_client()
+    gzip_headers = {'Accept-Encoding': 'gzip, br'}
+    print(f"{'anúncios':>9} {'cor':>10} {'anterior (ms)':>14} {'fria (ms)':>10} {'quente (ms)':>12} {'304 (ms)':>9} "
+          f"{'JSON (KB)':>10} {'gzip (KB)':>10} {'br (KB)':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+        flask_app.mg = mg
+        mg.get_layout()
+        for color_by in COLOR_BY:
+            path = f'/api/graph-data?color_by={color_by}'
+            old, old_body = timed(lambda: legacy(mg, color_by), max(1, rounds // 10))
+
+            # Nova versão do grafo: a primeira requisição é fria
+            mg.version += 1
+            cold, response = timed(lambda: client.get(path, headers=gzip_headers), 1)
+            assert response.status_code == 200 and response.headers['Content-Encoding'] in ('gzip', 'br')
+            warm, response = timed(lambda: client.get(path, headers=gzip_headers), rounds)
+            etag = response.headers['ETag']
+            revalidate, response = timed(lambda: client.get(path, headers={**gzip_headers, 'If-None-Match': etag}),
+                                         rounds)
+            assert response.status_code == 304
+
+            # Sem Accept-Encoding o JSON vai descomprimido e equivale ao anterior
+            plain = client.get(path, headers={'Accept-Encoding': 'identity'}).get_data()
+            assert json.loads(plain) == json.loads(old_body)
+            cached = flask_app.graph_data_cache.get_or_build((color_by, '', ''), mg.version, None)
+            br = f'{len(cached.brotli_body) / 1024:>8.0f}' if cached.brotli_body else f"{'-':>8}"
+            print(f'{n:>9} {color_by:>10} {old:>14.1f} {cold:>10.1f} {warm:>12.2f} {revalidate:>9.2f} '
+                  f'{len(plain) / 1024:>10.0f} {len(cached.gzip_body) / 1024:>10.0f} {br}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000])
@@ -0,0 +1,129 @@
+"""/api/graph-data com filtros de estado e marca: subgrafo induzido vs filtro por varredura
+
+A referência (força bruta) gera os dados do grafo como a versão anterior de
+create_interactive_graph_data (todos os nós e todas as arestas de G.get_edges) e
+descarta os anúncios que não atendem aos filtros. Para cada filtro confere (assert) que
+a saída de create_interactive_graph_data(state=..., brand=...) é a mesma (nós, cores,
+textos e segmentos de aresta) e mede o tempo de geração, o tempo de /api/graph-data sem
+cache e o tamanho da resposta.
+
+Uso: python benchmarks/bench_graph_filters.py [n1 n2 ...]
+"""
+import collections
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import write_synthetic_file
+
+import app as flask_app
+from grafo import GrafoOlx
+
+
+def brute_force(mg, color_by, state='', brand=''):
+    positions = mg.get_layout()
+    nodes = mg.G.nodes
+
+    def matches(node):
+        return (not state or nodes[node]['estado'] == state) and (not brand or nodes[node]['marca'] == brand)
+
+    selected = [node for node in nodes if matches(node)]
+    edges = [(node1, node2, attrs['weight']) for node1, node2, attrs in mg.G.get_edges()
+             if matches(node1) and matches(node2)]
+
+    if color_by == 'community':
+        partition = mg.detect_communities()
+        unique = set(partition.values())
+        color_map = {comm: f'hsl({int(i * 360 / len(unique))},70%,60%)' for i, comm in enumerate(unique)}
+        labels = [partition[node] for node in selected]
+        legend = {f'Community {comm}': color for comm, color in color_map.items() if comm in set(labels)}
+    else:
+        field = 'marca' if color_by == 'brand' else 'estado'
+        values = set(nodes[node][field] for node in nodes)
+        color_map = {value: f'hsl({int(i * 360 / len(values))},70%,60%)' for i, value in enumerate(values)}
+        labels = [nodes[node][field] for node in selected]
+        legend = {value: color for value, color in color_map.items() if value in set(labels)}
+
+    hover = [f"<b>{nodes[node].get('title', 'Anúncio sem título')}</b><br>"
+             f"Marca: {nodes[node].get('marca', 'N/A')}<br>"
+             f"Modelo: {nodes[node].get('modelo', 'N/A')}<br>"
+             f"Ano: {nodes[node].get('ano', 'N/A')}<br>"
+             f"Preço: {nodes[node].get('price', 'N/A')}<br>"
+             f"Cilindrada: {nodes[node].get('cilindrada', 'N/A')}cc<br>"
+             f"Localização: {nodes[node].get('estado', 'N/A')}<br>"
+             f"Clique para ver detalhes e anúncios similares" for node in selected]
+    return {
+        'node_ids': selected,
+        'x_nodes': [positions[node][0] for node in selected],
+        'y_nodes': [positions[node][1] for node in selected],
+        'node_colors': [color_map[label] for label in labels],
+        'node_hover_text': hover,
+        'color_legend': legend,
+        'segments': segments_of_edges(positions, edges),
+    }
+
+
+def segments_of_edges(positions, edges):
+    return collections.Counter((frozenset((positions[a], positions[b])), w) for a, b, w in edges)
+
+
+def segments_of_output(data):
+    # Reconstrói os segmentos a partir das listas edge_x/edge_y separadas por None
+    points = [(x, y) for x, y in zip(data['edge_x'], data['edge_y']) if x is not None]
+    pairs = zip(points[0::2], points[1::2])
+    return collections.Counter((frozenset(pair), w) for pair, w in zip(pairs, data['edge_weights']))
+
+
+def check(mg, color_by, state, brand):
+    expected = brute_force(mg, color_by, state, brand)
+    data = mg.create_interactive_graph_data(color_by, state=state, brand=brand)
+    data['segments'] = segments_of_output(data)
+    for key, value in expected.items():
+        assert data[key] == value, f'{key} divergente com color_by={color_by}, estado={state!r}, marca={brand!r}'
+
+
+def timed(function, rounds=3):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def main(sizes):
+    client = flask_app.app.test_client()
+    print(f"{'anúncios':>9} {'filtro':>24} {'nós':>7} {'paridade':>9} {'varredura (ms)':>15} {'índices (ms)':>13} "
+          f"{'requisição (ms)':>16} {'resposta (KB)':>14}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+        flask_app.mg = mg
+        mg.get_layout()
+        mg.detect_communities()
+
+        rng = random.Random(0)
+        listing = mg.listings[rng.randrange(len(mg.listings))]
+        filters = [('', ''), (listing['estado'], ''), ('', listing['marca']), (listing['estado'], listing['marca']),
+                   ('XX', '')]
+        for state, brand in filters:
+            check(mg, 'community', state, brand)
+            check(mg, 'brand', state, brand)
+            scan, _ = timed(lambda: brute_force(mg, 'brand', state, brand))
+            indexed, data = timed(lambda: mg.create_interactive_graph_data('brand', state=state, brand=brand))
+
+            def request():
+                # Sem o cache de respostas: cada requisição usa uma nova versão do grafo
+                mg.version += 1
+                return client.get('/api/graph-data', query_string={'color_by': 'brand', 'state': state,
+                                                                  'brand': brand},
+                                  headers={'Accept-Encoding': 'gzip'})
+
+            latency, response = timed(request)
+            label = f'{state or "*"}/{brand or "*"}'
+            print(f'{n:>9} {label:>24} {len(data["node_ids"]):>7} {"ok":>9} {scan:>15.1f} {indexed:>13.1f} '
+                  f'{latency:>16.1f} {len(response.get_data()) / 1024:>14.1f}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000])
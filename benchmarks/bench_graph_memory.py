@@ -0,0 +1,51 @@
+"""Memória ocupada pelas arestas em Grafo (dicionários) e GrafoCompacto (CSR)
+
+Uso: python benchmarks/bench_graph_memory.py [n1 n2 ...]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from synthetic import synthetic_listings
+
+from grafo import Grafo, GrafoCompacto
+from similarity import encode_listings, build_edges
+
+
+def measure(graph_class, ids, edges):
+    gc.collect()
+    tracemalloc.start()
+    G = graph_class()
+    for node_id in ids:
+        G.add_node(node_id)
+    G.add_edges_by_index(*edges)
+    G.number_of_edges()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(100):
+        G.number_of_edges()
+    count_time = (time.perf_counter() - start) / 100
+    return size, peak, count_time, G.number_of_edges()
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'arestas':>9} {'backend':>14} {'memória (MB)':>13} {'pico (MB)':>10} {'bytes/aresta':>13} {'number_of_edges (ms)':>21}")
+    for n in sizes:
+        listings = synthetic_listings(n)
+        for m in listings:
+            m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.')) if m['price'] else 0.0
+        edges = build_edges(encode_listings(listings))
+        ids = [m['listId'] for m in listings]
+        del listings
+
+        for graph_class in (Grafo, GrafoCompacto):
+            size, peak, count_time, count = measure(graph_class, ids, edges)
+            print(f'{n:>9} {count:>9} {graph_class.__name__:>14} {size / 2**20:>13.1f} {peak / 2**20:>10.1f} '
+                  f'{size / max(count, 1):>13.1f} {count_time * 1000:>21.3f}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000])
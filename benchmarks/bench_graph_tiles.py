@@ -0,0 +1,88 @@
+"""Consultas de viewport (/api/graph-viewport) com índice em grade e supernós por comunidade
+
+Para cada tamanho: tempo de construção de GraphTiles, conferência do GridIndex contra
+uma varredura de todas as posições e, por nível de zoom, latência média das consultas
+em viewports aleatórios (lado = layout / 2^zoom), nível devolvido, nós e arestas
+transferidos e tamanho do JSON. As duas últimas colunas comparam só a seleção dos nós
+visíveis: consulta na grade vs varredura linear das posições.
+
+Uso: python benchmarks/bench_graph_tiles.py [n1 n2 ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import write_synthetic_file
+
+from grafo import GrafoOlx
+
+ZOOMS = range(0, 7)
+QUERIES = 50
+
+
+def random_viewports(bounds, zoom, count, rng):
+    x0, y0, x1, y1 = bounds
+    width, height = (x1 - x0) / 2 ** zoom, (y1 - y0) / 2 ** zoom
+    cx = rng.uniform(x0 + width / 2, x1 - width / 2, count) if zoom else np.full(count, (x0 + x1) / 2)
+    cy = rng.uniform(y0 + height / 2, y1 - height / 2, count) if zoom else np.full(count, (y0 + y1) / 2)
+    return [(x - width / 2, y - height / 2, x + width / 2, y + height / 2) for x, y in zip(cx.tolist(), cy.tolist())]
+
+
+def scan(points, x0, y0, x1, y1):
+    return np.flatnonzero((points[:, 0] >= x0) & (points[:, 0] <= x1) & (points[:, 1] >= y0) & (points[:, 1] <= y1))
+
+
+def main(sizes):
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+            mg.get_layout()
+            mg.detect_communities()
+            prepare = time.perf_counter() - start
+        start = time.perf_counter()
+        tiles = mg.graph_tiles()
+        build = time.perf_counter() - start
+        print(f'{n} anúncios, {mg.G.number_of_edges()} arestas, {len(tiles.communities)} comunidades; '
+              f'grafo + layout {prepare:.1f} s, índice {build * 1000:.0f} ms')
+
+        rng = np.random.default_rng(0)
+        same = all(np.array_equal(tiles.nodes.query(*v), scan(tiles.coordinates, *v))
+                   for zoom in ZOOMS for v in random_viewports(tiles.bounds, zoom, 10, rng))
+        print(f'grade == varredura: {same}')
+
+        print(f"{'zoom':>5} {'nível':>12} {'nós':>8} {'arestas':>8} {'JSON (KB)':>10} {'consulta (ms)':>14} "
+              f"{'grade (ms)':>11} {'varredura (ms)':>15}")
+        for zoom in ZOOMS:
+            viewports = random_viewports(tiles.bounds, zoom, QUERIES, rng)
+            start = time.perf_counter()
+            results = [mg.graph_viewport(*v, zoom=zoom) for v in viewports]
+            query = (time.perf_counter() - start) / QUERIES * 1000
+            start = time.perf_counter()
+            for v in viewports:
+                tiles.nodes.query(*v)
+            grid = (time.perf_counter() - start) / QUERIES * 1000
+            start = time.perf_counter()
+            for v in viewports:
+                scan(tiles.coordinates, *v)
+            linear = (time.perf_counter() - start) / QUERIES * 1000
+            levels = sorted(set(r['level'] for r in results))
+            nodes = np.mean([len(r['nodes']['x']) for r in results])
+            edges = np.mean([len(r['edges']['weight']) for r in results])
+            size = np.mean([len(json.dumps(r)) for r in results[:10]]) / 1024
+            print(f"{zoom:>5} {'/'.join(levels):>12} {nodes:>8.0f} {edges:>8.0f} {size:>10.1f} {query:>14.2f} "
+                  f'{grid:>11.3f} {linear:>15.3f}')
+
+        if n <= 10000:
+            full = mg.create_interactive_graph_data('community')
+            print(f"grafo completo (create_interactive_graph_data): {len(full['node_ids'])} nós, "
+                  f"{len(full['edge_weights'])} arestas, {len(json.dumps(full, default=str)) / 1024:.0f} KB")
+        del mg, tiles
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 100000])
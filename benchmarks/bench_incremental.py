@@ -0,0 +1,89 @@
+"""Atualização incremental de 1% dos anúncios vs reconstrução completa do grafo
+
+Metade do lote altera preços de anúncios existentes, um quarto são anúncios novos e um
+quarto remoções. A reconstrução inclui layout e comunidades, que a atualização mantém.
+Verifica que arestas e top-k coincidem com a reconstrução a partir dos mesmos anúncios.
+
+Uso: python benchmarks/bench_incremental.py [n1 n2 ...]
+"""
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import synthetic_listings
+
+from grafo import GrafoOlx
+from layout import edge_length_stress
+
+
+def make_delta(listings, n_new, seed=0):
+    rng = random.Random(seed)
+    size = max(4, len(listings) // 100)
+    sample = rng.sample(listings, size // 4 * 3)
+    removed = [m['listId'] for m in sample[:size // 4]]
+    changed = []
+    for m in sample[size // 4:]:
+        m = copy.deepcopy(m)
+        m['price'] = f"R$ {rng.randint(2000, 90000):,}".replace(',', '.')
+        changed.append(m)
+    new = synthetic_listings(len(listings) + size // 4, seed=seed + 1)[len(listings):]
+    for k, m in enumerate(new):
+        m['listId'] = str(2000000000 + n_new + k)
+    return changed + new, removed
+
+
+def full_build(path, listings):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(listings, f)
+    start = time.perf_counter()
+    mg = GrafoOlx(path)
+    mg.get_layout()
+    mg.detect_communities()
+    return mg, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'lote':>6} {'incremental (s)':>16} {'completa (s)':>13} {'iguais':>7} "
+          f"{'comunidades':>12} {'edge_ratio inc/completa':>24}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            listings = synthetic_listings(n)
+            mg, _ = full_build(os.path.join(tmp, f'base_{n}.json'), copy.deepcopy(listings))
+            upserted, removed = make_delta(listings, n)
+
+            start = time.perf_counter()
+            mg.apply_updates(upserted=upserted, removed=removed)
+            incremental_time = time.perf_counter() - start
+
+            # Resultado da atualização; o grafo é liberado antes da reconstrução para limitar a memória
+            sources, targets, _ = mg.G.edge_arrays()
+            ids = [m['listId'] for m in mg.listings]
+            ratio_inc = edge_length_stress(np.array([mg.get_layout()[i] for i in ids]), sources, targets)['edge_ratio']
+            communities_inc = len(set(mg.detect_communities().values()))
+            csr = tuple(np.array(a) for a in mg.G.csr())
+            table = (mg.top_k_table.neighbors, mg.top_k_table.weights)
+            del mg
+
+            # Mesma ordem final: mantidos, depois os anúncios novos/alterados
+            dropped = set(removed) | {m['listId'] for m in upserted}
+            final = [m for m in listings if m['listId'] not in dropped] + upserted
+            rebuilt, full_time = full_build(os.path.join(tmp, f'final_{n}.json'), copy.deepcopy(final))
+
+            same = (all(np.array_equal(x, y) for x, y in zip(csr, rebuilt.G.csr()))
+                    and np.array_equal(table[0], rebuilt.top_k_table.neighbors)
+                    and np.array_equal(table[1], rebuilt.top_k_table.weights))
+            ratio_full = edge_length_stress(np.array([rebuilt.get_layout()[i] for i in ids]), sources, targets)['edge_ratio']
+            communities = f"{communities_inc}/{len(set(rebuilt.detect_communities().values()))}"
+            print(f'{n:>9} {len(upserted) + len(removed):>6} {incremental_time:>16.2f} {full_time:>13.2f} '
+                  f'{str(same):>7} {communities:>12} {ratio_inc:>11.3f} / {ratio_full:.3f}')
+            del rebuilt
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 50000])
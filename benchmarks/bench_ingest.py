@@ -0,0 +1,105 @@
+"""Ingestão do feed do spider: pandas (initial_populate anterior) vs pipeline em fluxo
+
+Gera um feed JSON Lines sintético no formato de OlxMotosSpider.parse (ids numéricos,
+anúncios financiados, linhas sem listId e duplicados) e mede, em um processo separado
+por modo, a vazão e o pico de memória (RSS):
+- pandas: read_json + limpeza do initial_populate anterior + to_json;
+- stream: normalize.FeedNormalizer em blocos gravando motos_data.json anúncio a anúncio;
+- grafo-lote / grafo-fluxo: GrafoOlx a partir do JSON limpo vs direto do feed em lotes.
+
+Uso: python benchmarks/bench_ingest.py [linhas1 linhas2 ...]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import ROOT, synthetic_raw_feed
+
+# Acima destes tamanhos os modos que carregam tudo na memória não cabem na máquina de testes
+PANDAS_MAX_LINES = 200000
+GRAPH_LINES = 20000
+
+
+def write_feed(path, lines, seed=0):
+    """Grava o feed bruto sem manter os anúncios em memória"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for m in synthetic_raw_feed(lines, seed):
+            f.write(json.dumps(m, ensure_ascii=False))
+            f.write('\n')
+
+
+def run_pandas(feed, out):
+    import pandas as pd
+    df = pd.read_json(feed, lines=True)
+    df = df[df['status_financeiro'] != 'Financiado']
+    df['listId'] = df['listId'].astype(str)
+    df['listId'] = df['listId'].str[:-2]
+    df['quilometragem'] = df['quilometragem'].apply(lambda x: str(x) if isinstance(x, float) else x).astype(str).str[:-2]
+    df['ano'] = df['ano'].astype(str).str[:-2]
+    df.drop_duplicates(subset=['listId'], inplace=True)
+    df = df[df['listId'] != 'n']
+    df.reset_index(drop=True, inplace=True)
+    df.to_json(out, orient='records')
+    return len(df)
+
+
+def run_stream(feed, out):
+    from ingest import read_jsonl, batched, write_listings_json
+    from normalize import NORMALIZE_CHUNK_ROWS, FeedNormalizer
+    normalizer = FeedNormalizer()
+    return write_listings_json((m for batch in batched(read_jsonl(feed), NORMALIZE_CHUNK_ROWS)
+                                for m in normalizer.clean(batch)), out)
+
+
+def run_graph_batch(feed, out):
+    from grafo import GrafoOlx
+    run_stream(feed, out)
+    return len(GrafoOlx(out).listings)
+
+
+def run_graph_stream(feed, out):
+    from grafo import GrafoOlx
+    return len(GrafoOlx(feed).listings)
+
+
+MODES = {'pandas': run_pandas, 'stream': run_stream, 'grafo-lote': run_graph_batch, 'grafo-fluxo': run_graph_stream}
+
+
+def measure(mode, feed, out):
+    # Executa o modo em um processo novo para isolar o pico de memória
+    result = subprocess.run([sys.executable, __file__, '--run', mode, feed, out],
+                            capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(sizes):
+    print(f"{'linhas':>9} {'modo':>12} {'anúncios':>9} {'tempo (s)':>10} {'linhas/s':>10} {'pico RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = os.path.join(tmp, 'feed.jsonl')
+        out = os.path.join(tmp, 'motos_data.json')
+        for lines in sizes:
+            write_feed(feed, lines)
+            modes = ['stream'] + (['pandas'] if lines <= PANDAS_MAX_LINES else [])
+            modes += ['grafo-lote', 'grafo-fluxo'] if lines <= GRAPH_LINES else []
+            for mode in modes:
+                r = measure(mode, feed, out)
+                print(f"{lines:>9} {mode:>12} {r['listings']:>9} {r['time']:>10.2f} {lines / r['time']:>10.0f} "
+                      f"{r['peak_rss_mb']:>14.0f}")
+        os.remove(feed)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        mode, feed, out = sys.argv[2:5]
+        start = time.perf_counter()
+        listings = MODES[mode](feed, out)
+        elapsed = time.perf_counter() - start
+        # ru_maxrss é em KB no Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps({'listings': listings, 'time': elapsed, 'peak_rss_mb': peak}))
+    else:
+        main([int(a) for a in sys.argv[1:]] or [20000, 200000, 2000000])
@@ -0,0 +1,234 @@
+"""Recálculos em segundo plano (JobScheduler) vs dentro de apply_updates, sob carga
+
+Em cada rodada várias threads fazem requisições a /api/graph-data, /api/graph-viewport,
+/search, /similar, /listings e /listing enquanto um lote de 1% dos anúncios (ver
+bench_incremental) é aplicado e os recálculos acontecem. Confere (assert) que toda
+resposta é 200 ou 404 e que /listing/<id> devolve o anúncio pedido, mesmo com o lote
+sendo publicado no meio da requisição. No modo síncrono comunidades e
+layout são recalculados dentro de apply_updates e /api/graph-data é gerado na própria
+requisição; no modo assíncrono eles ficam com o JobScheduler e as requisições servem a
+versão anterior até a nova ser publicada. Reporta o tempo de apply_updates, a latência
+por endpoint e confere (assert) que, terminados os jobs, partição e layout são iguais aos do
+modo síncrono.
+
+Depois confere (assert) que as requisições não esperam recálculos: com um job preso
+em um Event na frente da fila, aplica um lote e verifica que /api/graph-data,
+/api/graph-viewport, /similar/<id> e /search respondem em até HOLD_MAX_LATENCY segundos servindo a versão
+anterior (o mesmo JSON de antes do lote para /api/graph-data; para /api/graph-viewport,
+/similar e /search o layout provisório, o top-k e o índice de busca da própria
+atualização, sem os recálculos que estão na fila).
+
+Uso: python benchmarks/bench_jobs.py [anúncios] [rodadas] [threads]
+"""
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from synthetic import synthetic_listings
+from bench_incremental import make_delta
+
+import app as flask_app
+from grafo import GrafoOlx
+from ingest import normalize_listing_id
+from jobs import JobScheduler
+from response_cache import ResponseCache
+
+WINDOW = 3
+# Latência máxima (s) aceita com um recálculo em andamento
+HOLD_MAX_LATENCY = 0.5
+QUERIES = ['honda cg 160', 'yamaha fazer', 'biz 125', 'titan', 'xre 300']
+
+
+class InlineJobs:
+    # Comportamento anterior: o "job" roda na hora, dentro de quem o pediu
+    def submit(self, name, func):
+        func()
+
+    def status(self):
+        return {'running': None, 'queued': [], 'jobs': {}}
+
+
+def endpoint_of(path):
+    # /similar/<id> e /listing/<id> agrupados pelo prefixo, sem o id
+    path = path.split('?')[0]
+    return path.rsplit('/', 1)[0] if path.startswith(('/similar/', '/listing/')) else path
+
+
+def requests_under_load(client, ids, threads, duration, during):
+    """Requisições em várias threads enquanto during() roda e por mais duration segundos"""
+    latencies, errors = {}, []
+    lock = threading.Lock()
+    done = threading.Event()
+    bounds = flask_app.mg.layout_array()
+    x0, y0 = bounds.min(axis=0)
+    x1, y1 = bounds.max(axis=0)
+    paths = [
+        lambda rng: '/api/graph-data',
+        lambda rng: f'/api/graph-viewport?x0={x0}&y0={y0}&x1={(x0 + x1) / 2}&y1={(y0 + y1) / 2}',
+        lambda rng: f'/search?q={rng.choice(QUERIES).replace(" ", "+")}',
+        lambda rng: f'/similar/{rng.choice(ids)}',
+        lambda rng: '/listings?limit=20',
+        lambda rng: f'/listing/{rng.choice(ids)}',
+    ]
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {}
+        while not done.is_set():
+            path = rng.choice(paths)(rng)
+            start = time.perf_counter()
+            response = client.get(path)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code not in (200, 404):
+                errors.append((path, response.status_code, response.get_data()[:200]))
+            elif path.startswith('/listing/') and response.status_code == 200:
+                listing_id = response.get_json()['listId']
+                if normalize_listing_id(listing_id) != normalize_listing_id(path.rsplit('/', 1)[1]):
+                    errors.append((path, 'devolveu o anúncio', listing_id))
+            local.setdefault(endpoint_of(path), []).append(elapsed)
+        with lock:
+            for endpoint, values in local.items():
+                latencies.setdefault(endpoint, []).extend(values)
+
+    pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for t in pool:
+        t.start()
+    try:
+        during()
+        time.sleep(duration)
+    finally:
+        done.set()
+        for t in pool:
+            t.join()
+    assert not errors, f'{len(errors)} respostas inválidas durante a atualização, ex.: {errors[:3]}'
+    return latencies
+
+
+def run(mode, path, listings, rounds, threads):
+    jobs = JobScheduler() if mode == 'assíncrono' else InlineJobs()
+    mg = GrafoOlx(path, jobs=jobs if mode == 'assíncrono' else None)
+    mg.warm_up()
+    flask_app.mg, flask_app.jobs = mg, jobs
+    flask_app.graph_data_cache = ResponseCache()
+    client = flask_app.app.test_client()
+    client.get('/api/graph-data')
+
+    current = copy.deepcopy(listings)
+    apply_times, latencies = [], {}
+    for k in range(rounds):
+        upserted, removed = make_delta(current, len(current) + k * len(current), seed=k)
+
+        def apply():
+            start = time.perf_counter()
+            mg.apply_updates(upserted=upserted, removed=removed)
+            apply_times.append(time.perf_counter() - start)
+
+        # Inclui anúncios removidos ou alterados pelo lote (404 ou o anúncio novo, conforme a versão lida)
+        ids = [m['listId'] for m in random.Random(k).sample(current, 100)]
+        for endpoint, values in requests_under_load(client, ids, threads, WINDOW, apply).items():
+            latencies.setdefault(endpoint, []).extend(values)
+        removed = set(removed)
+        changed = {m['listId']: m for m in upserted}
+        current = [changed.pop(m['listId'], m) for m in current if m['listId'] not in removed] + list(changed.values())
+        if mode == 'assíncrono':
+            jobs.wait()
+    return mg, apply_times, latencies
+
+
+def check_not_blocked(path, listings, requests=20):
+    """Prende o JobScheduler em um job e confere que as requisições servem a versão anterior sem esperar"""
+    jobs = JobScheduler()
+    mg = GrafoOlx(path, jobs=jobs)
+    mg.warm_up()
+    flask_app.mg, flask_app.jobs = mg, jobs
+    flask_app.graph_data_cache = ResponseCache()
+    client = flask_app.app.test_client()
+    previous = client.get('/api/graph-data')
+    assert previous.status_code == 200
+
+    release, started = threading.Event(), threading.Event()
+    jobs.submit('hold', lambda: (started.set(), release.wait()))
+    assert started.wait(10), 'job preso não começou'
+    try:
+        upserted, removed = make_delta(listings, 2 * len(listings), seed=99)
+        mg.apply_updates(upserted=upserted, removed=removed)
+        version, search_index = mg.version, mg.search_index
+        changed = {m['listId'] for m in upserted} | set(removed)
+        ids = [m['listId'] for m in random.Random(0).sample(listings, 10) if m['listId'] not in changed]
+        paths = ['/api/graph-data', '/api/graph-viewport'] + [f'/similar/{i}' for i in ids] + \
+                [f'/search?q={q.replace(" ", "+")}' for q in QUERIES]
+        # /api/graph-viewport, /similar e /search como ficaram na própria atualização (nenhum job rodou ainda)
+        expected = {p: client.get(p).get_data() for p in paths}
+        expected['/api/graph-data'] = previous.get_data()
+
+        worst = {}
+        for k in range(requests):
+            for p in paths:
+                start = time.perf_counter()
+                response = client.get(p)
+                elapsed = time.perf_counter() - start
+                endpoint = endpoint_of(p)
+                worst[endpoint] = max(worst.get(endpoint, 0), elapsed)
+                assert response.status_code == 200, (p, response.status_code)
+                assert elapsed < HOLD_MAX_LATENCY, f'{p} levou {elapsed:.2f} s com um recálculo em andamento'
+                assert response.get_data() == expected[p], f'{p} não serviu a versão anterior'
+                if p == '/api/graph-data':
+                    assert response.headers['ETag'] == previous.headers['ETag']
+        assert mg.version == version and mg.search_index is search_index, 'um recálculo foi publicado antes da hora'
+        assert not jobs.idle()
+    finally:
+        release.set()
+    assert jobs.wait(300), 'jobs não terminaram'
+    assert mg.version > version, 'os recálculos não foram publicados'
+    assert client.get('/api/graph-data').headers['ETag'] != previous.headers['ETag']
+    print('com um job preso: ' + ', '.join(f'{endpoint} máx {value * 1000:.1f} ms'
+                                            for endpoint, value in sorted(worst.items()))
+          + f' (limite {HOLD_MAX_LATENCY * 1000:.0f} ms), versão anterior servida')
+
+
+def main(n=5000, rounds=3, threads=8):
+    listings = synthetic_listings(n)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'motos.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(listings, f)
+        print(f'{n} anúncios, {rounds} lotes de 1%, {threads} threads, {WINDOW} s de requisições por lote, '
+              f'{os.cpu_count()} CPU(s)')
+        print(f"{'modo':>11} {'apply (ms)':>11} {'endpoint':>20} {'reqs':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'máx (ms)':>9}")
+        for mode in ('síncrono', 'assíncrono'):
+            mg, apply_times, latencies = run(mode, path, listings, rounds, threads)
+            for endpoint, values in sorted(latencies.items()):
+                print(f'{mode:>11} {np.mean(apply_times) * 1000:>11.0f} {endpoint:>20} {len(values):>6} '
+                      f'{np.percentile(values, 50):>9.1f} {np.percentile(values, 95):>9.1f} {max(values):>9.1f}')
+            results[mode] = mg
+            if mode == 'assíncrono':
+                status = flask_app.jobs.status()['jobs']
+                print('jobs: ' + ', '.join(f"{name} {job['runs']}x (falhas {job['failures']})"
+                                           for name, job in status.items()))
+                print(f"respostas antigas servidas durante a revalidação: {flask_app.graph_data_cache.stale_hits}")
+
+    sync, background = results['síncrono'], results['assíncrono']
+    ids = sync.listings.column('listId')
+    assert list(ids) == list(background.listings.column('listId')), 'anúncios divergentes'
+    assert sync.detect_communities() == background.detect_communities(), 'partição divergente'
+    assert np.allclose(sync.layout_array(), background.layout_array()), 'layout divergente'
+    print('mesmos anúncios, mesma partição e mesmo layout nos dois modos')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'motos.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(listings, f)
+        check_not_blocked(path, listings)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
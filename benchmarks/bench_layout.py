@@ -0,0 +1,53 @@
+"""Layout anterior (kamada_kawai_layout) vs layout de forças vetorizado
+
+Uso: python benchmarks/bench_layout.py [n1 n2 ...]
+Métricas de qualidade (menor é melhor): stress dos comprimentos das arestas e razão
+entre o comprimento médio das arestas e a distância média entre nós aleatórios.
+"""
+import sys
+import time
+
+import numpy as np
+
+from synthetic import DATA_FILE, synthetic_listings
+
+from grafo import GrafoOlx, GrafoCompacto
+from layout import edge_length_stress
+from similarity import encode_listings, build_edges
+
+
+def synthetic_graph(n):
+    listings = synthetic_listings(n)
+    for m in listings:
+        m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.')) if m['price'] else 0.0
+    G = GrafoCompacto()
+    for m in listings:
+        G.add_node(m['listId'])
+    G.add_edges_by_index(*build_edges(encode_listings(listings)))
+    return G
+
+
+def report(label, G, layout):
+    start = time.perf_counter()
+    positions = layout()
+    elapsed = time.perf_counter() - start
+    sources, targets, _ = G.edge_arrays()
+    metrics = edge_length_stress(np.array([positions[node] for node in G.nodes]), sources, targets)
+    print(f"{label:<28} {G.number_of_nodes():>8} {G.number_of_edges():>9} {elapsed:>9.2f} "
+          f"{metrics['stress']:>8.3f} {metrics['edge_ratio']:>11.3f}")
+
+
+def main(sizes):
+    print(f"{'layout':<28} {'nós':>8} {'arestas':>9} {'tempo (s)':>9} {'stress':>8} {'razão arestas':>11}")
+    G = GrafoOlx(DATA_FILE).G
+    report('kamada_kawai (dados reais)', G, G.kamada_kawai_layout)
+    report('vetorizado (dados reais)', G, G.force_directed_layout)
+    for n in sizes:
+        G = synthetic_graph(n)
+        if n <= 10000:
+            report('kamada_kawai', G, G.kamada_kawai_layout)
+        report('vetorizado', G, G.force_directed_layout)
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000, 50000])
@@ -0,0 +1,67 @@
+"""Memória por anúncio: lista de dicionários + cópias nos nós (anterior) vs ListingStore + visões
+
+Os anúncios passam por JSON para que cada um tenha suas próprias strings e listas de
+imagens, como ao carregar motos_data.json.
+
+Uso: python benchmarks/bench_listing_memory.py [n1 n2 ...]
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from synthetic import load_real_listings, synthetic_listings
+
+from listing_store import ListingStore
+from normalize import prepare_frame
+
+
+def retained(build, text):
+    # Memória mantida pela estrutura criada por build a partir do JSON
+    gc.collect()
+    tracemalloc.start()
+    result = build(text)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak
+
+
+def build_dicts(text):
+    listings = prepare_frame(json.loads(text)).to_dict('records')
+    # Grafo.add_node(m['listId'], **m) copiava cada dicionário
+    nodes = {m['listId']: dict(m) for m in listings}
+    return listings, nodes
+
+
+def build_store(text):
+    store = ListingStore.from_frame(prepare_frame(json.loads(text)))
+    nodes = {listing_id: store[i] for i, listing_id in enumerate(store.column('listId'))}
+    return store, nodes
+
+
+def read_all(listings):
+    # Campos lidos pelas páginas de anúncio, incluindo as imagens
+    start = time.perf_counter()
+    for m in listings:
+        m['title'], m['marca'], m['price_value'], m['images']
+    return (time.perf_counter() - start) / len(listings) * 1e6
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'estrutura':>12} {'bytes/anúncio':>14} {'pico (MB)':>10} {'leitura (µs)':>13}")
+    for n in sizes:
+        listings = load_real_listings() if n == 0 else synthetic_listings(n)
+        text = json.dumps(listings)
+        del listings
+        for name, build in (('dicionários', build_dicts), ('colunas', build_store)):
+            (listings, nodes), size, peak = retained(build, text)
+            per_listing = size / len(nodes)
+            print(f'{len(nodes):>9} {name:>12} {per_listing:>14.0f} {peak / 1e6:>10.1f} {read_all(listings):>13.2f}')
+            del listings, nodes
+
+
+if __name__ == '__main__':
+    # 0 = dados reais de motos_data.json
+    main([int(a) for a in sys.argv[1:]] or [0, 100000])
@@ -0,0 +1,90 @@
+"""/listings: filtragem linear e ordenação a cada requisição (anterior) vs ListingQueryIndex
+
+Monta o ListingStore de anúncios sintéticos e mede, para combinações de filtros, a
+versão anterior (percorre todos os anúncios, ordena o resultado por preço e serializa
+tudo) e a primeira página (50 anúncios) a partir dos índices, incluindo a serialização.
+Confere que percorrer todas as páginas com os cursores devolve exatamente o resultado
+da filtragem linear, na mesma ordem (preço e, nos empates, listId).
+
+Uso: python benchmarks/bench_listings.py [anúncios]
+"""
+import json
+import sys
+import time
+
+from synthetic import synthetic_listings
+
+from listing_query import LISTINGS_PAGE_SIZE, ListingQueryIndex
+from listing_store import ListingStore
+from normalize import prepare_frame
+
+QUERIES = [
+    ('sem filtros', {}, {}),
+    ('estado', {'estado': 'DF'}, {}),
+    ('estado + marca', {'estado': 'SP', 'marca': 'HONDA'}, {}),
+    ('marca + modelo + ano', {'marca': 'HONDA', 'modelo': 'CG', 'ano': '2020'}, {}),
+    ('preço', {}, {'price_value': (10000, 20000)}),
+    ('marca + preço + km', {'marca': 'YAMAHA'}, {'price_value': (5000, 30000), 'km': (None, 40000)}),
+    ('ano entre', {'estado': 'MG'}, {'ano': (2015, 2020)}),
+]
+
+
+def legacy(listings, filters, ranges):
+    result = list(listings)
+    for field, value in filters.items():
+        result = [m for m in result if m[field] == value]
+    for field, (low, high) in ranges.items():
+        def inside(m):
+            try:
+                value = float(m[field])
+            except (TypeError, ValueError):
+                return False
+            return (low is None or value >= low) and (high is None or value <= high)
+        result = [m for m in result if inside(m)]
+    return sorted(result, key=lambda m: (m['price_value'], m['listId']))
+
+
+def timed(func, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main(n=100000):
+    start = time.perf_counter()
+    listings = ListingStore.from_frame(prepare_frame(synthetic_listings(n)))
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    index = ListingQueryIndex(listings)
+    print(f'{n} anúncios: ListingStore em {load_time:.1f} s, índices em {time.perf_counter() - start:.2f} s')
+
+    # Valores presentes nos dados sintéticos, para que os filtros tenham resultados
+    brands = index.attributes['marca']
+    models = {listings.get(int(rows[0]), 'modelo') for brand, rows in brands.items() if brand == 'HONDA'}
+    print(f"{'consulta':>22} {'resultados':>11} {'anterior (ms)':>14} {'página (ms)':>12} {'páginas':>8} {'iguais':>7}")
+    for name, filters, ranges in QUERIES:
+        if 'modelo' in filters and filters['modelo'] not in index.attributes['modelo']:
+            filters = dict(filters, modelo=sorted(models)[0])
+        expected, old = timed(lambda: json.dumps([dict(m) for m in legacy(listings, filters, ranges)]), repeat=1)
+        expected = [m['listId'] for m in json.loads(expected)]
+
+        def first_page():
+            rows, next_cursor, total = index.query(filters, ranges, limit=LISTINGS_PAGE_SIZE)
+            return json.dumps({'listings': [dict(listings[i]) for i in rows.tolist()], 'next_cursor': next_cursor,
+                               'total': total})
+        _, new = timed(first_page)
+
+        ids, cursor, pages = [], None, 0
+        while True:
+            rows, cursor, total = index.query(filters, ranges, cursor, limit=500)
+            ids.extend(listings.get(i, 'listId') for i in rows.tolist())
+            pages += 1
+            if cursor is None:
+                break
+        same = ids == expected and total == len(expected)
+        print(f'{name:>22} {len(expected):>11} {old:>14.1f} {new:>12.2f} {pages:>8} {str(same):>7}')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
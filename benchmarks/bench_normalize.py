@@ -0,0 +1,168 @@
+"""Limpeza do feed bruto: clean_feed + prepare_listing (anterior) vs normalize
+
+Gera em memória um feed sintético no formato de OlxMotosSpider.parse (ids inteiros,
+linhas vazias, financiados e duplicados) e mede três etapas em cada caminho:
+- limpeza: clean_feed anterior vs FeedNormalizer.clean em blocos de NORMALIZE_CHUNK_ROWS
+  (as duas anúncio a anúncio; a nova também valida o preço e registra os descartes);
+- preparo: prepare_listing anterior vs normalize.prepare_frame (preço e quilometragem);
+- ListingStore: from_listings vs append_frame.
+Mede também só a conversão de preço, quilometragem e cilindrada dos anúncios aceitos:
+valor a valor (parse_price, parse_km e a expressão regular em cada string) vs em colunas
+(parse_prices, parse_kms e parse_cilindrada, com o pyarrow.compute).
+
+Confere (assert) a paridade:
+- os anúncios limpos (o conteúdo de motos_data.json) são iguais, com as chaves na mesma ordem;
+- os ListingStore têm os mesmos buffers;
+- o número de descartados bate com o relatório de FeedNormalizer;
+- as conversões em colunas dão os mesmos números que as conversões valor a valor.
+Anúncios limpos e ListingStore são comparados por hash, para não manter os dois caminhos em
+memória. O coletor de lixo fica desligado nas medições, como no timeit: com o feed inteiro em
+memória, as coletas completas pesariam mais que as próprias etapas.
+
+Uso: python benchmarks/bench_normalize.py [linhas]
+"""
+import gc
+import hashlib
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+from synthetic import synthetic_raw_feed
+
+from ingest import batched, normalize_listing_id
+from listing_store import ListingStore
+from normalize import (NORMALIZE_CHUNK_ROWS, FeedNormalizer, parse_cilindrada, parse_km, parse_kms, parse_price,
+                       parse_prices, prepare_frame)
+
+
+def legacy_clean_feed(records):
+    # Limpeza anterior (ingest.clean_feed), um anúncio por vez
+    seen = set()
+    for m in records:
+        if m.get('status_financeiro') == 'Financiado':
+            continue
+        listing_id = normalize_listing_id(m.get('listId'))
+        if not listing_id or listing_id in seen:
+            continue
+        seen.add(listing_id)
+        m['listId'] = listing_id
+        m['quilometragem'] = normalize_listing_id(m.get('quilometragem'))
+        m['ano'] = normalize_listing_id(m.get('ano'))
+        yield m
+
+
+def legacy_prepare_listing(m):
+    # Preparo anterior (ingest.prepare_listing)
+    if m['price'] and isinstance(m['price'], str):
+        m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.'))
+    else:
+        m['price_value'] = 0.0
+    if m['quilometragem'] and m['quilometragem'].isdigit():
+        m['km'] = int(m['quilometragem'])
+    else:
+        m['km'] = 0
+    if 'imagens' in m and 'images' not in m:
+        m['images'] = m['imagens']
+    return m
+
+
+def scalar_conversions(prices, kms, cilindradas):
+    # Preço, quilometragem e cilindrada convertidos valor a valor
+    price_values = np.array([np.nan if (price := parse_price(value)) is None else price for value in prices])
+    km_values = np.array([parse_km(value) for value in kms], dtype=np.int64)
+    digits = (re.sub(r'[^0-9]+', '', str(value)) for value in cilindradas)
+    return price_values, km_values, np.array([int(value) if value else -1 for value in digits], dtype=np.int64)
+
+
+def column_conversions(prices, kms, cilindradas):
+    return parse_prices(prices), parse_kms(kms), parse_cilindrada(cilindradas)
+
+
+def records_digest(digest, records):
+    # JSON de cada anúncio, com as chaves na ordem em que estão
+    for m in records:
+        digest.update(json.dumps(m, ensure_ascii=False).encode('utf-8'))
+
+
+def store_digest(store):
+    """Hash de categorias, códigos, números e buffers de texto de um ListingStore"""
+    digest = hashlib.sha256()
+    for field, codes in store.categorical.items():
+        digest.update(repr((field, store.categories[field])).encode())
+        digest.update(codes.tobytes())
+    for values in store.numeric.values():
+        digest.update(values.tobytes())
+    for column in list(store.text.values()) + [store.extra]:
+        digest.update(bytes(column.data))
+        digest.update(column.offsets.tobytes())
+        digest.update(column.null.tobytes())
+    return digest.hexdigest()
+
+
+def main(lines=1000000):
+    start = time.perf_counter()
+    feed = list(synthetic_raw_feed(lines))
+    print(f'{lines} linhas brutas geradas em {time.perf_counter() - start:.1f} s')
+    gc.disable()
+
+    # Os dois caminhos alteram os dicionários do feed: o novo recebe cópias (só as chaves do topo mudam)
+    normalizer = FeedNormalizer()
+    store = ListingStore()
+    cleaned_new, times_new = hashlib.sha256(), [0.0, 0.0, 0.0]
+    for batch in batched((dict(m) for m in feed), NORMALIZE_CHUNK_ROWS):
+        t0 = time.perf_counter()
+        records = normalizer.clean(batch)
+        t1 = time.perf_counter()
+        frame = prepare_frame(records)
+        t2 = time.perf_counter()
+        store.append_frame(frame)
+        t3 = time.perf_counter()
+        times_new = [times_new[0] + t1 - t0, times_new[1] + t2 - t1, times_new[2] + t3 - t2]
+        records_digest(cleaned_new, records)
+        del batch, records, frame
+    digest_new = store_digest(store)
+    del store
+
+    t0 = time.perf_counter()
+    cleaned = list(legacy_clean_feed(feed))
+    t1 = time.perf_counter()
+    cleaned_old = hashlib.sha256()
+    records_digest(cleaned_old, cleaned)
+    assert cleaned_old.hexdigest() == cleaned_new.hexdigest(), 'anúncios limpos divergentes'
+    assert lines - len(cleaned) == len(normalizer.rejected()), 'número de descartados divergente'
+
+    t2 = time.perf_counter()
+    for m in cleaned:
+        legacy_prepare_listing(m)
+    t3 = time.perf_counter()
+    store = ListingStore.from_listings(cleaned)
+    t4 = time.perf_counter()
+    times_old = [t1 - t0, t3 - t2, t4 - t3]
+    assert store_digest(store) == digest_new, 'ListingStore divergentes'
+
+    print(f"{'etapa':>12} {'anterior (s)':>13} {'normalize (s)':>14} {'linhas/s anterior':>18} "
+          f"{'linhas/s normalize':>19}")
+    for name, old, new in zip(('limpeza', 'preparo', 'ListingStore', 'total'), times_old + [sum(times_old)],
+                              times_new + [sum(times_new)]):
+        print(f'{name:>12} {old:>13.2f} {new:>14.2f} {lines / old:>18.0f} {lines / new:>19.0f}')
+
+    print(f'{len(cleaned)} anúncios aceitos; descartados: {normalizer.rejected_counts()}')
+    print('anúncios limpos, ListingStore e descartados iguais nos dois caminhos')
+
+    values = [[m.get(field) for m in cleaned] for field in ('price', 'quilometragem', 'cilindrada')]
+    del cleaned, store
+    results = {}
+    for name, convert in (('valor a valor', scalar_conversions), ('colunas', column_conversions)):
+        start = time.perf_counter()
+        results[name] = convert(*values)
+        elapsed = time.perf_counter() - start
+        print(f'conversão {name:>13}: {elapsed:.2f} s ({len(values[0]) / elapsed:.0f} anúncios/s)')
+    assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(*results.values())), 'conversões divergentes'
+    print('preço, quilometragem e cilindrada iguais nas duas conversões')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,41 @@
+"""Escalabilidade do build paralelo de arestas de 1 até N processos
+
+Uso: python benchmarks/bench_parallel.py [anúncios] [max_workers]
+"""
+import os
+import sys
+import time
+
+from synthetic import synthetic_listings
+
+from similarity import encode_listings, build_edges
+
+
+def main(n, max_workers):
+    listings = synthetic_listings(n)
+    for m in listings:
+        m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.')) if m['price'] else 0.0
+    columns = encode_listings(listings)
+
+    reference = None
+    workers = 1
+    print(f"{'processos':>10} {'tempo (s)':>10} {'speedup':>8} {'arestas':>10}")
+    while workers <= max_workers:
+        start = time.perf_counter()
+        edges = build_edges(columns, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference, baseline = edges, elapsed
+        # A saída deve ser idêntica para qualquer número de processos
+        for a, b in zip(edges, reference):
+            assert (a == b).all(), 'saída diferente do build sequencial'
+
+        print(f'{workers:>10} {elapsed:>10.2f} {baseline / elapsed:>8.2f} {len(edges[0]):>10}')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    main(n, max_workers)
@@ -0,0 +1,94 @@
+"""Tamanho das respostas e tempo de serialização dos endpoints de anúncios
+
+Para /listings (uma página), /listing/<id>, /similar/<id> e /search compara a
+serialização anterior (dicionários completos, com as fotos em 'imagens' e 'images',
+via json.dumps) com a visão card montada a partir dos fragmentos pré-serializados, com
+cada serializador disponível (json e, se instalado, orjson). Confere que os fragmentos
+decodificados são iguais à projeção feita diretamente nos anúncios.
+
+Uso: python benchmarks/bench_payloads.py [anúncios] [repetições]
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import write_synthetic_file
+
+from grafo import GrafoOlx
+from listing_json import CARD_FIELDS, FULL_FIELDS, SERIALIZERS, ListingFragments
+
+QUERIES = ['honda cg 160', 'yamaha fazer', 'biz 125', 'titan', 'xre 300']
+
+
+def legacy_payloads(mg, ids, rows):
+    # Corpos como eram gerados antes: dicionários completos de cada anúncio
+    listing = mg.get_listing(ids[0])
+    similar = [{**s, **dict(mg.get_listing(s['id']))} for s in mg.get_similar_listings(ids[0])]
+    return {
+        '/listings': lambda: json.dumps([dict(mg.listings[i]) for i in rows]).encode(),
+        '/listing/<id>': lambda: json.dumps(dict(listing)).encode(),
+        '/similar/<id>': lambda: json.dumps(similar).encode(),
+        '/search': lambda: json.dumps([{'listing': dict(r['listing']), 'similarity': r['similarity']}
+                                       for r in mg.search_listings(QUERIES[0])]).encode(),
+    }
+
+
+def fragment_payloads(mg, fragments, ids, rows):
+    listing = mg.get_listing(ids[0])
+    similar = mg.get_similar_listings(ids[0])
+    similar_rows = [mg.get_listing(s['id']).row for s in similar]
+    extra = [{'id': s['id'], 'similarity': s['similarity']} for s in similar]
+    dumps = fragments.dumps
+
+    def search():
+        return b'[' + b','.join(b'{"listing":' + fragments.fragment(mg.listings, r['listing'].row) + b',"similarity":'
+                                + dumps(r['similarity']) + b'}' for r in mg.search_listings(QUERIES[0])) + b']'
+
+    return {
+        '/listings': lambda: (b'{"listings":' + fragments.array(mg.listings, rows) + b',"next_cursor":null,"total":'
+                              + dumps(len(rows)) + b'}'),
+        '/listing/<id>': lambda: fragments.fragment(mg.listings, listing.row, FULL_FIELDS),
+        '/similar/<id>': lambda: fragments.array(mg.listings, similar_rows, extra=extra),
+        '/search': search,
+    }
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func()
+    return body, (time.perf_counter() - start) / repeat * 1000
+
+
+def main(n=5000, repeat=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+    ids = [m['listId'] for m in random.Random(0).sample(list(mg.listings), 10)]
+    rows, _, _ = mg.query_listings(limit=50)
+
+    variants = {'anterior (json)': legacy_payloads(mg, ids, rows)}
+    for name in SERIALIZERS:
+        start = time.perf_counter()
+        fragments = ListingFragments(name).fit(mg.listings)
+        print(f'{len(mg.listings)} anúncios: fragmentos card com {name} em {time.perf_counter() - start:.2f} s, '
+              f'{sum(map(len, fragments.cards)) / 1024 / 1024:.1f} MB')
+        variants[f'card ({name})'] = fragment_payloads(mg, fragments, ids, rows)
+
+        # Os fragmentos decodificados devem ser a projeção card de cada anúncio
+        same = all(json.loads(fragments.cards[i]) == fragments.project(mg.listings[i], CARD_FIELDS)
+                   for i in range(len(mg.listings)))
+        print(f'  fragmentos iguais à projeção: {same}')
+
+    print(f"{'endpoint':>14} {'serialização':>17} {'bytes':>9} {'gzip':>8} {'tempo (ms)':>11}")
+    for endpoint in variants['anterior (json)']:
+        for variant, payloads in variants.items():
+            body, elapsed = timed(payloads[endpoint], repeat)
+            print(f'{endpoint:>14} {variant:>17} {len(body):>9} {len(gzip.compress(body)):>8} {elapsed:>11.3f}')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,56 @@
+"""Latência de /listing, /similar, /search e /api/node com o Flask test client
+
+Uso: python benchmarks/bench_requests.py [n1 n2 ...]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import write_synthetic_file
+
+import app as flask_app
+from grafo import GrafoOlx
+
+ENDPOINTS = ['/listing/{id}', '/similar/{id}', '/api/node/{id}', '/search?q=honda+cg+160']
+
+
+def linear_lookup(mg, listing_id):
+    # Busca anterior: varredura de todos os anúncios comparando strings
+    for m in mg.listings:
+        if m['listId'] == listing_id or str(m['listId']) == str(listing_id):
+            return m
+
+
+def latency(client, path, ids, rounds):
+    start = time.perf_counter()
+    for k in range(rounds):
+        response = client.get(path.format(id=ids[k % len(ids)]))
+        assert response.status_code in (200, 404)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(sizes, rounds=200):
+    client = flask_app.app.test_client()
+    print(f"{'anúncios':>9} " + ' '.join(f'{p.split("?")[0]:>16}' for p in ENDPOINTS) + f" {'varredura (ms)':>15}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), n))
+        flask_app.mg = mg
+        ids = [int(m['listId']) for m in random.Random(0).sample(mg.listings, min(100, n))]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            timings = [latency(client, path, ids, rounds) for path in ENDPOINTS]
+        start = time.perf_counter()
+        for listing_id in ids[:20]:
+            linear_lookup(mg, listing_id)
+        scan = (time.perf_counter() - start) / 20 * 1000
+
+        print(f'{n:>9} ' + ' '.join(f'{t:>13.2f} ms' for t in timings) + f' {scan:>15.2f}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 100000])
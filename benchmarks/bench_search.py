@@ -0,0 +1,52 @@
+"""Latência de /search: reajuste do TF-IDF por consulta (anterior) vs índice persistente
+
+Uso: python benchmarks/bench_search.py [n1 n2 ...]
+"""
+import sys
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from synthetic import load_real_listings, synthetic_listings
+
+from search_index import SearchIndex, listing_document
+
+QUERIES = ['honda cg 160', 'yamaha fazer 250', 'bmw gs', 'biz 125 2020', 'kawasaki ninja', 'titan flex']
+
+
+def legacy_search(listings, query_text, top_n=10):
+    # Implementação anterior de GrafoOlx.search_listings
+    docs = [listing_document(m) for m in listings]
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(docs)
+    similarity_scores = cosine_similarity(vectorizer.transform([query_text]), tfidf_matrix)[0]
+    return [idx for idx in similarity_scores.argsort()[-top_n:][::-1] if similarity_scores[idx] > 0]
+
+
+def throughput(search, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in QUERIES:
+            search(query)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(QUERIES)) * 1000, rounds * len(QUERIES) / elapsed
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'ajuste (s)':>11} {'anterior (ms)':>14} {'índice (ms)':>12} {'consultas/s':>12}")
+    for n in sizes:
+        listings = load_real_listings() if n == 0 else synthetic_listings(n)
+
+        start = time.perf_counter()
+        index = SearchIndex().fit(listings)
+        fit_time = time.perf_counter() - start
+
+        legacy_ms, _ = throughput(lambda q: legacy_search(listings, q), 1)
+        index_ms, qps = throughput(lambda q: index.search(q), 20)
+        print(f'{n or len(listings):>9} {fit_time:>11.2f} {legacy_ms:>14.2f} {index_ms:>12.3f} {qps:>12.0f}')
+
+
+if __name__ == '__main__':
+    # 0 = dados reais de motos_data.json
+    main([int(a) for a in sys.argv[1:]] or [0, 10000, 100000])
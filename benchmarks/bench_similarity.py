@@ -0,0 +1,61 @@
+"""Compara o laço escalar de calculate_similarity com o construtor vetorizado de arestas
+
+Uso: python benchmarks/bench_similarity.py [n1 n2 ...]
+"""
+import sys
+import time
+
+from synthetic import DATA_FILE, synthetic_listings
+
+from grafo import GrafoOlx
+from similarity import encode_listings, build_edges
+
+
+def scalar_edges(mg, listings):
+    edges = []
+    for i, m1 in enumerate(listings):
+        for j, m2 in enumerate(listings[i+1:], i+1):
+            similarity = mg.calculate_similarity(m1, m2)
+            if similarity > mg.threshold:
+                edges.append((i, j, similarity))
+    return edges
+
+
+def prepare(mg, listings):
+    # Reaplica a limpeza de load_data aos anúncios sintéticos
+    mg.listings = listings
+    for m in listings:
+        m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.')) if m['price'] else 0.0
+    return listings
+
+
+def main(sizes):
+    mg = GrafoOlx(DATA_FILE)
+
+    # Paridade com os dados reais
+    reference = scalar_edges(mg, mg.listings)
+    s, t, w = build_edges(encode_listings(mg.listings), mg.threshold)
+    assert reference == list(zip(s.tolist(), t.tolist(), w.tolist())), 'arestas divergentes'
+    print(f'paridade ok: {len(reference)} arestas em {len(mg.listings)} anúncios reais')
+
+    print(f"{'anúncios':>10} {'escalar (s)':>12} {'vetorizado (s)':>15} {'arestas':>10}")
+    for n in sizes:
+        listings = prepare(mg, synthetic_listings(n))
+
+        start = time.perf_counter()
+        columns = encode_listings(listings)
+        s, t, w = build_edges(columns, mg.threshold)
+        vectorized = time.perf_counter() - start
+
+        scalar = float('nan')
+        if n <= 3000:
+            start = time.perf_counter()
+            reference = scalar_edges(mg, listings)
+            scalar = time.perf_counter() - start
+            assert reference == list(zip(s.tolist(), t.tolist(), w.tolist())), 'arestas divergentes'
+
+        print(f'{n:>10} {scalar:>12.2f} {vectorized:>15.2f} {len(s):>10}')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 3000, 10000, 30000])
@@ -0,0 +1,42 @@
+"""Tempo de inicialização do GrafoOlx com e sem snapshot
+
+Uso: python benchmarks/bench_startup.py [arquivo_de_dados]
+"""
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import DATA_FILE, ROOT
+
+# Cada medição roda em um processo novo, como o início de um worker do Flask
+STARTUP = """
+import time
+from grafo import GrafoOlx
+start = time.perf_counter()
+GrafoOlx({data_file!r}, snapshot_dir={snapshot_dir!r})
+print(time.perf_counter() - start)
+"""
+
+
+def startup(data_file, snapshot_dir):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', STARTUP.format(data_file=data_file, snapshot_dir=snapshot_dir)],
+                            cwd=ROOT, check=True, capture_output=True, text=True)
+    return time.perf_counter() - start, float(result.stdout.split()[-1])
+
+
+def main(data_file):
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        rows = [
+            ('sem snapshot', startup(data_file, None)),
+            ('snapshot (gravação)', startup(data_file, snapshot_dir)),
+            ('snapshot (leitura)', startup(data_file, snapshot_dir)),
+        ]
+    print(f"{'':<22} {'processo (s)':>13} {'GrafoOlx (s)':>13}")
+    for label, (total, graph) in rows:
+        print(f'{label:<22} {total:>13.2f} {graph:>13.2f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DATA_FILE)
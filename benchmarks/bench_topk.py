@@ -0,0 +1,60 @@
+"""Latência de /similar: ordenação de todos os vizinhos (anterior) vs tabela top-k pré-calculada
+
+Uso: python benchmarks/bench_topk.py [n1 n2 ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import DATA_FILE, write_synthetic_file
+
+from grafo import GrafoOlx
+
+
+def legacy_similar(mg, listing_id, top_n=5):
+    # Implementação anterior de GrafoOlx.get_similar_listings (sem os prints)
+    node_id = mg._node_id(listing_id)
+    if node_id is None:
+        return []
+    neighbors = mg.G.neighbors_with_weights(node_id)
+    neighbors.sort(key=lambda x: x[1], reverse=True)
+    return [{'id': n_id, 'similarity': similarity} for n_id, similarity in neighbors[:top_n]]
+
+
+def per_call_ms(fn, ids):
+    start = time.perf_counter()
+    for listing_id in ids:
+        fn(listing_id)
+    return (time.perf_counter() - start) / len(ids) * 1000
+
+
+def main(sizes):
+    print(f"{'anúncios':>9} {'grau médio':>11} {'tabela (s)':>11} {'anterior (ms)':>14} {'top-k (ms)':>11} {'MB tabela':>10} {'iguais':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            data_file = DATA_FILE if n == 0 else write_synthetic_file(os.path.join(tmp, f'motos_{n}.json'), n)
+            mg = GrafoOlx(data_file)
+
+            start = time.perf_counter()
+            mg.build_top_k()
+            build_time = time.perf_counter() - start
+
+            rng = random.Random(0)
+            ids = [m['listId'] for m in rng.choices(mg.listings, k=2000)]
+            legacy_ms = per_call_ms(lambda i: legacy_similar(mg, i), ids)
+            table_ms = per_call_ms(mg.get_similar_listings, ids)
+
+            same = all([(s['id'], s['similarity']) for s in mg.get_similar_listings(i, top_n)] ==
+                       [(s['id'], s['similarity']) for s in legacy_similar(mg, i, top_n)]
+                       for i in ids[:500] for top_n in (1, 5, mg.top_k, mg.top_k + 5))
+            table_mb = (mg.top_k_table.neighbors.nbytes + mg.top_k_table.weights.nbytes) / 1e6
+            degree = 2 * mg.G.number_of_edges() / max(len(mg.listings), 1)
+            print(f'{len(mg.listings):>9} {degree:>11.1f} {build_time:>11.3f} {legacy_ms:>14.3f} '
+                  f'{table_ms:>11.4f} {table_mb:>10.1f} {str(same):>7}')
+
+
+if __name__ == '__main__':
+    # 0 = dados reais de motos_data.json
+    main([int(a) for a in sys.argv[1:]] or [0, 10000, 100000])
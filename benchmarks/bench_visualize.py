@@ -0,0 +1,71 @@
+"""Teste de carga de /visualize: requisições concorrentes com chaves misturadas
+
+Várias threads pedem gráficos de estado, marca e preço com parâmetros variados (chaves
+de cache diferentes, as mais populares pedidas com mais frequência) contra um
+RenderCache em diretório temporário, com limite de bytes pequeno para forçar remoções.
+Reporta latência, renderizações, acertos, requisições que aguardaram uma renderização
+em andamento e remoções, e confere que cada chave sempre devolve a mesma imagem.
+
+Uso: python benchmarks/bench_visualize.py [requisições] [threads] [chaves]
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from synthetic import write_synthetic_file
+
+import app as flask_app
+from grafo import GrafoOlx
+from render_cache import RenderCache
+
+TYPES = ['state', 'brand', 'price']
+
+
+def main(requests=400, threads=8, keys=40, max_bytes=1024 * 1024):
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app.mg = GrafoOlx(write_synthetic_file(os.path.join(tmp, 'motos.json'), 2000))
+        flask_app.render_cache = RenderCache(os.path.join(tmp, 'cache'), max_bytes=max_bytes)
+        client = flask_app.app.test_client()
+
+        # Distribuição de Zipf: poucas chaves concentram a maior parte das requisições
+        rng = random.Random(0)
+        paths = [f'/visualize?type={TYPES[k % len(TYPES)]}&highlight_id={k}' for k in range(keys)]
+        weights = [1 / (k + 1) for k in range(keys)]
+        workload = rng.choices(paths, weights, k=requests)
+
+        def fetch(path):
+            start = time.perf_counter()
+            response = client.get(path)
+            assert response.status_code == 200 and response.data[:8] == b'\x89PNG\r\n\x1a\n'
+            return path, hashlib.sha256(response.data).hexdigest(), (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(fetch, workload))
+        elapsed = time.perf_counter() - start
+
+        digests = {}
+        for path, digest, _ in results:
+            digests.setdefault(path, set()).add(digest)
+        latencies = np.array([latency for _, _, latency in results])
+        stats = flask_app.render_cache.stats()
+        print(f'{requests} requisições, {threads} threads, {len(set(workload))} chaves distintas, '
+              f'limite {max_bytes / 1024:.0f} KB')
+        print(f'vazão {requests / elapsed:.1f} req/s, latência p50 {np.percentile(latencies, 50):.1f} ms, '
+              f'p95 {np.percentile(latencies, 95):.1f} ms, máx {latencies.max():.1f} ms')
+        print(f"renderizações {stats['renders']}, acertos {stats['hits']}, aguardaram {stats['coalesced']}, "
+              f"faltas {stats['misses']}, remoções {stats['evictions']}, "
+              f"em cache {stats['entries']} ({stats['bytes'] / 1024:.0f} KB)")
+        print(f'uma renderização por falta: {stats["renders"] == stats["misses"]}; '
+              f'imagem estável por chave: {all(len(d) == 1 for d in digests.values())}; '
+              f'dentro do limite: {stats["bytes"] <= max_bytes}')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,135 @@
+"""Teste de carga do servidor de produção (gunicorn + wsgi.py) com diferentes números de workers
+
+Para cada número de workers inicia o gunicorn com gunicorn.conf.py sobre um arquivo de
+anúncios sintético, espera o /readyz e dispara requisições em conexões keep-alive a
+partir de várias threads, uma rodada por endpoint (/similar, /search e /api/node).
+Reporta requisições por segundo, latência e a memória dos processos: a soma do RSS
+conta as páginas compartilhadas uma vez por processo, a soma do PSS as divide entre eles.
+
+Uso: python benchmarks/bench_wsgi.py [anúncios] [workers1 workers2 ...]
+"""
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from synthetic import ROOT, write_synthetic_file
+
+CLIENT_THREADS = 16
+DURATION = 10
+ENDPOINTS = ['/similar/{id}', '/search?q={query}', '/api/node/{id}']
+QUERIES = ['honda cg 160', 'yamaha fazer', 'biz 125', 'titan', 'xre 300']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, process, timeout=1800):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminou antes de ficar pronto')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/readyz')
+            response = conn.getresponse()
+            body = response.read()
+            if response.status == 200:
+                return json.loads(body)
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError('gunicorn não ficou pronto')
+
+
+def memory(pid):
+    # RSS e PSS (kB) do processo principal e dos workers
+    pids = [pid] + [int(p) for p in open(f'/proc/{pid}/task/{pid}/children').read().split()]
+    rss = pss = 0
+    for p in pids:
+        for line in open(f'/proc/{p}/smaps_rollup'):
+            if line.startswith('Rss:'):
+                rss += int(line.split()[1])
+            elif line.startswith('Pss:'):
+                pss += int(line.split()[1])
+    return len(pids) - 1, rss / 1024, pss / 1024
+
+
+def load(port, endpoint, ids, duration=DURATION):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.perf_counter() < stop:
+            path = endpoint.format(id=rng.choice(ids), query=rng.choice(QUERIES).replace(' ', '+'))
+            start = time.perf_counter()
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            assert response.status in (200, 404)
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(CLIENT_THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies) / duration, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main(n=10000, worker_counts=(1, 2, 4)):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = write_synthetic_file(os.path.join(tmp, 'motos.json'), n)
+        ids = [m['listId'] for m in random.Random(0).sample(json.load(open(data_file)), 200)]
+        print(f'{n} anúncios, {CLIENT_THREADS} conexões, {DURATION} s por endpoint, {os.cpu_count()} CPU(s)')
+        print(f"{'workers':>8} {'pronto (s)':>11} {'endpoint':>14} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'RSS (MB)':>9} {'PSS (MB)':>9}")
+        for workers in worker_counts:
+            port = free_port()
+            env = dict(os.environ, GRAFO_WORKERS=str(workers), GRAFO_BIND=f'127.0.0.1:{port}',
+                       GRAFO_DATA_FILE=data_file, LOG_LEVEL='warning')
+            start = time.time()
+            log = open(os.path.join(tmp, f'gunicorn-{workers}.log'), 'w')
+            process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                                       cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+            try:
+                try:
+                    wait_ready(port, process)
+                except RuntimeError:
+                    log.close()
+                    print(open(log.name).read()[-2000:])
+                    raise
+                ready = time.time() - start
+                for endpoint in ENDPOINTS:
+                    rate, p50, p95 = load(port, endpoint, ids)
+                    _, rss, pss = memory(process.pid)
+                    print(f'{workers:>8} {ready:>11.1f} {endpoint.split("?")[0]:>14} {rate:>8.0f} {p50:>9.1f} '
+                          f'{p95:>9.1f} {rss:>9.0f} {pss:>9.0f}')
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait()
+                log.close()
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args[:1], *([args[1:]] if len(args) > 1 else []))
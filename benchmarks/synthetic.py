@@ -0,0 +1,76 @@
+"""Geração de anúncios sintéticos para os benchmarks, baseada na distribuição de motos_data.json"""
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DATA_FILE = os.path.join(ROOT, 'motos_data.json')
+
+
+def load_real_listings():
+    with open(DATA_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_listings(n, seed=0):
+    """Gera n anúncios no formato de motos_data.json (após a limpeza de initial_populate)"""
+    rng = random.Random(seed)
+    real = load_real_listings()
+    models = [(m['marca'], m['modelo'], m['cilindrada'], m['title']) for m in real]
+    states = sorted(set(m['estado'] for m in real))
+    images = real[0]['imagens']
+
+    listings = []
+    for k in range(n):
+        marca, modelo, cilindrada, title = rng.choice(models)
+        price = rng.random() < 0.98 and int(rng.lognormvariate(9.6, 0.8)) or None
+        listings.append({
+            'listId': str(1000000000 + k),
+            'title': title,
+            'price': f"R$ {price:,}".replace(',', '.') if price else None,
+            'estado': rng.choice(states),
+            'url': f'https://olx.com.br/motos/{1000000000 + k}',
+            'cilindrada': cilindrada,
+            'marca': marca,
+            'modelo': modelo,
+            'ano': str(rng.randint(2000, 2025)),
+            'quilometragem': str(rng.randint(0, 120) * 1000),
+            'status_financeiro': 'Quitado',
+            'locations': 'Brasília - DDD 61',
+            'imagens': images,
+        })
+    return listings
+
+
+def write_synthetic_file(path, n, seed=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(synthetic_listings(n, seed), f)
+    return path
+
+
+def synthetic_raw_feed(lines, seed=0):
+    """Gera anúncios no formato bruto de OlxMotosSpider.parse, um por vez
+
+    Os ids são inteiros; há linhas vazias (todos os campos None), anúncios financiados
+    e ids repetidos, como no feed real.
+    """
+    rng = random.Random(seed)
+    real = load_real_listings()
+    for k in range(lines):
+        m = dict(rng.choice(real))
+        roll = rng.random()
+        if roll < 0.05:
+            # Linhas vazias que o spider emite quando a página não traz o anúncio
+            m = {key: None for key in m}
+        else:
+            # Duplicados reaproveitam um id anterior
+            m['listId'] = 1000000000 + (rng.randrange(k) if roll < 0.07 and k else k)
+            m['status_financeiro'] = 'Financiado' if roll > 0.9 else 'Quitado'
+            m['price'] = f"R$ {int(rng.lognormvariate(9.6, 0.8)):,}".replace(',', '.')
+            m['ano'] = str(rng.randint(2000, 2025))
+            m['quilometragem'] = str(rng.randint(0, 120) * 1000)
+        yield m
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def _first_appearance_labels(labels):
+    # Renumera as comunidades de 0 a k-1 na ordem em que aparecem nos nós
+    if len(labels) == 0:
+        return np.empty(0, dtype=np.int64)
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    return rank[inverse]
+
+
+def connected_components(n, sources, targets):
+    """Componentes conexos com union-find (compressão de caminho e união por tamanho)"""
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(np.asarray(sources).tolist(), np.asarray(targets).tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            if size[ra] < size[rb]:
+                ra, rb = rb, ra
+            parent[rb] = ra
+            size[ra] += size[rb]
+
+    return _first_appearance_labels(np.fromiter((find(x) for x in range(n)), dtype=np.int64, count=n))
+
+
+def label_propagation(n, sources, targets, weights, max_iterations=30, seed=0, initial=None, active=None):
+    """Propagação de rótulos ponderada pelo peso das arestas
+
+    A cada iteração uma metade aleatória (com semente fixa) dos nós adota o rótulo com
+    maior soma de pesos entre seus vizinhos; empates ficam com o menor rótulo. Atualizar
+    apenas parte dos nós evita a oscilação da versão totalmente síncrona.
+
+    Só são reavaliados os nós ativos: os que ainda têm um rótulo melhor pendente e os
+    vizinhos de nós que mudaram de rótulo. initial permite partir de uma partição anterior
+    (rótulos negativos marcam nós novos, com rótulo próprio) e active restringe os nós
+    ativos na primeira iteração (por padrão todos).
+    """
+    if initial is None:
+        labels = np.arange(n, dtype=np.int64)
+    else:
+        labels = np.array(initial, dtype=np.int64)
+        fresh = labels < 0
+        labels[fresh] = labels.max(initial=-1) + 1 + np.arange(fresh.sum())
+        labels = _first_appearance_labels(labels)
+    if n == 0 or len(sources) == 0:
+        return _first_appearance_labels(labels)
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    rows = np.concatenate([sources, targets])
+    cols = np.concatenate([targets, sources])
+    values = np.concatenate([weights, weights]).astype(np.float64)
+    active = np.ones(n, dtype=bool) if active is None else np.array(active, dtype=bool)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        # Soma dos pesos por (nó ativo, rótulo do vizinho)
+        entries = active[rows]
+        keys, inverse = np.unique(rows[entries] * n + labels[cols[entries]], return_inverse=True)
+        totals = np.bincount(inverse, weights=values[entries])
+        key_rows = keys // n
+        key_labels = keys % n
+
+        # Para cada nó, o rótulo de maior peso (o menor rótulo em caso de empate)
+        order = np.lexsort((key_labels, -totals, key_rows))
+        best = order[np.r_[True, key_rows[order][1:] != key_rows[order][:-1]]]
+
+        proposal = labels.copy()
+        proposal[key_rows[best]] = key_labels[best]
+        update = rng.random(n) < 0.5
+        differs = proposal != labels
+        changed = update & differs
+        labels[changed] = proposal[changed]
+
+        # Próxima iteração: pendentes e vizinhos dos nós que mudaram
+        active = differs & ~update
+        active[rows[changed[cols]]] = True
+
+    return _first_appearance_labels(labels)
+
+
+COMMUNITY_METHODS = {
+    # Os componentes são sempre recalculados; initial e active só são usados pela propagação de rótulos
+    'components': lambda n, sources, targets, weights, initial=None, active=None: connected_components(n, sources, targets),
+    'label_propagation': label_propagation,
+}
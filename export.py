@@ -0,0 +1,171 @@
+"""Exportação em fluxo dos anúncios e das arestas do grafo (NDJSON ou CSV)
+
+Os geradores produzem blocos de bytes com EXPORT_CHUNK_ROWS anúncios (ou as arestas
+desses anúncios) por vez, então a memória usada não cresce com o tamanho do grafo. São
+usados pelos endpoints /export/listings e /export/edges e pela linha de comando:
+
+    python export.py listings --format csv --gzip -o anuncios.csv.gz
+    python export.py edges -o arestas.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+
+import numpy as np
+
+from listing_json import FULL_FIELDS, ListingFragments, parse_fields
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# Anúncios por bloco gerado
+EXPORT_CHUNK_ROWS = 1000
+EDGE_FIELDS = ('source', 'target', 'weight')
+
+
+class ExportView:
+    """O que uma exportação percorre, fixado no início (ver GrafoOlx.export_view)
+
+    rows são as linhas exportadas (range em uma exportação completa), removed os listIds
+    removidos em um delta e version a versão do grafo, a ser usada como since na próxima.
+    """
+
+    __slots__ = ('version', 'listings', 'csr', 'rows', 'removed', 'delta')
+
+    def __init__(self, version, listings, csr, rows, removed=(), delta=False):
+        self.version = version
+        self.listings = listings
+        self.csr = csr
+        self.rows = rows
+        self.removed = list(removed)
+        self.delta = delta
+
+
+def _chunks(rows, size=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _csv_bytes(records):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(records)
+    return buf.getvalue().encode('utf-8')
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return value
+
+
+def export_listings(view, fmt='ndjson', fields=FULL_FIELDS, fragments=None):
+    """Blocos (bytes) com os anúncios de uma ExportView, seguidos dos removidos em um delta
+
+    Em NDJSON cada removido é {"listId": ..., "removed": true}; em CSV a coluna removed
+    vale 1 nessas linhas, que trazem apenas o listId.
+    """
+    fragments = fragments or ListingFragments()
+    dumps = fragments.dumps
+    listings = view.listings
+    if fmt == 'csv':
+        yield _csv_bytes([fields + ('removed',)])
+    for rows in _chunks(view.rows):
+        records = [fragments.project(listings[i], fields) for i in np.asarray(rows).tolist()]
+        if fmt == 'csv':
+            yield _csv_bytes([_csv_value(record[field]) for field in fields] + [0] for record in records)
+        else:
+            yield b''.join(dumps(record) + b'\n' for record in records)
+    for removed in _chunks(view.removed):
+        if fmt == 'csv':
+            yield _csv_bytes([listing_id if field == 'listId' else '' for field in fields] + [1]
+                             for listing_id in removed)
+        else:
+            yield b''.join(dumps({'listId': listing_id, 'removed': True}) + b'\n' for listing_id in removed)
+
+
+def export_edges(view, fmt='ndjson', dumps=None):
+    """Blocos (bytes) com as arestas dos anúncios de uma ExportView, cada uma uma única vez
+
+    Em uma exportação completa saem as arestas (origem, destino) com origem antes do
+    destino na ordem dos anúncios; em um delta, todas as arestas que tocam os anúncios
+    novos ou alterados.
+    """
+    dumps = dumps or ListingFragments().dumps
+    listings = view.listings
+    indptr, indices, weights = view.csr
+    selected = None
+    if view.delta:
+        selected = np.zeros(len(indptr) - 1, dtype=bool)
+        selected[view.rows] = True
+    if fmt == 'csv':
+        yield _csv_bytes([EDGE_FIELDS])
+    for rows in _chunks(view.rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        sources = np.repeat(rows, lengths)
+        targets = indices[offsets]
+        # Cada aresta aparece nas linhas dos dois extremos: fica só a da menor linha selecionada
+        keep = sources < targets
+        if selected is not None:
+            keep |= ~selected[targets]
+        sources, targets, values = sources[keep], targets[keep], weights[offsets[keep]]
+        ids = {i: listings.get(i, 'listId') for i in np.union1d(sources, targets).tolist()}
+        edges = [(ids[i], ids[j], w) for i, j, w in zip(sources.tolist(), targets.tolist(), values.tolist())]
+        if fmt == 'csv':
+            yield _csv_bytes(edges)
+        else:
+            yield b''.join(dumps(dict(zip(EDGE_FIELDS, edge))) + b'\n' for edge in edges)
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime um fluxo de blocos em gzip, bloco a bloco"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta anúncios ou arestas do grafo em NDJSON ou CSV')
+    parser.add_argument('dataset', choices=('listings', 'edges'))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--fields', default='full', help="campos dos anúncios: card, full ou nomes separados por vírgula")
+    parser.add_argument('--data-file', default=None, help='padrão: motos_data.arrow se existir, senão motos_data.json')
+    parser.add_argument('--snapshot-dir', default='graph_snapshots')
+    parser.add_argument('--gzip', action='store_true', help='comprime a saída em gzip')
+    parser.add_argument('-o', '--output', help='arquivo de saída (padrão: saída padrão)')
+    args = parser.parse_args(argv)
+    try:
+        fields = parse_fields(args.fields, 'full')
+    except ValueError as e:
+        parser.error(str(e))
+
+    from grafo import GrafoOlx
+    from listing_arrow import preferred_data_file
+    mg = GrafoOlx(args.data_file or preferred_data_file('motos_data.json'), snapshot_dir=args.snapshot_dir)
+    view = mg.export_view()
+    if args.dataset == 'listings':
+        chunks = export_listings(view, args.format, fields, mg.listing_fragments)
+    else:
+        chunks = export_edges(view, args.format, mg.listing_fragments.dumps)
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
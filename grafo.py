@@ -1,12 +1,41 @@
+import copy
 import json
-import matplotlib
-matplotlib.use('Agg')  # Set non-GUI backend
-import matplotlib.pyplot as plt
+import logging
+import os
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, deque
+from similarity import SIMILARITY_THRESHOLD, encode_listings, build_edges, build_edges_for
+from communities import COMMUNITY_METHODS
+from layout import force_layout
+from search_index import SearchIndex
+from snapshot import snapshot_key, snapshot_path, graph_to_csr, write_snapshot, load_snapshot
+from top_k import TOP_K, TopKTable
+from graph_tiles import MAX_VIEWPORT_NODES, MAX_VIEWPORT_EDGES, GraphTiles
+from listing_store import ListingStore
+from listing_arrow import read_listings_arrow
+from listing_json import CARD_FIELDS, ListingFragments
+from export import ExportView
+from listing_query import LISTING_FILTERS, LISTINGS_PAGE_SIZE, RANGE_FILTERS, ListingQueryIndex, inverted_index
+from ingest import FEED_BATCH_SIZE, normalize_listing_id, read_jsonl, batched
+from normalize import FeedNormalizer, prepare_frame
+
+logger = logging.getLogger(__name__)
+
+# Iterações do layout de forças ao refinar posições existentes após uma atualização incremental
+LAYOUT_REFRESH_ITERATIONS = 5
+
+# Faixas do histograma de preços em /visualize?type=price
+PRICE_HISTOGRAM_BINS = 20
+
+# Filtros de /api/graph-data e o campo do anúncio correspondente
+GRAPH_FILTERS = {'state': 'estado', 'brand': 'marca'}
+
+# Lotes de apply_updates lembrados para as exportações incrementais (since=versão)
+CHANGE_LOG_SIZE = 256
 
 class Grafo:
     """Implementação simples de grafos com representação em dicionários e algoritmos de comunidade para classificação de nós e cálculo de similaridades"""
@@ -16,23 +45,56 @@ class Grafo:
         self.nodes = {}
         # Dicionário para armazenar arestas {node_id: {neighbor_id: {attributes}}}
         self.edges = defaultdict(dict)
+        # Comunidades já calculadas {método: {node_id: comunidade}}
+        self._community_cache = {}
     
     def __iter__(self):
         return iter(self.nodes)
     
-    def add_node(self, node_id, **attributes):
-        # Adiciona um nó com atributos ao grafo
-        self.nodes[node_id] = attributes
+    def add_node(self, node_id, attributes=None, **kwargs):
+        # Adiciona um nó com atributos ao grafo; attributes referencia um mapeamento já existente
+        # (ex.: uma ListingView) em vez de copiá-lo
+        self.nodes[node_id] = kwargs if attributes is None else attributes
+        self._community_cache.clear()
     
     def add_edge(self, node1, node2, **attributes):
         # Adiciona uma aresta entre node1 e node2 com atributos
+        self._community_cache.clear()
         self.edges[node1][node2] = attributes
         self.edges[node2][node1] = attributes  # Grafo não direcionado
     
+    def copy(self):
+        # Cópia com dicionários próprios (os atributos dos nós e das arestas são referenciados)
+        G = Grafo()
+        G.nodes = dict(self.nodes)
+        G.edges = defaultdict(dict, {node: dict(neighbors) for node, neighbors in self.edges.items()})
+        G._community_cache = dict(self._community_cache)
+        return G
+    
+    def remove_nodes(self, node_ids):
+        # Remove nós e todas as suas arestas
+        for node in node_ids:
+            if node not in self.nodes:
+                continue
+            for neighbor in self.edges.pop(node, {}):
+                self.edges[neighbor].pop(node, None)
+            del self.nodes[node]
+        self._community_cache.clear()
+    
     def neighbors(self, node_id):
         # Obtém vizinhos de um nó
         return self.edges[node_id].keys()
     
+    def neighbors_with_weights(self, node_id):
+        # Obtém pares (vizinho, peso) de um nó
+        return [(neighbor, attrs.get('weight', 1.0)) for neighbor, attrs in self.edges[node_id].items()]
+    
+    def add_edges_by_index(self, sources, targets, weights):
+        # Adiciona arestas em lote a partir dos índices dos nós (ordem de inserção)
+        ids = list(self.nodes)
+        for i, j, w in zip(np.asarray(sources).tolist(), np.asarray(targets).tolist(), np.asarray(weights).tolist()):
+            self.add_edge(ids[i], ids[j], weight=w)
+    
     def number_of_nodes(self):
         # Obtém o número de nós no grafo
         return len(self.nodes)
@@ -41,27 +103,36 @@ class Grafo:
         # Obtém o número de arestas no grafo
         return sum(len(neighbors) for neighbors in self.edges.values()) // 2  # Divide por 2 para grafo não direcionado
     
-    def detect_communities(self):
-        
-        # Cria comunidade
-        
-        # Inicializa cada nó para sua própria comunidade
-        communities = {node: i for i, node in enumerate(self.nodes)}
-        
-        # Conecta nós em comunidades
-        for node in self.nodes:
-            for neighbor in self.neighbors(node):
-                if communities[node] != communities[neighbor]:
-                    old_community = communities[neighbor]
-                    new_community = communities[node]
-                    for n in self.nodes:
-                        if communities[n] == old_community:
-                            communities[n] = new_community
-        
-        # Cria mapa de comunidades
-        unique_communities = set(communities.values())
-        community_map = {old: new for new, old in enumerate(unique_communities)}
-        return {node: community_map[comm] for node, comm in communities.items()}
+    def detect_communities(self, method='components'):
+        """Detecta comunidades: 'components' (componentes conexos via union-find) ou
+        'label_propagation' (propagação de rótulos ponderada pelo peso das arestas)
+
+        O resultado fica em cache até a próxima alteração de nós ou arestas.
+        """
+        if method not in COMMUNITY_METHODS:
+            raise ValueError(f"Método de detecção de comunidades desconhecido: {method}")
+        if method not in self._community_cache:
+            sources, targets, weights = self.edge_arrays()
+            labels = COMMUNITY_METHODS[method](len(self.nodes), sources, targets, weights)
+            self._community_cache[method] = dict(zip(self.nodes, labels.tolist()))
+        return self._community_cache[method]
+    
+    def set_communities(self, partition, method='components'):
+        # Define uma partição já calculada (ex.: carregada de um snapshot)
+        self._community_cache[method] = partition
+    
+    def cached_communities(self, method='components'):
+        # Partição já calculada pelo método, sem recalcular (None se não houver)
+        return self._community_cache.get(method)
+    
+    def edge_arrays(self):
+        """Arestas como arrays de índices dos nós (ordem de inserção) e pesos"""
+        index = {node: i for i, node in enumerate(self.nodes)}
+        edges = [(index[node1], index[node2], attrs.get('weight', 1.0)) for node1, node2, attrs in self.get_edges()]
+        if not edges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        sources, targets, weights = zip(*edges)
+        return np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64), np.asarray(weights, dtype=np.float64)
         
     def get_edges(self):
         # Obtém todas as arestas no grafo
@@ -72,6 +143,12 @@ class Grafo:
                     edges.append((node1, node2, self.edges[node1][node2]))
         return edges
         
+    def force_directed_layout(self, iterations=50, seed=0):
+        """Layout de forças vetorizado (ver layout.force_layout), determinístico pela semente"""
+        sources, targets, weights = self.edge_arrays()
+        positions = force_layout(len(self.nodes), sources, targets, weights, iterations=iterations, seed=seed)
+        return dict(zip(self.nodes, map(tuple, positions.tolist())))
+    
     def kamada_kawai_layout(self, iterations=20): 
         # Layout Kamada-Kawai: algoritmo de layout de grafo baseado em forças 
         # -> importante para visualização de grafos e classificação de comunidades
@@ -128,55 +205,722 @@ class Grafo:
         
         return positions
 
+class GrafoCompacto:
+    """Grafo com arestas em arrays CSR (índices int32 e pesos float32), com a mesma interface de Grafo
+
+    Os nós recebem índices na ordem de inserção. Arestas novas ficam em um buffer e são
+    incorporadas ao CSR na próxima leitura, então inserções em lote custam O(E log E) uma única vez.
+    """
+    
+    __slots__ = ('nodes', '_index', '_ids', '_pending', '_indptr', '_indices', '_weights', '_community_cache')
+    
+    def __init__(self):
+        # Dicionário para armazenar nós {node_id: {attributes}}
+        self.nodes = {}
+        # Mapeamento node_id <-> índice
+        self._index = {}
+        self._ids = []
+        # Arestas ainda não incorporadas ao CSR: lista de arrays (origem, destino, peso)
+        self._pending = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._weights = np.empty(0, dtype=np.float32)
+        # Comunidades já calculadas {método: {node_id: comunidade}}
+        self._community_cache = {}
+    
+    def __iter__(self):
+        return iter(self.nodes)
+    
+    def add_node(self, node_id, attributes=None, **kwargs):
+        # Adiciona um nó com atributos ao grafo (attributes é referenciado, sem cópia)
+        if node_id not in self._index:
+            self._index[node_id] = len(self._ids)
+            self._ids.append(node_id)
+            self._community_cache.clear()
+        self.nodes[node_id] = kwargs if attributes is None else attributes
+    
+    def add_edge(self, node1, node2, **attributes):
+        # Adiciona uma aresta entre node1 e node2 (apenas o peso é armazenado)
+        for node in (node1, node2):
+            if node not in self._index:
+                self.add_node(node)
+        self.add_edges_by_index([self._index[node1]], [self._index[node2]], [attributes.get('weight', 1.0)])
+    
+    def add_edges_by_index(self, sources, targets, weights):
+        """Adiciona arestas em lote a partir dos índices dos nós (ordem de inserção)"""
+        self._community_cache.clear()
+        self._pending.append((np.asarray(sources, dtype=np.int64),
+                              np.asarray(targets, dtype=np.int64),
+                              np.asarray(weights, dtype=np.float32)))
+    
+    def copy(self):
+        """Cópia com nós e índices próprios; os arrays CSR são compartilhados (as alterações criam novos)"""
+        G = GrafoCompacto()
+        G.nodes = dict(self.nodes)
+        G._index = dict(self._index)
+        G._ids = list(self._ids)
+        G._pending = list(self._pending)
+        G._indptr, G._indices, G._weights = self._indptr, self._indices, self._weights
+        G._community_cache = dict(self._community_cache)
+        return G
+    
+    def set_csr(self, indptr, indices, weights):
+        """Substitui as arestas por arrays CSR simétricos já prontos (ex.: mapeados de um snapshot)"""
+        self._pending = []
+        self._community_cache.clear()
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+    
+    def csr(self):
+        """Retorna os arrays CSR simétricos (indptr, indices, weights), incorporando o buffer"""
+        n = len(self._ids)
+        if not self._pending and len(self._indptr) == n + 1:
+            return self._indptr, self._indices, self._weights
+        
+        if self._pending:
+            sources, targets, weights = (np.concatenate(parts) for parts in zip(*self._pending))
+        else:
+            sources = targets = np.empty(0, dtype=np.int64)
+            weights = np.empty(0, dtype=np.float32)
+        rows = np.concatenate([sources, targets])
+        cols = np.concatenate([targets, sources])
+        values = np.concatenate([weights, weights])
+        sequence = np.tile(np.arange(len(sources)), 2)
+        
+        # Em arestas repetidas prevalece a última inserida (em qualquer sentido), como em Grafo
+        order = np.lexsort((sequence, cols, rows))
+        rows, cols, values = rows[order], cols[order], values[order]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols, values = rows[last], cols[last], values[last]
+        
+        # Intercala as entradas novas no CSR existente (já ordenado) por busca binária,
+        # sem reordenar as arestas antigas; arestas já existentes têm o peso substituído
+        old_n = len(self._indptr) - 1
+        old_rows = np.repeat(np.arange(old_n), np.diff(self._indptr))
+        old_keys = old_rows * n + self._indices
+        keys = rows * n + cols
+        pos = np.searchsorted(old_keys, keys)
+        found = pos < len(old_keys)
+        found[found] = old_keys[pos[found]] == keys[found]
+        merged_weights = np.array(self._weights, dtype=np.result_type(self._weights, values))
+        merged_weights[pos[found]] = values[found]
+        insert = ~found
+        
+        counts = np.zeros(n, dtype=np.int64)
+        counts[:old_n] = np.diff(self._indptr)
+        counts += np.bincount(rows[insert], minlength=n)
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._indptr[1:])
+        self._indices = np.insert(self._indices, pos[insert], cols[insert]).astype(np.int32)
+        self._weights = np.insert(merged_weights, pos[insert], values[insert])
+        self._pending = []
+        return self._indptr, self._indices, self._weights
+    
+    def remove_nodes(self, node_ids):
+        """Remove nós e suas arestas; os nós restantes são renumerados mantendo a ordem"""
+        removed = [self._index[node] for node in node_ids if node in self._index]
+        if not removed:
+            return
+        indptr, indices, weights = self.csr()
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[removed] = False
+        mapping = np.cumsum(keep) - 1
+        rows = np.repeat(np.arange(len(keep)), np.diff(indptr))
+        kept = keep[rows] & keep[indices]
+        
+        self._indptr = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(mapping[rows[kept]], minlength=len(self._indptr) - 1), out=self._indptr[1:])
+        self._indices = mapping[indices[kept]].astype(np.int32)
+        self._weights = weights[kept]
+        for i in removed:
+            del self.nodes[self._ids[i]]
+        self._ids = [node for node, k in zip(self._ids, keep.tolist()) if k]
+        self._index = {node: i for i, node in enumerate(self._ids)}
+        self._community_cache.clear()
+    
+    def edge_arrays(self):
+        """Arestas como arrays de índices (origem < destino) e pesos"""
+        indptr, indices, weights = self.csr()
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        upper = rows < indices
+        return rows[upper], indices[upper].astype(np.int64), weights[upper]
+    
+    def neighbors(self, node_id):
+        # Obtém vizinhos de um nó
+        return [neighbor for neighbor, _ in self.neighbors_with_weights(node_id)]
+    
+    def neighbors_with_weights(self, node_id):
+        # Obtém pares (vizinho, peso) de um nó
+        if node_id not in self._index:
+            return []
+        indptr, indices, weights = self.csr()
+        i = self._index[node_id]
+        start, end = indptr[i], indptr[i + 1]
+        return [(self._ids[j], w) for j, w in zip(indices[start:end].tolist(), weights[start:end].tolist())]
+    
+    def number_of_nodes(self):
+        # Obtém o número de nós no grafo
+        return len(self.nodes)
+    
+    def number_of_edges(self):
+        # Obtém o número de arestas no grafo (O(1) após incorporar o buffer)
+        return len(self.csr()[1]) // 2
+    
+    def get_edges(self):
+        # Obtém todas as arestas no grafo, orientadas e ordenadas como em Grafo.get_edges
+        indptr, indices, weights = self.csr()
+        rows = np.repeat(np.arange(len(self._ids)), np.diff(indptr))
+        rank = np.empty(len(self._ids), dtype=np.int64)
+        rank[sorted(range(len(self._ids)), key=self._ids.__getitem__)] = np.arange(len(self._ids))
+        keep = rank[rows] < rank[indices]
+        ids = self._ids
+        return [(ids[i], ids[j], {'weight': w})
+                for i, j, w in zip(rows[keep].tolist(), indices[keep].tolist(), weights[keep].tolist())]
+    
+    # Algoritmos compartilhados com Grafo (dependem apenas de nodes, neighbors e edge_arrays)
+    detect_communities = Grafo.detect_communities
+    set_communities = Grafo.set_communities
+    cached_communities = Grafo.cached_communities
+    force_directed_layout = Grafo.force_directed_layout
+    kamada_kawai_layout = Grafo.kamada_kawai_layout
+
+class GraphState:
+    """Anúncios, grafo e estruturas derivadas de uma versão publicada do GrafoOlx
+
+    apply_updates e os jobs montam um estado novo e o publicam trocando a referência
+    GrafoOlx.state, sem alterar o anterior: quem já leu o estado (ver GrafoOlx.view)
+    continua vendo anúncios, índices e grafo coerentes entre si.
+    """
+
+    __slots__ = ('listings', 'listing_index', 'G', 'columns', 'top_k_table', 'search_index', 'listing_fragments',
+                 'layout_cache', 'version', 'attribute_indexes', 'query_index', 'aggregates')
+
+    def __init__(self, G=None, top_k_table=None, listings=None, listing_index=None, columns=None, search_index=None,
+                 listing_fragments=None, layout_cache=None, version=0):
+        # Anúncios em colunas (ListingStore); listings[i] é uma visão tipo dicionário
+        self.listings = ListingStore() if listings is None else listings
+        # Índice {listId canônico: posição em listings}
+        self.listing_index = {} if listing_index is None else listing_index
+        # Representação do grafo: GrafoCompacto (arrays CSR) ou Grafo (dicionários)
+        self.G = G
+        self.columns = columns
+        # Tabela com os top_k anúncios mais similares de cada anúncio (linha = posição em listings)
+        self.top_k_table = top_k_table
+        self.search_index = search_index
+        # JSON pré-serializado dos anúncios na visão card (ver listing_json)
+        self.listing_fragments = listing_fragments
+        # Layout, posições em array e índice espacial, criados sob demanda
+        self.layout_cache = {} if layout_cache is None else layout_cache
+        # Incrementada a cada publicação (invalida caches de respostas)
+        self.version = version
+        # Índices {campo: {valor: linhas}} dos filtros, índices de /listings e contagens dos
+        # gráficos, criados sob demanda a partir de listings
+        self.attribute_indexes = {}
+        self.query_index = None
+        self.aggregates = None
+
+    def replace(self, **changes):
+        """Novo estado com os campos dados trocados (os anúncios e os índices criados a partir deles são mantidos)"""
+        state = copy.copy(self)
+        for name, value in changes.items():
+            setattr(state, name, value)
+        return state
+
+
+def _state_field(name):
+    # Atributo do GrafoOlx lido do estado publicado (a escrita altera o estado, usada só na construção)
+    return property(lambda self: getattr(self.state, name), lambda self, value: setattr(self.state, name, value),
+                    doc=f'GraphState.{name} do estado atual')
+
+
+def graph_csr(G, listings):
+    """Arrays CSR (indptr, indices, weights) do grafo, com as linhas na ordem de listings"""
+    # O GrafoCompacto já guarda o CSR; os ids só são lidos para o Grafo de dicionários
+    if hasattr(G, 'csr'):
+        return G.csr()
+    return graph_to_csr(G, listings.column('listId'))
+
+
+def index_listings(listings):
+    """Índice {listId canônico: linha}; em ids repetidos prevalece o primeiro anúncio"""
+    index = {}
+    for i, listing_id in enumerate(listings.column('listId')):
+        index.setdefault(normalize_listing_id(listing_id), i)
+    return index
+
+
+def add_listing_nodes(G, listings, start=0):
+    # Os nós referenciam as visões do ListingStore, sem copiar os anúncios
+    for i, listing_id in enumerate(listings.column('listId')[start:], start):
+        G.add_node(listing_id, listings[i])
+
+
 class GrafoOlx:
-    def __init__(self, data_file):
+    listings = _state_field('listings')
+    listing_index = _state_field('listing_index')
+    G = _state_field('G')
+    columns = _state_field('columns')
+    top_k_table = _state_field('top_k_table')
+    search_index = _state_field('search_index')
+    listing_fragments = _state_field('listing_fragments')
+    layout_cache = _state_field('layout_cache')
+    version = _state_field('version')
+
+    def __init__(self, data_file, threshold=SIMILARITY_THRESHOLD, workers=1, snapshot_dir=None, graph_class=GrafoCompacto,
+                 community_method='components', top_k=TOP_K, jobs=None):
         self.data_file = data_file
-        self.listings = []
-        self.G = Grafo()
-        self.layout_cache = {}
-        self.load_data()
-        self.build_graph()
+        self.threshold = threshold
+        # Número de processos usados no cálculo das arestas (1 = sem paralelismo)
+        self.workers = workers
+        # Diretório dos snapshots do grafo construído (None = sempre reconstrói)
+        self.snapshot_dir = snapshot_dir
+        # Algoritmo de comunidades usado nas páginas e na coloração do grafo: 'components'
+        # (componentes conexos) ou 'label_propagation' (ver communities.COMMUNITY_METHODS)
+        self.community_method = community_method
+        self.top_k = top_k
+        # Estado publicado: anúncios, grafo, top-k, índice de busca, fragmentos JSON e layout
+        # (os atributos listings, G, version etc. são lidos dele)
+        self.state = GraphState(graph_class(), TopKTable(top_k))
+        # Recálculos em segundo plano (JobScheduler); None = tudo dentro de apply_updates
+        self.jobs = jobs
+        # Serializa apply_updates e as publicações dos jobs; as leituras não o usam
+        self._update_lock = threading.RLock()
+        # Incrementada só quando anúncios ou arestas mudam (descarta recálculos obsoletos)
+        self._structure_version = 0
+        # Nós cuja comunidade ainda é provisória, aguardando o job de comunidades
+        self._stale_communities = None
+        # (versão, listIds inseridos ou alterados, listIds removidos) de cada lote aplicado;
+        # deltas a partir de versões anteriores a _change_log_floor não estão mais disponíveis
+        self._change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        self._change_log_floor = 0
+        if not self.load_from_snapshot():
+            if data_file.endswith('.jsonl'):
+                # Saída bruta do spider em JSON Lines: limpeza e construção em lotes
+                self.build_graph_from_feed(read_jsonl(data_file))
+            else:
+                self.load_data()
+                self.build_listing_index()
+                self.build_graph()
+            self.search_index = SearchIndex().fit(self.listings)
+            self.save_snapshot()
+        self.listing_fragments = ListingFragments().fit(self.listings)
         
     def load_data(self):
-        """Carrega json da olx"""
+        """Carrega os anúncios: arquivo Arrow de initial_populate (mapeado em memória) ou json da olx"""
+        if self.data_file.endswith('.arrow'):
+            # Já limpos e tipados; textos e números são lidos direto das páginas do arquivo
+            self.listings = read_listings_arrow(self.data_file)
+            return
+        
         with open(self.data_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # Filtra entradas nulas
-        self.listings = [m for m in data if m['listId'] is not None]
+        # Mesma limpeza do initial_populate (descarta entradas sem listId, financiados e
+        # repetidos) e preço e quilometragem numéricos
+        normalizer = FeedNormalizer()
+        self.listings = ListingStore.from_frame(prepare_frame(normalizer.clean(data)))
+        self._log_rejected(normalizer)
+    
+    def _log_rejected(self, normalizer, source=None):
+        counts = normalizer.rejected_counts()
+        if counts:
+            logger.info("%d anúncios descartados na limpeza de %s: %s", sum(counts.values()),
+                        source or self.data_file, counts)
+    
+    def build_listing_index(self):
+        """Cria o índice de listIds canônicos; em ids repetidos prevalece o primeiro anúncio"""
+        self.listing_index = index_listings(self.listings)
+    
+    def view(self):
+        """Cópia de leitura fixada no estado publicado agora
+
+        Todas as leituras feitas pela visão (anúncios, índices, grafo, layout) vêm do mesmo
+        GraphState, mesmo que apply_updates ou um job publique outro no meio; cada
+        requisição usa uma visão.
+        """
+        return copy.copy(self)
+    
+    def get_listing(self, listing_id):
+        """Obtém um anúncio pelo listId (string, inteiro ou float) em O(1); None se não existir"""
+        i = self.listing_index.get(normalize_listing_id(listing_id))
+        return None if i is None else self.listings[i]
+    
+    def _node_id(self, listing_id):
+        # Converte um listId qualquer no id do nó correspondente no grafo
+        listing = self.get_listing(listing_id)
+        return None if listing is None else listing['listId']
+    
+    def build_graph(self):
+        """Cria o grafo com anúncios como nós e similaridades como arestas"""
+
+        self._add_listing_nodes()
         
-        # Limpa dados de preço
-        for m in self.listings:
-            if m['price'] and isinstance(m['price'], str):
-                m['price_value'] = float(m['price'].replace('R$ ', '').replace('.', '').replace(',', '.'))
+        # Calcula similaridades em blocos vetorizados e adiciona arestas para anúncios com similaridade e peso
+        self.columns = encode_listings(self.listings)
+        self.G.add_edges_by_index(*build_edges(self.columns, self.threshold, workers=self.workers))
+        # Consolida as arestas (CSR no GrafoCompacto) já na construção, e não na primeira requisição
+        self.G.number_of_edges()
+        self.build_top_k()
+    
+    def build_graph_from_feed(self, records, batch_size=FEED_BATCH_SIZE):
+        """Cria o grafo a partir de um fluxo de anúncios brutos do spider, lote a lote
+
+        Cada lote passa pela limpeza de normalize.FeedNormalizer e é comparado com os
+        anúncios já inseridos (e entre si), então o arquivo bruto nunca é carregado inteiro
+        e as arestas são as mesmas de build_graph sobre os anúncios limpos.
+        """
+        self.listings = ListingStore()
+        self.listing_index = {}
+        self.columns = encode_listings([])
+        normalizer = FeedNormalizer()
+        for batch in batched(records, batch_size):
+            frame = prepare_frame(normalizer.clean(batch))
+            if not len(frame):
+                continue
+            start = len(self.listings)
+            self.listing_index.update(zip(frame['listId'].tolist(), range(start, start + len(frame))))
+            self.listings.append_frame(frame)
+            self._add_listing_nodes(start)
+            self.columns.append(self.listings[start:])
+            self.G.add_edges_by_index(*build_edges_for(self.columns, np.arange(start, len(self.listings)),
+                                                       self.threshold))
+        self._log_rejected(normalizer)
+        self.G.number_of_edges()
+        self.build_top_k()
+    
+    def _add_listing_nodes(self, start=0):
+        add_listing_nodes(self.G, self.listings, start)
+    
+    def _graph_csr(self):
+        state = self.state
+        return graph_csr(state.G, state.listings)
+    
+    def build_top_k(self):
+        """Materializa os top_k vizinhos de maior similaridade de cada anúncio"""
+        self.top_k_table = TopKTable(self.top_k).build(*self._graph_csr())
+    
+    def add_listings(self, listings):
+        """Adiciona anúncios novos ou substitui os existentes de mesmo listId"""
+        self.apply_updates(upserted=listings)
+    
+    def remove_listings(self, listing_ids):
+        """Remove anúncios pelo listId"""
+        self.apply_updates(removed=listing_ids)
+    
+    def apply_updates(self, upserted=(), removed=()):
+        """Aplica um lote de alterações ao grafo sem reconstruí-lo
+
+        Anúncios alterados são removidos e reinseridos no fim da lista. Os anúncios
+        inseridos passam pela mesma limpeza da carga (normalize.FeedNormalizer); os
+        descartados nela são apenas removidos, se existirem. Apenas os anúncios
+        novos ou alterados são comparados com os demais; o top-k, o índice de busca, as
+        comunidades (partindo da partição anterior) e o layout (partindo das posições
+        anteriores) são atualizados. O snapshot em disco não é alterado.
+
+        Com um JobScheduler em self.jobs, comunidades e layout são recalculados em
+        segundo plano (junto com um reajuste completo do índice de busca): até lá valem
+        uma partição e um layout provisórios, em que os anúncios novos ficam em
+        comunidades próprias e na posição média dos vizinhos.
+
+        O lote é montado em um GraphState novo, publicado de uma vez no fim: as
+        requisições em andamento continuam lendo o estado anterior, inalterado.
+        """
+        with self._update_lock:
+            self._apply_updates(upserted, removed)
+    
+    def _apply_updates(self, upserted, removed):
+        state = self.state
+        # Em listIds repetidos no lote prevalece o último
+        upserted = {normalize_listing_id(m.get('listId')): m for m in upserted}
+        normalizer = FeedNormalizer()
+        frame = prepare_frame(normalizer.clean([dict(m) for m in upserted.values()]))
+        self._log_rejected(normalizer, 'apply_updates')
+        accepted = set(frame['listId'].tolist()) if len(frame) else set()
+        removed_ids = {normalize_listing_id(listing_id) for listing_id in removed} | set(upserted)
+        removed_rows = sorted(state.listing_index[i] for i in removed_ids if i in state.listing_index)
+        deleted_ids = {i for i in removed_ids - accepted if i in state.listing_index}
+        if not removed_rows and not len(frame):
+            return
+        
+        old_ids = state.listings.column('listId')
+        positions = state.layout_cache.get(f'layout_{len(old_ids)}')
+        partition = state.G.cached_communities(self.community_method)
+        keep = np.ones(len(old_ids), dtype=bool)
+        keep[removed_rows] = False
+        kept_rows = np.flatnonzero(keep)
+        mapping = np.cumsum(keep) - 1
+        
+        # Vizinhos dos anúncios removidos, já na nova numeração (usados nas comunidades)
+        indptr, indices, _ = graph_csr(state.G, state.listings)
+        orphaned = np.concatenate([np.empty(0, dtype=np.int64)] +
+                                  [indices[indptr[i]:indptr[i + 1]] for i in removed_rows]).astype(np.int64)
+        orphaned = mapping[orphaned[keep[orphaned]]]
+        
+        # Nós e colunas: os anúncios mantidos conservam a ordem e os novos vão para o fim;
+        # as linhas mudam, então todos os nós passam a referenciar o novo armazenamento.
+        # Tudo é montado em cópias, sem alterar o estado publicado
+        G = state.G.copy()
+        G.remove_nodes([old_ids[i] for i in removed_rows])
+        listings = state.listings.take(kept_rows)
+        listings.append_frame(frame)
+        new_listings = listings[len(kept_rows):]
+        add_listing_nodes(G, listings)
+        columns = state.columns.take(kept_rows)
+        columns.append(new_listings)
+        
+        # Arestas apenas dos anúncios novos contra todos os demais
+        n_kept = len(kept_rows)
+        new_rows = np.arange(n_kept, len(listings))
+        sources, targets, weights = build_edges_for(columns, new_rows, self.threshold)
+        G.add_edges_by_index(sources, targets, weights)
+        G.number_of_edges()
+        
+        top_k_table, stale_rows = state.top_k_table.take(kept_rows)
+        changed_rows = top_k_table.rows_changed_by(sources, targets, weights)
+        top_k_table.update_rows(np.concatenate([stale_rows, changed_rows, new_rows]), *graph_csr(G, listings))
+        
+        search_index = state.search_index.take(kept_rows)
+        if new_listings:
+            search_index.add(new_listings)
+        listing_fragments = state.listing_fragments.take(kept_rows)
+        listing_fragments.add(new_listings)
+        
+        new_state = GraphState(G, top_k_table, listings, index_listings(listings), columns, search_index,
+                               listing_fragments, version=state.version + 1)
+        ids = listings.column('listId')
+        self._structure_version += 1
+        version = self._structure_version
+        # Jobs agendados só depois da publicação, cada um com o estado do próprio lote
+        refreshes = []
+        
+        if partition is not None:
+            initial = np.concatenate([np.asarray([partition[old_ids[i]] for i in kept_rows], dtype=np.int64),
+                                      np.full(len(new_rows), -1, dtype=np.int64)])
+            # Só os nós próximos das alterações começam ativos; o restante mantém o rótulo anterior
+            active = np.zeros(len(ids), dtype=bool)
+            active[np.concatenate([orphaned, sources, targets, new_rows])] = True
+            if self._stale_communities is not None:
+                # Nós de lotes anteriores cuja partição definitiva ainda não foi calculada
+                active[:n_kept] |= self._stale_communities[kept_rows]
+            if self.jobs is None:
+                self._refresh_communities(new_state, initial, active)
             else:
-                m['price_value'] = 0.0
-                
-            # Converte quilometragem para numérico
-            if m['quilometragem'] and m['quilometragem'].isdigit():
-                m['km'] = int(m['quilometragem'])
+                # Provisório: cada anúncio novo em uma comunidade própria
+                provisional = initial.copy()
+                provisional[provisional < 0] = (initial.max(initial=-1) + 1) + np.arange(len(new_rows))
+                G.set_communities(dict(zip(ids, provisional.tolist())), self.community_method)
+                self._stale_communities = active
+                refreshes.append(('communities',
+                                  lambda: self._refresh_communities(new_state, initial, active, version)))
+        
+        if positions is not None:
+            seed = np.empty((len(ids), 2))
+            seed[:n_kept] = [positions[old_ids[i]] for i in kept_rows]
+            seed[n_kept:] = self._seed_positions(seed[:n_kept], n_kept, len(new_rows), sources, targets)
+            if self.jobs is None:
+                self._refresh_layout(new_state, seed)
             else:
-                m['km'] = 0
-                
-            # Mapeia 'imagens' para 'images' para manter as keys em inglês
-            if 'imagens' in m and 'images' not in m:
-                m['images'] = m['imagens']
+                # Provisório, com o índice espacial já pronto para as requisições
+                provisional = dict(zip(ids, map(tuple, seed.tolist())))
+                partition = G.cached_communities(self.community_method)
+                new_state.layout_cache = (self._derived_layout(new_state, provisional, partition)
+                                          if partition is not None else {f'layout_{len(ids)}': provisional})
+                refreshes.append(('layout', lambda: self._refresh_layout(new_state, seed, version)))
+        
+        if self.jobs is not None:
+            refreshes.append(('search', lambda: self._refresh_search_index(new_state, version)))
+        # Publicação: uma única troca de referência
+        self.state = new_state
+        if len(self._change_log) == self._change_log.maxlen:
+            self._change_log_floor = self._change_log[0][0]
+        self._change_log.append((new_state.version, frozenset(accepted), frozenset(deleted_ids)))
+        for name, refresh in refreshes:
+            self.jobs.submit(name, refresh)
     
-    def build_graph(self):
-        """Cria o grafo com anúncios como nós e similaridades como arestas"""
+    def changes_since(self, version):
+        """(listIds inseridos ou alterados, listIds removidos) desde a versão dada; None se ela for antiga demais"""
+        if version < self._change_log_floor:
+            return None
+        upserted, removed = set(), set()
+        for entry_version, entry_upserted, entry_removed in self._change_log:
+            if entry_version > version:
+                upserted = (upserted - entry_removed) | entry_upserted
+                removed = (removed - entry_upserted) | entry_removed
+        return upserted, removed
+    
+    def export_view(self, since=None):
+        """Anúncios, arestas e versão a exportar, fixados de uma vez (ver export.py)
 
-        for m in self.listings:
-            self.G.add_node(m['listId'], **m)
+        Com since, apenas o delta desde essa versão; None se ela for anterior às
+        alterações ainda lembradas (é preciso uma exportação completa).
+        """
+        with self._update_lock:
+            state = self.state
+            csr = graph_csr(state.G, state.listings)
+            if since is None:
+                return ExportView(state.version, state.listings, csr, range(len(state.listings)))
+            changes = self.changes_since(since)
+            if changes is None:
+                return None
+            upserted, removed = changes
+            rows = np.array(sorted(state.listing_index[i] for i in upserted if i in state.listing_index),
+                            dtype=np.int64)
+            return ExportView(state.version, state.listings, csr, rows, sorted(removed), delta=True)
+    
+    def _refresh_communities(self, state, initial, active, structure_version=None):
+        # Com label_propagation, parte da partição anterior e atualiza só os nós ativos
+        ids = state.listings.column('listId')
+        labels = COMMUNITY_METHODS[self.community_method](len(ids), *state.G.edge_arrays(), initial=initial,
+                                                          active=active)
+        self._publish(structure_version, state, communities=dict(zip(ids, labels.tolist())))
+    
+    def _refresh_layout(self, state, seed, structure_version=None):
+        # Poucas iterações de baixa temperatura a partir das posições anteriores
+        ids = state.listings.column('listId')
+        refined = force_layout(len(ids), *state.G.edge_arrays(), iterations=LAYOUT_REFRESH_ITERATIONS,
+                               initial=seed, temperature=0.01)
+        self._publish(structure_version, state, positions=dict(zip(ids, map(tuple, refined.tolist()))))
+    
+    def _refresh_search_index(self, state, structure_version):
+        # Reajuste completo do vocabulário e dos pesos IDF (o add incremental mantém os antigos)
+        self._publish(structure_version, state, search_index=SearchIndex().fit(state.listings))
+    
+    def _publish(self, structure_version, state, communities=None, positions=None, search_index=None):
+        """Publica resultados recalculados para o lote de state, se o grafo não mudou desde o pedido
+
+        O estado publicado não é alterado: um novo, com o layout em array e o índice
+        espacial já gerados, o substitui, para que as requisições seguintes não precisem
+        recalculá-los.
+        """
+        if structure_version is None:
+            # Chamado dentro de apply_updates (sem jobs): state ainda não foi publicado
+            if communities is not None:
+                state.G.set_communities(communities, self.community_method)
+            if positions is not None:
+                state.layout_cache = {f'layout_{len(positions)}': positions}
+            return
+        if structure_version != self._structure_version:
+            # Um lote mais novo já agendou o próprio recálculo
+            return
         
-        # Calcula similaridades e adiciona arestas para anúncios com similaridade e peso
-        for i, m1 in enumerate(self.listings):
-            for j, m2 in enumerate(self.listings[i+1:], i+1):
-                similarity = self.calculate_similarity(m1, m2)
-                if similarity > 0.7:
-                    self.G.add_edge(m1['listId'], m2['listId'], weight=similarity)
+        with self._update_lock:
+            current = self.state
+            if structure_version != self._structure_version or current.listings is not state.listings:
+                return
+            changes = {'version': current.version + 1}
+            G = current.G
+            if communities is not None:
+                G = changes['G'] = current.G.copy()
+                G.set_communities(communities, self.community_method)
+                self._stale_communities = None
+            # Derivado dos anúncios do lote (os mesmos do estado atual) e do layout mais recente
+            layout_key = f'layout_{len(state.listings)}'
+            layout_cache = dict(current.layout_cache)
+            if positions is not None or (communities is not None and layout_key in layout_cache):
+                changes['layout_cache'] = self._derived_layout(state, positions or layout_cache[layout_key],
+                                                               G.detect_communities(self.community_method))
+            elif communities is not None:
+                # Supernós montados por uma requisição com a partição anterior são refeitos sob demanda
+                changes['layout_cache'] = {key: value for key, value in layout_cache.items()
+                                           if not key.startswith('tiles_')}
+            if search_index is not None:
+                changes['search_index'] = search_index
+            self.state = current.replace(**changes)
+    
+    def _derived_layout(self, state, positions, partition):
+        # Layout, posições em array e índice espacial dos anúncios de state, prontos para serem trocados de uma vez
+        ids = state.listings.column('listId')
+        coordinates = np.array([positions[node] for node in ids], dtype=np.float64).reshape(-1, 2)
+        labels = [partition[node] for node in ids]
+        return {
+            f'layout_{len(ids)}': positions,
+            f'array_{len(ids)}': coordinates,
+            f'tiles_{len(ids)}': GraphTiles(coordinates, labels, *graph_csr(state.G, state.listings)),
+        }
+    
+    def _seed_positions(self, kept_positions, n_kept, n_new, sources, targets):
+        # Posição inicial dos anúncios novos: média dos vizinhos já posicionados, ou um ponto
+        # aleatório da área ocupada pelo layout quando não há vizinhos antigos
+        rng = np.random.default_rng(0)
+        if n_kept == 0:
+            return rng.random((n_new, 2))
+        anchored = (sources < n_kept) & (targets >= n_kept)
+        new_node, old_node = targets[anchored] - n_kept, sources[anchored]
+        counts = np.bincount(new_node, minlength=n_new)
+        sums = np.stack([np.bincount(new_node, weights=kept_positions[old_node, axis], minlength=n_new)
+                         for axis in (0, 1)], axis=1)
+        low, high = kept_positions.min(axis=0), kept_positions.max(axis=0)
+        scale = max(float((high - low).max()), 1e-9)
+        seeded = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None],
+                          low + rng.random((n_new, 2)) * (high - low))
+        # Pequeno deslocamento para que nós com os mesmos vizinhos não coincidam
+        return seeded + rng.normal(scale=1e-3 * scale, size=(n_new, 2))
+    
+    def warm_up(self):
+        """Calcula de uma vez os dados que as requisições criariam sob demanda
+
+        Layout, comunidades, índice espacial, índices dos filtros e de /listings e agregados
+        dos gráficos.
+        Chamado no processo principal antes de criar os workers, que passam a compartilhar
+        esses dados (copy-on-write) em vez de cada um recalculá-los.
+        """
+        self.G.number_of_edges()
+        self.get_layout()
+        self.detect_communities()
+        self.graph_tiles()
+        for field in GRAPH_FILTERS.values():
+            self.attribute_index(field)
+        self.listing_query()
+        self.chart_aggregates()
+    
+    def _snapshot_path(self):
+        key = snapshot_key(self.data_file, threshold=self.threshold, community_method=self.community_method)
+        return snapshot_path(self.snapshot_dir, self.data_file, key)
+    
+    def load_from_snapshot(self):
+        """Carrega anúncios, arestas, layout e comunidades de um snapshot válido, se houver"""
+        if not self.snapshot_dir:
+            return False
+        snapshot = load_snapshot(self._snapshot_path())
+        if snapshot is None:
+            return False
+        
+        self.listings = snapshot['listings']
+        self.build_listing_index()
+        self._add_listing_nodes()
+        self.columns = encode_listings(self.listings)
+        
+        indptr, indices, weights = snapshot['indptr'], snapshot['indices'], snapshot['weights']
+        if isinstance(self.G, GrafoCompacto):
+            # Usa os arrays mapeados em memória diretamente
+            self.G.set_csr(indptr, indices, weights)
+        else:
+            # Cada aresta aparece duas vezes no CSR simétrico; usa apenas i < j, na ordem do build
+            rows = np.repeat(np.arange(len(self.listings)), np.diff(indptr))
+            upper = rows < indices
+            self.G.add_edges_by_index(rows[upper], indices[upper], weights[upper])
+        
+        ids = self.listings.column('listId')
+        self.layout_cache[f'layout_{len(self.G.nodes)}'] = dict(zip(ids, map(tuple, snapshot['positions'].tolist())))
+        self.G.set_communities(dict(zip(ids, snapshot['communities'].tolist())), self.community_method)
+        self.search_index = snapshot['search_index'] or SearchIndex().fit(self.listings)
+        if snapshot['topk_neighbors'].shape[1] == self.top_k:
+            self.top_k_table = TopKTable.from_arrays(snapshot['topk_neighbors'], snapshot['topk_weights'])
+        else:
+            # Snapshot gravado com outro k: recalcula a tabela a partir das arestas
+            self.build_top_k()
+        return True
+    
+    def save_snapshot(self):
+        """Grava o grafo construído, com layout e comunidades, no diretório de snapshots"""
+        if not self.snapshot_dir:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        write_snapshot(self._snapshot_path(), self.listings, self.G, self.get_layout(), self.detect_communities(),
+                       self.search_index, self.top_k_table)
     
     def calculate_similarity(self, m1, m2):
-        """Calcula similaridade entre dois anúncios"""
+        """Calcula similaridade entre dois anúncios (referência escalar de similarity.score_pairs)"""
         similarity = 0.0
     
         if m1['marca'] == m2['marca']:
@@ -248,45 +992,28 @@ class GrafoOlx:
         return brand_groups
     
     def get_similar_listings(self, listing_id, top_n=5):
-        """Encontra os N anúncios mais similares ao anúncio fornecido"""
-        print(f"Procurando por anúncios similares para ID: {listing_id} (tipo: {type(listing_id)})")
-        
-        # Verifica se o nó existe diretamente
-        node_exists = listing_id in self.G.nodes
-        print(f"Node exists directly in graph? {node_exists}")
-        
-        # Se não, tenta comparar strings
-        if not node_exists:
-            str_id = str(listing_id)
-            for graph_node_id in self.G.nodes:
-                if str(graph_node_id) == str_id:
-                    print(f"Encontrei nó por comparação de strings: {graph_node_id}")
-                    listing_id = graph_node_id  # Use o ID do nó real do grafo
-                    node_exists = True
-                    break
-        
-        if not node_exists or listing_id not in self.G.nodes:
-            print(f"Não foi possível encontrar anúncios similares: Nó {listing_id} não encontrado no grafo")
-            return []
-        
-        # Obtém todos os vizinhos com pesos
-        neighbors = [(neighbor, self.G.edges[listing_id][neighbor]['weight']) 
-                     for neighbor in self.G.neighbors(listing_id)]
-        
-        # If there are no neighbors, return empty list
-        if not neighbors:
-            print(f"Nó {listing_id} não tem vizinhos/anúncios similares")
+        """Encontra os N anúncios mais similares ao anúncio fornecido
+
+        Até top_k resultados vêm de uma fatia da tabela pré-calculada; pedidos maiores
+        ordenam todos os vizinhos do nó.
+        """
+        i = self.listing_index.get(normalize_listing_id(listing_id))
+        if i is None:
             return []
         
-        # Ordena por peso de similaridade
-        neighbors.sort(key=lambda x: x[1], reverse=True)
-        print(f"Encontrei {len(neighbors)} vizinhos para o nó {listing_id}")
+        if top_n <= self.top_k_table.k:
+            neighbors = self.top_k_table.row(i, top_n)
+        else:
+            indptr, indices, weights = self._graph_csr()
+            start, end = indptr[i], indptr[i + 1]
+            neighbors = sorted(zip(indices[start:end].tolist(), weights[start:end].tolist()),
+                               key=lambda x: x[1], reverse=True)[:top_n]
         
         similar_listings = []
-        for n_id, similarity in neighbors[:top_n]:
-            listing = self.G.nodes[n_id]
+        for j, similarity in neighbors:
+            listing = self.listings[j]
             similar_listings.append({
-                'id': n_id,
+                'id': listing['listId'],
                 'title': listing['title'],
                 'price': listing['price'],
                 'marca': listing['marca'],
@@ -294,85 +1021,230 @@ class GrafoOlx:
                 'ano': listing['ano'],
                 'similarity': similarity
             })
-        
-        print(f"Retornando {len(similar_listings)} anúncios similares")
         return similar_listings
     
     def detect_communities(self):
-        return self.G.detect_communities()
+        return self.G.detect_communities(self.community_method)
     
-    def create_interactive_graph_data(self, color_by='community'):
-        """Cria a visualização interativa do grafo utilizando a biblioteca Plotly"""
+    def get_layout(self):
+        """Obtém as posições dos nós, calculando o layout apenas na primeira vez"""
         # Tenta obter o layout armazenado primeiro
         cache_key = f'layout_{len(self.G.nodes)}'  # Chave de cache baseada no tamanho do grafo
         
-        if cache_key in self.layout_cache:
-            positions = self.layout_cache[cache_key]
-        else:
-            # Obtém posições usando o layout Kamada-Kawai
-            positions = self.G.kamada_kawai_layout()
-            # Armazena o layout
-            self.layout_cache[cache_key] = positions
+        if cache_key not in self.layout_cache:
+            # Obtém posições usando o layout de forças vetorizado e armazena o layout
+            self.layout_cache[cache_key] = self.G.force_directed_layout()
+        return self.layout_cache[cache_key]
+    
+    def layout_array(self):
+        """Posições do layout como array (n, 2) na ordem dos anúncios"""
+        cache_key = f'array_{len(self.G.nodes)}'
+        if cache_key not in self.layout_cache:
+            positions = self.get_layout()
+            self.layout_cache[cache_key] = np.array([positions[node] for node in self.listings.column('listId')],
+                                                    dtype=np.float64).reshape(-1, 2)
+        return self.layout_cache[cache_key]
+    
+    def attribute_index(self, field):
+        """Índice {valor: linhas em ordem crescente} de um campo categórico dos anúncios"""
+        state = self.state
+        index = state.attribute_indexes.get(field)
+        if index is None:
+            index = state.attribute_indexes[field] = inverted_index(state.listings.categorical[field],
+                                                                    state.listings.categories[field])
+        return index
+    
+    def listing_query(self):
+        """Índices de filtragem, ordenação por preço e paginação de /listings (ver ListingQueryIndex)"""
+        state = self.state
+        if state.query_index is None:
+            state.query_index = ListingQueryIndex(state.listings)
+        return state.query_index
+    
+    def query_listings(self, filters=None, ranges=None, cursor=None, limit=None):
+        """Página de anúncios em ordem de preço: (linhas, cursor da próxima página, total)
+
+        filters e ranges usam os nomes dos parâmetros (LISTING_FILTERS e RANGE_FILTERS).
+        """
+        index = self.listing_query()
+        filters = {LISTING_FILTERS[name]: value for name, value in (filters or {}).items() if value}
+        ranges = {RANGE_FILTERS[name]: bounds for name, bounds in (ranges or {}).items()
+                  if bounds[0] is not None or bounds[1] is not None}
+        rows, next_cursor, total = index.query(filters, ranges, cursor, limit or LISTINGS_PAGE_SIZE)
+        return rows.tolist(), next_cursor, total
+    
+    def listing_json(self, row, fields=CARD_FIELDS):
+        """JSON (bytes) do anúncio da linha row com os campos dados (ver listing_json)"""
+        return self.listing_fragments.fragment(self.listings, row, fields)
+    
+    def listings_json(self, rows, fields=CARD_FIELDS, extra=None):
+        """Array JSON (bytes) dos anúncios das linhas dadas; extra[k] é mesclado ao k-ésimo anúncio"""
+        return self.listing_fragments.array(self.listings, rows, fields, extra)
+    
+    def filter_rows(self, **filters):
+        """Linhas dos anúncios que atendem aos filtros (ver GRAPH_FILTERS); None se não houver filtros"""
+        rows = None
+        for name, value in filters.items():
+            if not value:
+                continue
+            matches = self.attribute_index(GRAPH_FILTERS[name]).get(value, np.empty(0, dtype=np.int64))
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+    
+    def induced_edges(self, rows):
+        """Arestas (origem < destino) entre as linhas dadas, com os pesos, a partir do CSR"""
+        indptr, indices, weights = self._graph_csr()
+        selected = np.zeros(len(indptr) - 1, dtype=bool)
+        selected[rows] = True
+        # Percorre apenas os trechos do CSR das linhas selecionadas
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        sources = np.repeat(rows, lengths)
+        targets = indices[offsets].astype(np.int64)
+        keep = selected[targets] & (sources < targets)
+        return sources[keep], targets[keep], weights[offsets][keep]
+    
+    def community_color_map(self, partition):
+        """Cores das comunidades, distribuídas no círculo de matizes"""
+        unique_communities = set(partition.values())
+        return {comm: f'hsl({int(i * 360 / len(unique_communities))},70%,60%)' 
+                for i, comm in enumerate(unique_communities)}
+    
+    def listing_colors(self, rows, color_by):
+        """Cores dos anúncios das linhas dadas por marca, estado ou preço e a legenda {rótulo: cor}
+
+        Os mapas de cores consideram todos os anúncios, para que as cores não mudem com os
+        filtros ou o viewport; a legenda mostra apenas os valores presentes em rows.
+        """
+        if color_by in ('brand', 'state'):
+            field = 'marca' if color_by == 'brand' else 'estado'
+            # Valores presentes, na ordem de primeira ocorrência (a mesma do conjunto de todos os nós)
+            codes = self.listings.categorical[field]
+            categories = self.listings.categories[field]
+            values = set(categories[c] for c in np.flatnonzero(np.bincount(codes, minlength=len(categories))))
+            color_map = {value: f'hsl({int(i * 360 / len(values))},70%,60%)' 
+                        for i, value in enumerate(values)}
+            labels = [self.listings.get(i, field) for i in rows.tolist()]
+            present = set(labels)
+            return ([color_map[label] for label in labels],
+                    {value: color for value, color in color_map.items() if value in present})
+        
+        if color_by == 'price':
+            all_prices = self.listings.numeric['price_value']
+            max_price = float(all_prices.max()) if len(all_prices) and all_prices.max() > 0 else 1
+            prices = all_prices[rows].tolist()
+            return ([f'hsl({int(240 - 240 * (price / max_price))},70%,60%)' for price in prices],
+                    {"Lower Price": "hsl(240,70%,60%)", "Higher Price": "hsl(0,70%,60%)"})
         
-        x_nodes = [positions[node][0] for node in self.G.nodes]
-        y_nodes = [positions[node][1] for node in self.G.nodes]
+        # Cor padrão
+        return ['#1f77b4'] * len(rows), {}
     
+    def graph_tiles(self):
+        """Índice espacial e supernós por comunidade do layout atual (ver graph_tiles.GraphTiles)"""
+        cache_key = f'tiles_{len(self.G.nodes)}'
+        if cache_key not in self.layout_cache:
+            partition = self.detect_communities()
+            labels = [partition[node] for node in self.listings.column('listId')]
+            self.layout_cache[cache_key] = GraphTiles(self.layout_array(), labels, *self._graph_csr())
+        return self.layout_cache[cache_key]
+    
+    def graph_viewport(self, x0=None, y0=None, x1=None, y1=None, zoom=None, max_nodes=MAX_VIEWPORT_NODES,
+                       max_edges=MAX_VIEWPORT_EDGES, color_by='community'):
+        """Nós e arestas visíveis em um retângulo do layout, com nível de detalhe pelo zoom
+
+        Coordenadas omitidas usam os limites do layout inteiro. Em zoom afastado (ou com
+        mais de max_nodes anúncios visíveis) cada comunidade vira um supernó no seu
+        centróide, e as arestas entre comunidades são agregadas. color_by (como em
+        create_interactive_graph_data) colore os anúncios; supernós têm sempre a cor da comunidade.
+        """
+        # Índice espacial, partição e anúncios do mesmo estado publicado, mesmo que um job publique outro no meio
+        view = self.view()
+        tiles = view.graph_tiles()
+        color_map = view.community_color_map(view.detect_communities())
+        bounds = tiles.bounds
+        x0, y0, x1, y1 = (bound if value is None else value for value, bound in zip((x0, y0, x1, y1), bounds))
+        if zoom is None:
+            zoom = tiles.zoom_for(x0, y0, x1, y1)
+        level, rows, sources, targets, weights = tiles.viewport(x0, y0, x1, y1, zoom, max_nodes, max_edges)
+        
+        if level == 'nodes':
+            points = tiles.coordinates
+            communities = tiles.communities[tiles.community_of[rows]].tolist()
+            nodes = {
+                'id': [view.listings.get(i, 'listId') for i in rows.tolist()],
+                'title': [view.listings.get(i, 'title') for i in rows.tolist()],
+                'community': communities,
+            }
+            if color_by == 'community':
+                nodes['color'] = [color_map[comm] for comm in communities]
+            else:
+                nodes['color'] = view.listing_colors(rows, color_by)[0]
+        else:
+            points = tiles.supernodes.points
+            communities = tiles.communities[rows].tolist()
+            nodes = {'id': communities, 'community': communities, 'size': tiles.community_sizes[rows].tolist()}
+            nodes['color'] = [color_map[comm] for comm in communities]
+        nodes['x'] = points[rows, 0].tolist()
+        nodes['y'] = points[rows, 1].tolist()
+        
         edge_x = []
         edge_y = []
-        edge_weights = []
+        for ex0, ey0, ex1, ey1 in np.hstack([points[sources], points[targets]]).tolist():
+            edge_x.extend([ex0, ex1, None])
+            edge_y.extend([ey0, ey1, None])
         
-        for node1, node2, attrs in self.G.get_edges():
-            x0, y0 = positions[node1]
-            x1, y1 = positions[node2]
-            
+        return {
+            'level': level,
+            'zoom': zoom,
+            'viewport': [x0, y0, x1, y1],
+            'bounds': list(bounds),
+            'total_nodes': len(view.listings),
+            'max_nodes': max_nodes,
+            'nodes': nodes,
+            'edges': {'x': edge_x, 'y': edge_y, 'weight': weights.tolist()},
+        }
+    
+    def create_interactive_graph_data(self, color_by='community', state='', brand=''):
+        """Cria a visualização interativa do grafo utilizando a biblioteca Plotly
+
+        Com state e/ou brand apenas o subgrafo induzido pelos anúncios filtrados é
+        gerado, nas mesmas posições e cores da visualização completa.
+        """
+        positions = self.get_layout()
+        coordinates = self.layout_array()
+        rows = self.filter_rows(state=state, brand=brand)
+        if rows is None:
+            rows = np.arange(len(self.listings))
+        node_ids = [self.listings.get(i, 'listId') for i in rows.tolist()]
+        
+        x_nodes = coordinates[rows, 0].tolist()
+        y_nodes = coordinates[rows, 1].tolist()
+        
+        sources, targets, weights = self.induced_edges(rows)
+        edge_x = []
+        edge_y = []
+        for x0, y0, x1, y1 in np.hstack([coordinates[sources], coordinates[targets]]).tolist():
             edge_x.extend([x0, x1, None])
             edge_y.extend([y0, y1, None])
-            
-            # Get edge weight
-            weight = attrs.get('weight', 1.0)
-            edge_weights.append(weight)
-        
-        node_colors = []
-        color_legend = {}
+        edge_weights = weights.tolist()
         
+        # Os mapas de cores consideram todos os anúncios, para que as cores não mudem com os filtros;
+        # a legenda mostra apenas os valores presentes na visualização
         if color_by == 'community':
             partition = self.detect_communities()
-            unique_communities = set(partition.values())
-            
-            # Cria um mapa de cores para as comunidades aleatóriamente
-            color_map = {comm: f'hsl({int(i * 360 / len(unique_communities))},70%,60%)' 
-                        for i, comm in enumerate(unique_communities)}
-            node_colors = [color_map[partition[node]] for node in self.G.nodes]
-            color_legend = {f"Community {comm}": color for comm, color in color_map.items()}
-            
-        elif color_by == 'brand':
-            brands = set(self.G.nodes[node]['marca'] for node in self.G.nodes)
-            color_map = {brand: f'hsl({int(i * 360 / len(brands))},70%,60%)' 
-                        for i, brand in enumerate(brands)}
-            node_colors = [color_map[self.G.nodes[node]['marca']] for node in self.G.nodes]
-            color_legend = color_map
-            
-        elif color_by == 'state':
-            states = set(self.G.nodes[node]['estado'] for node in self.G.nodes)
-            color_map = {state: f'hsl({int(i * 360 / len(states))},70%,60%)' 
-                        for i, state in enumerate(states)}
-            node_colors = [color_map[self.G.nodes[node]['estado']] for node in self.G.nodes]
-            color_legend = color_map
-            
-        elif color_by == 'price':
-            prices = [self.G.nodes[node].get('price_value', 0) for node in self.G.nodes]
-            max_price = max(prices) if max(prices) > 0 else 1
-            node_colors = [f'hsl({int(240 - 240 * (price / max_price))},70%,60%)' for price in prices]
-            color_legend = {"Lower Price": "hsl(240,70%,60%)", "Higher Price": "hsl(0,70%,60%)"}
-        
+            color_map = self.community_color_map(partition)
+            labels = [partition[node] for node in node_ids]
+            node_colors = [color_map[label] for label in labels]
+            present = set(labels)
+            color_legend = {f"Community {comm}": color for comm, color in color_map.items() if comm in present}
         else:
-            # Cor padrão
-            node_colors = ['#1f77b4'] * len(self.G.nodes)
+            node_colors, color_legend = self.listing_colors(rows, color_by)
             
         # Dados mostrados ao passar o mouse sobre o nó
         node_hover_text = []
-        for node in self.G.nodes:
-            node_data = self.G.nodes[node]
+        for i in rows.tolist():
+            node_data = self.listings[i]
             text = f"<b>{node_data.get('title', 'Anúncio sem título')}</b><br>"
             text += f"Marca: {node_data.get('marca', 'N/A')}<br>"
             text += f"Modelo: {node_data.get('modelo', 'N/A')}<br>"
@@ -383,10 +1255,8 @@ class GrafoOlx:
             text += f"Clique para ver detalhes e anúncios similares"
             node_hover_text.append(text)
         
-        node_ids = list(self.G.nodes)
-        
         return {
-            'positions': positions,
+            'positions': {node: positions[node] for node in node_ids},
             'x_nodes': x_nodes,
             'y_nodes': y_nodes,
             'edge_x': edge_x,
@@ -401,19 +1271,10 @@ class GrafoOlx:
     def get_node_data_with_similar(self, node_id, top_n=5):
         """Obtém os dados do nó e os nós similares para exibição interativa ao clicar no nó do grafo plotado"""
         
-        node_exists = node_id in self.G.nodes
-        
-        if not node_exists:
-            str_id = str(node_id)
-            for graph_node_id in self.G.nodes:
-                if str(graph_node_id) == str_id:
-                    node_id = graph_node_id
-                    node_exists = True
-                    break
-        
-        # Final check if we have the node
-        if not node_exists or node_id not in self.G.nodes:
-            print(f"Nó não encontrado no grafo: {node_id}")
+        requested_id = node_id
+        node_id = self._node_id(node_id)
+        if node_id is None:
+            logger.debug("Nó não encontrado no grafo: %s", requested_id)
             return {
                 'error': 'Nó não encontrado',
                 'node_data': None,
@@ -429,85 +1290,64 @@ class GrafoOlx:
             'similar_nodes': similar_nodes
         }
         
+    def chart_aggregates(self):
+        """Contagens por estado e por marca (ordem decrescente) e histograma de preços
+
+        Calculadas com NumPy sobre as colunas do ListingStore uma vez por estado publicado.
+        Empates mantêm a ordem de primeira ocorrência, como na contagem com dicionários.
+        """
+        state = self.state
+        if state.aggregates is None:
+            aggregates = {}
+            for name, field in (('state', 'estado'), ('brand', 'marca')):
+                categories = state.listings.categories[field]
+                counts = np.bincount(state.listings.categorical[field], minlength=len(categories))
+                order = [c for c in np.argsort(-counts, kind='stable').tolist() if counts[c] and categories[c]]
+                aggregates[name] = ([categories[c] for c in order], counts[order].tolist())
+            prices = state.listings.numeric['price_value']
+            aggregates['price'] = np.histogram(prices[prices > 0], bins=PRICE_HISTOGRAM_BINS)
+            state.aggregates = aggregates
+        return state.aggregates
+    
+    def _bar_chart(self, labels, counts, figsize, xlabel, title):
+        # Figura própria (sem o estado global do pyplot), segura para renderizar em várias threads
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.bar(labels, counts)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel('Number of Anúncios')
+        ax.set_title(title)
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+        return fig
+    
     def visualize_state_distribution(self):
         """Visualiza a distribuição de motocicletas por estado"""
-        state_counts = defaultdict(int)
-        for m in self.listings:
-            if m['estado']:
-                state_counts[m['estado']] += 1
-        
-        # Ordena por contagem
-        sorted_states = sorted(state_counts.items(), key=lambda x: x[1], reverse=True)
-        states, counts = zip(*sorted_states)
-        
-        plt.figure(figsize=(10, 6))
-        plt.bar(states, counts)
-        plt.xlabel('State')
-        plt.ylabel('Number of Anúncios')
-        plt.title('Distribuição de Anúncios por Estado')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        return plt
+        states, counts = self.chart_aggregates()['state']
+        return self._bar_chart(states, counts, (10, 6), 'State', 'Distribuição de Anúncios por Estado')
     
     def visualize_brand_distribution(self):
         """Visualiza a distribuição de motocicletas por marca"""
-        brand_counts = defaultdict(int)
-        for m in self.listings:
-            if m['marca']:
-                brand_counts[m['marca']] += 1
-        
-        # Ordena por contagem
-        sorted_brands = sorted(brand_counts.items(), key=lambda x: x[1], reverse=True)
-        brands, counts = zip(*sorted_brands)
-        
-        plt.figure(figsize=(12, 6))
-        plt.bar(brands, counts)
-        plt.xlabel('Marca')
-        plt.ylabel('Number of Anúncios')
-        plt.title('Distribuição de Anúncios por Marca')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        return plt
+        brands, counts = self.chart_aggregates()['brand']
+        return self._bar_chart(brands, counts, (12, 6), 'Marca', 'Distribuição de Anúncios por Marca')
     
     def visualize_price_distribution(self):
         """Visualiza a distribuição de preço de motocicletas"""
-        prices = [m['price_value'] for m in self.listings if m['price_value'] > 0]
+        counts, edges = self.chart_aggregates()['price']
         
-        plt.figure(figsize=(10, 6))
-        plt.hist(prices, bins=20)
-        plt.xlabel('Preço (R$)')
-        plt.ylabel('Number of Anúncios')
-        plt.title('Distribuição de Preço de Anúncios')
-        plt.tight_layout()
-        return plt
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        # Histograma a partir das contagens já calculadas (um valor por faixa, com o peso da contagem)
+        ax.hist(edges[:-1], bins=edges, weights=counts)
+        ax.set_xlabel('Preço (R$)')
+        ax.set_ylabel('Number of Anúncios')
+        ax.set_title('Distribuição de Preço de Anúncios')
+        fig.tight_layout()
+        return fig
 
     def search_listings(self, query_text, top_n=10):
-        """Busca anúncios com base no texto da consulta usando TF-IDF"""
-        # Cria uma lista de documentos de anúncios
-        docs = []
-        for m in self.listings:
-            doc = f"{m['title']} {m['marca']} {m['modelo']} {m['cilindrada']} {m['ano']}"
-            docs.append(doc)
-        
-        # Cria a matriz TF-IDF
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(docs)
-        
-        # Transforma a consulta
-        query_vector = vectorizer.transform([query_text])
-        
-        # Calcula a similaridade
-        similarity_scores = cosine_similarity(query_vector, tfidf_matrix)[0]
-        
-        # Obtém os top resultados
-        top_indices = similarity_scores.argsort()[-top_n:][::-1]
-        results = []
-        
-        for idx in top_indices:
-            if similarity_scores[idx] > 0:
-                results.append({
-                    'listing': self.listings[idx],
-                    'similarity': similarity_scores[idx]
-                })
-        
-        return results
\ No newline at end of file
+        """Busca anúncios com base no texto da consulta usando o índice TF-IDF"""
+        return [{'listing': self.listings[idx], 'similarity': similarity}
+                for idx, similarity in self.search_index.search(query_text, top_n)]
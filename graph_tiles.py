@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+
+# Quantidade média de pontos por célula da grade espacial
+GRID_CELL_POINTS = 32
+# Limites de nós e arestas devolvidos por uma consulta de viewport
+MAX_VIEWPORT_NODES = 5000
+MAX_VIEWPORT_EDGES = 20000
+# A partir deste nível de zoom os anúncios aparecem individualmente; abaixo dele, como
+# supernós por comunidade (grafos com até max_nodes anúncios sempre aparecem inteiros)
+DETAIL_ZOOM = 3
+
+
+class GridIndex:
+    """Índice espacial em grade uniforme sobre pontos 2D
+
+    Os pontos ficam ordenados pela célula, linha a linha da grade, como em um CSR:
+    order[cell_start[c]:cell_start[c + 1]] são os pontos da célula c. Células vizinhas
+    na mesma linha são contíguas, então uma consulta retangular lê um trecho de order
+    por linha da grade e só confere as coordenadas dos pontos dessas células.
+    """
+
+    def __init__(self, points, cell_points=GRID_CELL_POINTS):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(self.points)
+        if n:
+            self.low, self.high = self.points.min(axis=0), self.points.max(axis=0)
+        else:
+            self.low, self.high = np.zeros(2), np.zeros(2)
+        self.cells = max(1, int(math.sqrt(n / cell_points)))
+        self.cell_size = np.maximum(self.high - self.low, 1e-12) / self.cells
+        cx, cy = self._cell_coordinates(self.points)
+        cell = cy * self.cells + cx
+        self.order = np.argsort(cell, kind='stable')
+        self.cell_start = np.searchsorted(cell[self.order], np.arange(self.cells * self.cells + 1))
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def bounds(self):
+        return (*self.low.tolist(), *self.high.tolist())
+
+    def _cell_coordinates(self, points):
+        cells = np.clip(((points - self.low) / self.cell_size).astype(np.int64), 0, self.cells - 1)
+        return cells[:, 0], cells[:, 1]
+
+    def query(self, x0, y0, x1, y1):
+        """Índices dos pontos dentro do retângulo (bordas inclusas), em ordem crescente"""
+        if not len(self) or x0 > x1 or y0 > y1:
+            return np.empty(0, dtype=np.int64)
+        (cx0, cx1), (cy0, cy1) = self._cell_coordinates(np.array([[x0, y0], [x1, y1]], dtype=np.float64))
+        rows = np.arange(cy0, cy1 + 1) * self.cells
+        candidates = np.concatenate([self.order[self.cell_start[r + cx0]:self.cell_start[r + cx1 + 1]]
+                                     for r in rows.tolist()])
+        x, y = self.points[candidates, 0], self.points[candidates, 1]
+        inside = candidates[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+        if len(inside) * 16 < len(self):
+            return np.sort(inside)
+        # Retângulos grandes: marcar em uma máscara sai mais barato que ordenar
+        mask = np.zeros(len(self), dtype=bool)
+        mask[inside] = True
+        return np.flatnonzero(mask)
+
+
+class GraphTiles:
+    """Consultas por viewport sobre o layout do grafo, com nível de detalhe
+
+    Guarda um GridIndex das posições dos anúncios e, para as visões afastadas, um
+    supernó por comunidade (centróide e tamanho) com as arestas entre comunidades
+    agregadas (soma dos pesos e quantidade). Linhas são as posições dos anúncios.
+    """
+
+    def __init__(self, coordinates, labels, indptr, indices, weights):
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.indptr, self.indices, self.weights = indptr, indices, weights
+        self.nodes = GridIndex(self.coordinates)
+
+        # Supernós: uma comunidade por rótulo distinto, na ordem crescente dos rótulos
+        self.communities, self.community_of = np.unique(np.asarray(labels, dtype=np.int64), return_inverse=True)
+        k = len(self.communities)
+        self.community_sizes = np.bincount(self.community_of, minlength=k)
+        sizes = np.maximum(self.community_sizes, 1)
+        centroids = np.stack([np.bincount(self.community_of, weights=self.coordinates[:, axis], minlength=k) / sizes
+                              for axis in (0, 1)], axis=1)
+        self.supernodes = GridIndex(centroids)
+
+        # Arestas entre comunidades diferentes, agregadas por par (menor, maior)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        upper = rows < indices
+        a, b = self.community_of[rows[upper]], self.community_of[indices[upper]]
+        cross = a != b
+        pairs = np.minimum(a, b)[cross] * k + np.maximum(a, b)[cross]
+        keys, inverse = np.unique(pairs, return_inverse=True)
+        self.super_sources, self.super_targets = keys // max(k, 1), keys % max(k, 1)
+        self.super_counts = np.bincount(inverse, minlength=len(keys))
+        self.super_weights = np.bincount(inverse, weights=weights[upper][cross], minlength=len(keys))
+
+    @property
+    def bounds(self):
+        return self.nodes.bounds
+
+    def zoom_for(self, x0, y0, x1, y1):
+        """Nível de zoom do viewport: log2 de quantas vezes ele é menor que o layout inteiro"""
+        bx0, by0, bx1, by1 = self.bounds
+        ratio = min((bx1 - bx0) / max(x1 - x0, 1e-12), (by1 - by0) / max(y1 - y0, 1e-12))
+        return max(0, int(math.floor(math.log2(ratio)))) if ratio > 0 else 0
+
+    def viewport(self, x0, y0, x1, y1, zoom=None, max_nodes=MAX_VIEWPORT_NODES, max_edges=MAX_VIEWPORT_EDGES):
+        """Conteúdo visível no retângulo
+
+        Retorna (level, rows, sources, targets, weights): no nível 'nodes' rows são os
+        anúncios visíveis e as arestas ligam linhas de anúncios (com ao menos uma ponta
+        visível); no nível 'communities' rows são os índices dos supernós visíveis e as
+        arestas ligam supernós. Acima de max_edges ficam as arestas de maior peso.
+        """
+        if zoom is None:
+            zoom = self.zoom_for(x0, y0, x1, y1)
+        if zoom >= DETAIL_ZOOM or len(self.nodes) <= max_nodes:
+            rows = self.nodes.query(x0, y0, x1, y1)
+            if len(rows) <= max_nodes:
+                return ('nodes', rows, *self._node_edges(rows, max_edges))
+        rows = self.supernodes.query(x0, y0, x1, y1)
+        visible = np.zeros(len(self.communities), dtype=bool)
+        visible[rows] = True
+        keep = np.flatnonzero(visible[self.super_sources] | visible[self.super_targets])
+        keep = _heaviest(keep, self.super_weights[keep], max_edges)
+        return 'communities', rows, self.super_sources[keep], self.super_targets[keep], self.super_weights[keep]
+
+    def _node_edges(self, rows, max_edges):
+        # Trechos do CSR das linhas visíveis; arestas entre duas linhas visíveis aparecem uma vez
+        visible = np.zeros(len(self.indptr) - 1, dtype=bool)
+        visible[rows] = True
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        sources = np.repeat(rows, lengths)
+        targets = self.indices[offsets].astype(np.int64)
+        keep = np.flatnonzero(~visible[targets] | (sources < targets))
+        keep = _heaviest(keep, self.weights[offsets[keep]], max_edges)
+        return sources[keep], targets[keep], self.weights[offsets[keep]]
+
+
+def _heaviest(positions, weights, limit):
+    # As limit posições de maior peso, mantidas na ordem original
+    if len(positions) <= limit:
+        return positions
+    return np.sort(positions[np.argsort(-weights, kind='stable')[:limit]])
@@ -0,0 +1,20 @@
+# Configuração do gunicorn para produção (gunicorn -c gunicorn.conf.py wsgi:app)
+import os
+
+bind = os.environ.get('GRAFO_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GRAFO_WORKERS', '2'))
+# Os handlers são seguros para threads (caches com locks e gráficos sem pyplot)
+threads = int(os.environ.get('GRAFO_THREADS', '4'))
+worker_class = 'gthread'
+
+# Carrega o grafo uma vez no processo principal e compartilha com os workers pelo fork
+preload_app = True
+
+# A primeira renderização de gráficos grandes pode demorar
+timeout = int(os.environ.get('GRAFO_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.environ.get('GRAFO_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
@@ -0,0 +1,55 @@
+import json
+from itertools import islice
+
+# Anúncios por lote entregues à construção do grafo
+FEED_BATCH_SIZE = 10000
+
+
+def normalize_listing_id(listing_id):
+    """Forma canônica (string de dígitos) de um listId
+
+    O motos_data.json guarda ids como strings, o arquivo bruto como inteiros e o pandas
+    pode produzir floats ('1367327410.0'); todas as buscas passam por esta conversão.
+    """
+    # Casos mais comuns primeiro: strings de dígitos (motos_data.json) e inteiros (arquivo bruto)
+    if type(listing_id) is str and listing_id.isdigit():
+        return listing_id
+    if type(listing_id) is int:
+        return str(listing_id)
+    if listing_id is None:
+        return None
+    if isinstance(listing_id, float) and listing_id.is_integer():
+        return str(int(listing_id))
+    listing_id = str(listing_id).strip()
+    if listing_id.endswith('.0') and listing_id[:-2].isdigit():
+        return listing_id[:-2]
+    return listing_id
+
+
+def read_jsonl(path):
+    """Lê um arquivo JSON Lines (um anúncio por linha, como o gerado por `scrapy -o arquivo.jsonl`)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def batched(iterable, size=FEED_BATCH_SIZE):
+    """Agrupa um iterável em listas de até size itens"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_listings_json(listings, path):
+    """Grava os anúncios como um array JSON, um por vez (formato de motos_data.json)"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for m in listings:
+            f.write(',' if count else '')
+            json.dump(m, f, ensure_ascii=False)
+            count += 1
+        f.write(']')
+    return count
@@ -1,19 +1,39 @@
 import os
-import pandas as pd
+from ingest import read_jsonl, batched, write_listings_json
+from listing_arrow import pa, ListingArrowWriter
+from listing_store import ListingStore
+from normalize import NORMALIZE_CHUNK_ROWS, FeedNormalizer, prepare_frame
 
-# Check if motos_data.json exists, remove it if it does, then run the olxSpider crawler
-if os.path.exists('motos_data_raw.json'):
-    os.remove('motos_data_raw.json')
-os.system('scrapy runspider OlxSpider.py -o motos_data_raw.json')
+# Remove a saída anterior e roda o crawler do olxSpider em JSON Lines (um anúncio por linha)
+if os.path.exists('motos_data_raw.jsonl'):
+    os.remove('motos_data_raw.jsonl')
+os.system('scrapy runspider OlxSpider.py -o motos_data_raw.jsonl')
 
+# Limpeza em blocos (filtro de financiados, normalização de listId/quilometragem/ano,
+# preços inválidos e remoção de duplicados), sem carregar o arquivo bruto inteiro na memória.
+# Com o pyarrow, cada bloco limpo também é gravado na versão colunar e tipada (preço e
+# quilometragem já numéricos, fotos em tabela própria), lida pelo GrafoOlx mapeada em memória
+normalizer = FeedNormalizer()
 
-df = pd.read_json('motos_data_raw.json')
-df = df[df['status_financeiro'] != 'Financiado']
-df['listId'] = df['listId'].astype(str)
-df['listId'] = df['listId'].str[:-2]
-df['quilometragem'] = df['quilometragem'].apply(lambda x: str(x) if isinstance(x, float) else x).astype(str).str[:-2]
-df['ano'] = df['ano'].astype(str).str[:-2]
-df.drop_duplicates(subset=['listId'], inplace=True)
-df = df[df['listId'] != 'n']
-df.reset_index(drop=True, inplace=True)
-df.to_json('motos_data.json', orient='records')
\ No newline at end of file
+
+def cleaned(arrow=None):
+    for batch in batched(read_jsonl('motos_data_raw.jsonl'), NORMALIZE_CHUNK_ROWS):
+        records = normalizer.clean(batch)
+        if arrow is not None:
+            arrow.write(ListingStore.from_frame(prepare_frame(records)))
+        yield from records
+
+
+if pa is not None:
+    with ListingArrowWriter('motos_data.arrow') as arrow:
+        count = write_listings_json(cleaned(arrow), 'motos_data.json')
+    print(f"{count} anúncios gravados em motos_data.json")
+    print(f"{arrow.rows} anúncios gravados em motos_data.arrow")
+else:
+    count = write_listings_json(cleaned(), 'motos_data.json')
+    print(f"{count} anúncios gravados em motos_data.json")
+
+# Relatório dos anúncios descartados (linha no arquivo bruto, listId e motivo)
+rejected = normalizer.rejected()
+rejected.to_csv('motos_data_rejected.csv', index=False)
+print(f"{len(rejected)} anúncios descartados ({normalizer.rejected_counts()}), ver motos_data_rejected.csv")
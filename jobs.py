@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    __slots__ = ('name', 'state', 'runs', 'failures', 'submitted', 'started', 'finished', 'duration', 'error')
+
+    def __init__(self, name):
+        self.name = name
+        self.state = 'idle'
+        self.runs = 0
+        self.failures = 0
+        self.submitted = None
+        self.started = None
+        self.finished = None
+        self.duration = None
+        self.error = None
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class JobScheduler:
+    """Executa recálculos caros em uma thread de fundo, fora das requisições
+
+    Os jobs têm nome: enquanto um job aguarda na fila, um novo envio com o mesmo nome
+    apenas substitui a função (vale sempre o pedido mais recente); se ele já estiver
+    rodando, a nova versão roda logo depois. Quem usa os resultados continua servindo a
+    versão anterior até o job publicar a nova (stale-while-revalidate).
+    """
+
+    def __init__(self):
+        self._queue = OrderedDict()
+        self._status = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._running = None
+        self._thread = None
+        # A thread não sobrevive ao fork dos workers do gunicorn: cada processo inicia a sua
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._running = None
+        self._thread = None
+
+    def submit(self, name, func):
+        """Agenda func() com o nome dado, substituindo um pedido ainda não iniciado"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+                self._thread.start()
+            status = self._status.setdefault(name, JobStatus(name))
+            self._queue[name] = func
+            status.state = 'queued' if self._running != name else 'running'
+            status.submitted = time.time()
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._changed.wait()
+                name, func = self._queue.popitem(last=False)
+                self._running = name
+                status = self._status[name]
+                status.state = 'running'
+                status.started = time.time()
+            error = None
+            try:
+                func()
+            except Exception as e:
+                logger.exception("Falha no job %s", name)
+                error = repr(e)
+            with self._lock:
+                self._running = None
+                status.finished = time.time()
+                status.duration = status.finished - status.started
+                status.runs += 1
+                status.error = error
+                status.failures += error is not None
+                status.state = 'queued' if name in self._queue else ('failed' if error else 'idle')
+                self._changed.notify_all()
+
+    def idle(self):
+        with self._lock:
+            return not self._queue and self._running is None
+
+    def wait(self, timeout=None):
+        """Espera a fila esvaziar; retorna False se o tempo acabar antes"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._queue or self._running is not None:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self._running,
+                'queued': list(self._queue),
+                'jobs': {name: status.to_dict() for name, status in self._status.items()},
+            }
@@ -0,0 +1,155 @@
+import numpy as np
+
+# Acima deste número de nós a repulsão é aproximada pela quadtree (Barnes–Hut)
+BARNES_HUT_THRESHOLD = 500
+
+# Número máximo de pares avaliados de uma só vez na repulsão exata
+BLOCK_SIZE = 1 << 20
+
+
+def _exact_repulsion(positions, k2):
+    # Repulsão k²/d entre todos os pares, em blocos de linhas
+    n = len(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    displacement = np.zeros_like(positions)
+    rows = max(1, BLOCK_SIZE // max(n, 1))
+    for r0 in range(0, n, rows):
+        dx = x[r0:r0 + rows, None] - x[None, :]
+        dy = y[r0:r0 + rows, None] - y[None, :]
+        factor = k2 / np.maximum(dx * dx + dy * dy, 1e-9)
+        factor[np.arange(len(dx)), np.arange(r0, r0 + len(dx))] = 0.0
+        displacement[r0:r0 + rows, 0] = (factor * dx).sum(axis=1)
+        displacement[r0:r0 + rows, 1] = (factor * dy).sum(axis=1)
+    return displacement
+
+
+def _add_pair_forces(displacement, i, delta, factor):
+    displacement[:, 0] += np.bincount(i, weights=delta[:, 0] * factor, minlength=len(displacement))
+    displacement[:, 1] += np.bincount(i, weights=delta[:, 1] * factor, minlength=len(displacement))
+
+
+def _barnes_hut_repulsion(positions, k2):
+    """Repulsão aproximada por uma quadtree completa (uma grade 2^l x 2^l por nível)
+
+    Cada par de nós interage uma única vez: pelos centros de massa das células no nível
+    mais grosso em que as células não são vizinhas mas as células-pai são; os pares em
+    células vizinhas do nível mais fino são calculados exatamente.
+    """
+    n = len(positions)
+    displacement = np.zeros_like(positions)
+    # Precisão simples basta para a aproximação e reduz o tráfego de memória
+    positions = positions.astype(np.float32)
+    depth = int(np.clip(np.ceil(np.log(n) / np.log(4)), 2, 12))
+
+    origin = positions.min(axis=0)
+    extent = max(float((positions.max(axis=0) - origin).max()), 1e-9) * (1 + 1e-9)
+    unit = (positions - origin) / extent
+
+    for level in range(2, depth + 1):
+        side = 1 << level
+        cell = np.minimum((unit * side).astype(np.int64), side - 1)
+
+        # Grade com borda vazia de 3 células, para que nenhum deslocamento saia da grade
+        padded = side + 6
+        flat = (cell[:, 0] + 3) * padded + (cell[:, 1] + 3)
+        mass = np.bincount(flat, minlength=padded * padded).astype(np.float64)
+        center = np.zeros((padded * padded, 2))
+        center[:, 0] = np.bincount(flat, weights=positions[:, 0], minlength=padded * padded)
+        center[:, 1] = np.bincount(flat, weights=positions[:, 1], minlength=padded * padded)
+        center = (center / np.maximum(mass, 1)[:, None]).astype(np.float32)
+        strength = (mass * k2).astype(np.float32)
+
+        # Filhos dos vizinhos da célula-pai (deslocamentos de -2-b a 3-b, b = posição no pai),
+        # exceto as células vizinhas, que são tratadas no nível seguinte
+        parity = (cell[:, 0] & 1) * 2 + (cell[:, 1] & 1)
+        for p, (bx, by) in enumerate(((0, 0), (0, 1), (1, 0), (1, 1))):
+            nodes = np.flatnonzero(parity == p)
+            offsets = [dx * padded + dy for dx in range(-2 - bx, 4 - bx) for dy in range(-2 - by, 4 - by)
+                       if abs(dx) > 1 or abs(dy) > 1]
+            target = flat[nodes, None] + np.array(offsets)[None, :]
+            delta = positions[nodes, None, :] - center[target]
+            dist2 = np.maximum(np.einsum('ijk,ijk->ij', delta, delta), 1e-9)
+            displacement[nodes] += np.einsum('ij,ijk->ik', strength[target] / dist2, delta)
+
+    # Pares nas células vizinhas do nível mais fino (inclusive a própria): cálculo exato
+    order = np.argsort(flat, kind='stable')
+    starts = np.searchsorted(flat[order], np.arange(padded * padded))
+    counts = mass.astype(np.int64)
+    target = flat[:, None] + np.array([dx * padded + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])[None, :]
+    sizes = counts[target].ravel()
+    i = np.repeat(np.repeat(np.arange(n), 9), sizes)
+    offsets = np.arange(len(i)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    j = order[np.repeat(starts[target].ravel(), sizes) + offsets]
+    i, j = i[i != j], j[i != j]
+    delta = positions[i] - positions[j]
+    dist2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-9)
+    _add_pair_forces(displacement, i, delta, k2 / dist2)
+    return displacement
+
+
+def force_layout(n, sources, targets, weights=None, iterations=50, seed=0, initial=None, temperature=0.1,
+                 barnes_hut_threshold=BARNES_HUT_THRESHOLD):
+    """Layout de forças (Fruchterman–Reingold) vetorizado
+
+    As forças repulsivas são calculadas para todos os pares (ou aproximadas pela
+    quadtree acima de barnes_hut_threshold nós) e as atrativas sobre os arrays de
+    arestas em lote. O resultado é determinístico para a mesma semente. initial
+    permite partir de posições existentes, em geral com uma temperature (deslocamento
+    máximo inicial) menor para apenas refinar o layout. Retorna um array (n, 2).
+    """
+    rng = np.random.default_rng(seed)
+    positions = rng.random((n, 2)) if initial is None else np.array(initial, dtype=np.float64)
+    if n < 2:
+        return positions
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # Distância ideal entre nós para uma área unitária
+    k = 1.0 / np.sqrt(n)
+    gravity = 0.05
+    for step in range(iterations):
+        if n > barnes_hut_threshold:
+            displacement = _barnes_hut_repulsion(positions, k * k)
+        else:
+            displacement = _exact_repulsion(positions, k * k)
+
+        # Atração d²/k ao longo das arestas, ponderada pela similaridade
+        delta = positions[sources] - positions[targets]
+        distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        factor = distance / k * weights
+        _add_pair_forces(displacement, sources, delta, -factor)
+        _add_pair_forces(displacement, targets, delta, factor)
+
+        # Gravidade leve mantém componentes desconexos próximos do centro
+        displacement -= gravity * (positions - positions.mean(axis=0)) / k
+
+        # Limita o deslocamento pela temperatura, que decresce linearmente
+        length = np.maximum(np.sqrt(np.einsum('ij,ij->i', displacement, displacement)), 1e-12)
+        limit = temperature * (1 - step / iterations)
+        positions += displacement * (np.minimum(length, limit) / length)[:, None]
+
+    return positions
+
+
+def edge_length_stress(positions, sources, targets):
+    """Métricas de qualidade do layout (menor é melhor)
+
+    - stress: variância relativa dos comprimentos das arestas, sum((d/média - 1)²) / E;
+    - edge_ratio: comprimento médio das arestas dividido pela distância média entre
+      pares aleatórios de nós (vizinhos devem ficar mais próximos que nós quaisquer).
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    lengths = np.linalg.norm(positions[sources] - positions[targets], axis=1)
+    if len(lengths) == 0:
+        return {'stress': 0.0, 'edge_ratio': 0.0}
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, len(positions), 10000)
+    b = rng.integers(0, len(positions), 10000)
+    random_mean = np.linalg.norm(positions[a] - positions[b], axis=1).mean()
+    mean = lengths.mean()
+    return {
+        'stress': float(np.mean((lengths / max(mean, 1e-12) - 1) ** 2)),
+        'edge_ratio': float(mean / max(random_mean, 1e-12)),
+    }
@@ -0,0 +1,243 @@
+import json
+import os
+
+import numpy as np
+
+from listing_store import CATEGORICAL_FIELDS, NUMERIC_FIELDS, TEXT_FIELDS, ListingStore, TextColumn
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow é opcional; sem ele os anúncios são lidos do JSON
+    pa = None
+
+# Campos de cada foto, gravados na tabela de fotos (uma linha por foto)
+IMAGE_FIELDS = ('original', 'originalAlt', 'originalWebP', 'thumbnail')
+
+
+def arrow_path(json_path):
+    """Arquivo Arrow correspondente a um arquivo de anúncios JSON (motos_data.json -> motos_data.arrow)"""
+    return os.path.splitext(json_path)[0] + '.arrow'
+
+
+def images_path(path):
+    # Tabela de fotos gravada ao lado da tabela de anúncios
+    return os.path.splitext(path)[0] + '.images.arrow'
+
+
+def preferred_data_file(json_path):
+    """O arquivo Arrow do JSON dado, se existir, estiver atualizado e o pyarrow estiver instalado; senão o JSON"""
+    path = arrow_path(json_path)
+    if pa is None or not os.path.exists(path) or not os.path.exists(images_path(path)):
+        return json_path
+    if os.path.exists(json_path) and os.path.getmtime(json_path) > os.path.getmtime(path):
+        return json_path
+    return path
+
+
+def _text_array(column):
+    # Strings com offsets de 64 bits: os buffers do TextColumn viram a coluna sem cópia
+    n = len(column)
+    validity = pa.py_buffer(np.packbits(~column.null, bitorder='little')) if column.null.any() else None
+    return pa.LargeStringArray.from_buffers(n, pa.py_buffer(column.offsets), pa.py_buffer(bytes(column.data)),
+                                            validity)
+
+
+def _text_column(array):
+    """TextColumn sobre os buffers de uma coluna large_string, sem copiar os dados"""
+    validity, offsets, data = array.buffers()
+    column = TextColumn()
+    column.offsets = np.frombuffer(offsets, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    column.data = np.frombuffer(data, dtype=np.uint8) if data is not None else bytearray()
+    if validity is None:
+        column.null = np.zeros(len(array), dtype=bool)
+    else:
+        bits = np.unpackbits(np.frombuffer(validity, dtype=np.uint8), bitorder='little')
+        column.null = bits[array.offset:array.offset + len(array)] == 0
+    return column
+
+
+class ImageColumn:
+    """Fotos dos anúncios lidas da tabela de fotos, com a interface de TextColumn usada pelo ListingStore
+
+    starts[i]:starts[i + 1] são as linhas da tabela com as fotos do anúncio i; cada campo
+    é um TextColumn sobre os buffers mapeados do arquivo.
+    """
+
+    __slots__ = ('starts', 'null', 'fields')
+
+    def __init__(self, starts, null, fields):
+        self.starts = starts
+        self.null = null
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.null)
+
+    def get_json(self, i):
+        if self.null[i]:
+            return None
+        return [{field: column.get(k) for field, column in self.fields.items()}
+                for k in range(self.starts[i], self.starts[i + 1])]
+
+    def get_bytes(self, i):
+        value = self.get_json(i)
+        return None if value is None else json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def append(self, values):
+        # Mesmo formato de TextColumn.append (JSON de cada lista de fotos); as fotos vão para o fim das colunas
+        images = [None if value is None else json.loads(value) for value in values]
+        for field, column in self.fields.items():
+            column.append([image.get(field) for value in images if value for image in value])
+        counts = np.fromiter((len(value) if value else 0 for value in images), dtype=np.int64, count=len(images))
+        self.starts = np.concatenate([self.starts, self.starts[-1] + np.cumsum(counts)])
+        self.null = np.concatenate([self.null, np.fromiter((value is None for value in images), dtype=bool,
+                                                           count=len(images))])
+
+    def take(self, rows):
+        column = TextColumn()
+        column.append([None if self.null[i] else self.get_bytes(i).decode('utf-8') for i in rows])
+        return column
+
+    def nbytes(self):
+        return self.starts.nbytes + self.null.nbytes + sum(column.nbytes() for column in self.fields.values())
+
+
+def write_listings_arrow(listings, path):
+    """Grava um ListingStore em dois arquivos Arrow IPC: anúncios e fotos
+
+    Na tabela de anúncios os campos categóricos são dicionários (os códigos do
+    ListingStore), price_value e km já numéricos e os textos strings; a tabela de fotos
+    tem uma linha por foto, com a linha do anúncio. Sem compressão, para que a leitura
+    possa mapear o arquivo em memória sem cópias.
+    """
+    with ListingArrowWriter(path) as writer:
+        writer.write(listings)
+    return len(listings)
+
+
+class ListingArrowWriter:
+    """Grava os arquivos de write_listings_arrow um bloco de anúncios por vez
+
+    Cada write() recebe um ListingStore com um bloco e o grava como um record batch em
+    cada tabela, então a memória usada depende do bloco e não do total de anúncios. Os
+    dicionários dos campos categóricos são comuns aos blocos: valores novos entram no fim
+    e são gravados como deltas. Os arquivos anteriores só são substituídos no fim do
+    bloco with (ou em close()); com uma exceção os temporários são apagados.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._codes = {field: {} for field in CATEGORICAL_FIELDS}
+        self._tmp_paths = (f'{path}.tmp-{os.getpid()}', f'{images_path(path)}.tmp-{os.getpid()}')
+        self._schemas = (
+            pa.schema([(field, pa.large_string()) for field in TEXT_FIELDS]
+                      + [(field, pa.dictionary(pa.int32(), pa.string())) for field in CATEGORICAL_FIELDS]
+                      + [(field, pa.from_numpy_dtype(dtype)) for field, dtype in NUMERIC_FIELDS.items()]
+                      + [('extra', pa.large_string()), ('has_images', pa.bool_())]),
+            pa.schema([('listing', pa.int64())] + [(field, pa.large_string()) for field in IMAGE_FIELDS]),
+        )
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        self._sinks = [pa.OSFile(tmp_path, 'wb') for tmp_path in self._tmp_paths]
+        self._writers = [pa.ipc.new_file(sink, schema, options=options)
+                         for sink, schema in zip(self._sinks, self._schemas)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        self._finish()
+        for tmp_path in self._tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _dictionary_array(self, field, categories, codes):
+        # Códigos do bloco -> códigos do dicionário comum; None sai do dicionário e vira um valor nulo
+        common = self._codes[field]
+        lookup = np.array([-1 if value is None else common.setdefault(value, len(common)) for value in categories],
+                          dtype=np.int32)
+        codes = lookup[codes]
+        mask = codes < 0
+        return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32(), mask=mask if mask.any() else None),
+                                              pa.array(list(common), pa.string()))
+
+    def write(self, listings):
+        """Acrescenta os anúncios de um ListingStore aos arquivos"""
+        columns = [_text_array(listings.text[field]) for field in TEXT_FIELDS]
+        columns += [self._dictionary_array(field, listings.categories[field], listings.categorical[field])
+                    for field in CATEGORICAL_FIELDS]
+        columns += [pa.array(listings.numeric[field]) for field in NUMERIC_FIELDS]
+        columns.append(_text_array(listings.extra))
+
+        image_rows, has_images = [], np.zeros(len(listings), dtype=bool)
+        images = {field: [] for field in IMAGE_FIELDS}
+        for i, value in enumerate(listings.column('imagens')):
+            if value is None:
+                continue
+            has_images[i] = True
+            for image in value:
+                image_rows.append(self.rows + i)
+                for field in IMAGE_FIELDS:
+                    images[field].append(image.get(field))
+        columns.append(pa.array(has_images))
+
+        listing_schema, image_schema = self._schemas
+        listing_writer, image_writer = self._writers
+        listing_writer.write_batch(pa.record_batch(columns, schema=listing_schema))
+        image_writer.write_batch(pa.record_batch(
+            [pa.array(image_rows, pa.int64())] + [pa.array(images[field], pa.large_string()) for field in IMAGE_FIELDS],
+            schema=image_schema))
+        self.rows += len(listings)
+
+    def _finish(self):
+        for writer, sink in zip(self._writers, self._sinks):
+            writer.close()
+            sink.close()
+
+    def close(self):
+        """Fecha os arquivos e substitui os anteriores (a tabela de fotos primeiro)"""
+        self._finish()
+        tmp_path, tmp_images = self._tmp_paths
+        os.replace(tmp_images, images_path(self.path))
+        os.replace(tmp_path, self.path)
+
+
+def _read_table(path):
+    # Arquivo mapeado em memória: os arrays apontam para as páginas do arquivo
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.combine_chunks() if any(column.num_chunks > 1 for column in table.columns) else table
+
+
+def read_listings_arrow(path):
+    """ListingStore lido de arquivos gravados por write_listings_arrow, sem cópia dos textos e números"""
+    table = _read_table(path)
+    column = lambda name: table.column(name).chunk(0) if table.column(name).num_chunks else pa.array([])
+    store = ListingStore()
+    for field in TEXT_FIELDS:
+        store.text[field] = _text_column(column(field))
+    for field in CATEGORICAL_FIELDS:
+        array = column(field)
+        categories = array.dictionary.to_pylist()
+        codes = array.indices
+        if codes.null_count:
+            # Valores nulos voltam como a categoria None, no fim do dicionário
+            categories.append(None)
+            codes = codes.fill_null(len(categories) - 1)
+        store.categories[field] = categories
+        store._codes[field] = {value: code for code, value in enumerate(categories)}
+        store.categorical[field] = codes.to_numpy(zero_copy_only=False).astype(np.int32, copy=False)
+    for field, dtype in NUMERIC_FIELDS.items():
+        store.numeric[field] = column(field).to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+    store.extra = _text_column(column('extra'))
+
+    images = _read_table(images_path(path))
+    rows = images.column('listing').to_numpy()
+    starts = np.searchsorted(rows, np.arange(len(store) + 1)).astype(np.int64)
+    fields = {field: _text_column(images.column(field).chunk(0)) if images.num_rows else TextColumn()
+              for field in IMAGE_FIELDS}
+    null = ~column('has_images').to_numpy(zero_copy_only=False)
+    store.text['imagens'] = ImageColumn(starts, null, fields)
+    return store
@@ -0,0 +1,118 @@
+import json
+
+from listing_store import FIELDS
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele a serialização usa o módulo json
+    orjson = None
+
+
+def _dumps_json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _dumps_orjson(obj):
+    return orjson.dumps(obj)
+
+
+# Serializadores disponíveis: objeto -> bytes JSON (UTF-8, sem espaços)
+SERIALIZERS = {'json': _dumps_json}
+if orjson is not None:
+    SERIALIZERS['orjson'] = _dumps_orjson
+DEFAULT_SERIALIZER = 'orjson' if orjson is not None else 'json'
+
+# Visão compacta usada nas listas: dados do card e a miniatura da primeira foto
+CARD_FIELDS = ('listId', 'title', 'price', 'price_value', 'estado', 'cilindrada', 'marca', 'modelo', 'ano',
+               'quilometragem', 'thumbnail')
+# Visão completa (/listing/<id>): todos os campos, com as fotos apenas em 'imagens'
+FULL_FIELDS = tuple(field for field in FIELDS if field != 'images')
+VIEWS = {'card': CARD_FIELDS, 'full': FULL_FIELDS}
+# Campos que podem ser pedidos em fields=
+PROJECTABLE_FIELDS = frozenset(FIELDS) | {'thumbnail'}
+
+
+def thumbnail(images):
+    """URL da miniatura da primeira foto de um anúncio (ou None)"""
+    if not images:
+        return None
+    return images[0].get('thumbnail') or images[0].get('original')
+
+
+def parse_fields(value, default='card'):
+    """Campos de uma projeção fields= ('card', 'full' ou nomes separados por vírgula); ValueError se inválida"""
+    value = (value or default).strip()
+    if value in VIEWS:
+        return VIEWS[value]
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in PROJECTABLE_FIELDS]
+    if not fields or unknown:
+        raise ValueError(f"campos inválidos: {', '.join(unknown) or value}")
+    return fields
+
+
+class ListingFragments:
+    """JSON pré-serializado de cada anúncio na visão card, para montar respostas concatenando bytes
+
+    Os fragmentos seguem as linhas do ListingStore e são mantidos como o índice de busca
+    (take/add em apply_updates). Outras projeções são serializadas sob demanda.
+    """
+
+    def __init__(self, serializer=DEFAULT_SERIALIZER):
+        self.dumps = SERIALIZERS[serializer]
+        self.cards = []
+
+    def __len__(self):
+        return len(self.cards)
+
+    def fit(self, listings):
+        """Serializa a visão card de todos os anúncios (linha i = anúncio i)"""
+        self.cards = []
+        self.add(listings)
+        return self
+
+    def add(self, listings):
+        """Anexa os fragmentos de novos anúncios (ListingStore ou lista de dicionários)"""
+        if hasattr(listings, 'column'):
+            # Leitura por colunas, bem mais rápida que campo a campo
+            columns = [listings.column(field) for field in CARD_FIELDS[:-1]]
+            columns.append([thumbnail(images) for images in listings.column('imagens')])
+            rows = zip(*columns)
+        else:
+            rows = ([listing.get(field) for field in CARD_FIELDS[:-1]] + [thumbnail(listing.get('imagens'))]
+                    for listing in listings)
+        self.cards.extend(self.dumps(dict(zip(CARD_FIELDS, values))) for values in rows)
+
+    def take(self, rows):
+        """Novos fragmentos apenas com as linhas informadas (ex.: após remover anúncios)"""
+        fragments = ListingFragments()
+        fragments.dumps = self.dumps
+        fragments.cards = [self.cards[i] for i in rows]
+        return fragments
+
+    def project(self, listing, fields):
+        """Dicionário com os campos pedidos de um anúncio"""
+        return {field: thumbnail(listing.get('imagens')) if field == 'thumbnail' else listing.get(field)
+                for field in fields}
+
+    def fragment(self, listings, i, fields=CARD_FIELDS):
+        """Bytes JSON do anúncio da linha i na projeção dada"""
+        if fields == CARD_FIELDS:
+            return self.cards[i]
+        return self.dumps(self.project(listings[i], fields))
+
+    def array(self, listings, rows, fields=CARD_FIELDS, extra=None):
+        """Array JSON dos anúncios das linhas dadas; extra[k] (dicionário) é mesclado ao k-ésimo objeto"""
+        fragments = [self.fragment(listings, i, fields) for i in rows]
+        if extra is not None:
+            fragments = [merge(self.dumps(values), fragment) for values, fragment in zip(extra, fragments)]
+        return b'[' + b','.join(fragments) + b']'
+
+
+def merge(prefix, fragment):
+    """Junta dois objetos JSON serializados (as chaves de prefix vêm primeiro)"""
+    if prefix == b'{}':
+        return fragment
+    if fragment == b'{}':
+        return prefix
+    return prefix[:-1] + b',' + fragment[1:]
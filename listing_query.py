@@ -0,0 +1,134 @@
+import base64
+import json
+
+import numpy as np
+
+# Filtros de igualdade de /listings: parâmetro -> campo categórico do ListingStore
+LISTING_FILTERS = {'state': 'estado', 'brand': 'marca', 'model': 'modelo', 'year': 'ano'}
+# Filtros de intervalo (min_<parâmetro> e max_<parâmetro>): parâmetro -> campo
+RANGE_FILTERS = {'price': 'price_value', 'km': 'km', 'year': 'ano'}
+
+# Tamanho padrão e máximo de uma página de /listings
+LISTINGS_PAGE_SIZE = 50
+LISTINGS_MAX_PAGE_SIZE = 500
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+
+def inverted_index(codes, categories):
+    """{valor: linhas em ordem crescente} a partir dos códigos de um campo categórico"""
+    # Uma ordenação estável dos códigos agrupa as linhas de cada valor já ordenadas
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+    return {categories[c]: order[bounds[c]:bounds[c + 1]]
+            for c in range(len(categories)) if bounds[c + 1] > bounds[c]}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def numeric_values(listings, field):
+    """Valores numéricos de um campo; categóricos em texto (ex.: ano) são convertidos, inválidos viram NaN"""
+    if field in listings.numeric:
+        return listings.numeric[field]
+    table = np.array([_to_float(value) for value in listings.categories[field]], dtype=np.float64)
+    return table[listings.categorical[field]]
+
+
+def encode_cursor(price, listing_id):
+    # Posição após o último anúncio de uma página: (preço, listId), estável entre atualizações do grafo
+    payload = json.dumps([float(price), str(listing_id)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+class InvalidCursor(ValueError):
+    """Cursor de /listings que não veio de encode_cursor"""
+
+
+def decode_cursor(cursor):
+    """(preço, listId) de um cursor gerado por encode_cursor; InvalidCursor se for inválido"""
+    try:
+        price, listing_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(price), str(listing_id)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor('cursor inválido') from e
+
+
+class ListingQueryIndex:
+    """Índices para filtrar, ordenar por preço e paginar anúncios sem percorrer todos
+
+    - índices invertidos {valor: linhas} dos campos de LISTING_FILTERS;
+    - a ordem de listagem (preço e, nos empates, listId) e a posição de cada linha nela;
+    - para cada campo de RANGE_FILTERS, as linhas ordenadas pelo valor, em que um
+      intervalo vira uma fatia encontrada por busca binária.
+
+    Um resultado filtrado sai ordenado ordenando apenas as posições das suas linhas. A
+    paginação usa cursores com o (preço, listId) do último anúncio entregue, então uma
+    página seguinte continua do ponto certo mesmo se o grafo mudar entre as requisições.
+    """
+
+    def __init__(self, listings):
+        self.size = len(listings)
+        self.attributes = {field: inverted_index(listings.categorical[field], listings.categories[field])
+                           for field in set(LISTING_FILTERS.values())}
+
+        prices = listings.numeric['price_value']
+        ids = np.array(listings.column('listId'), dtype=str)
+        self.order = np.lexsort((ids, prices))
+        self.rank = np.empty(self.size, dtype=np.int64)
+        self.rank[self.order] = np.arange(self.size)
+        self.sorted_prices = prices[self.order]
+        self.sorted_ids = ids[self.order]
+
+        self.ranges = {}
+        for field in set(RANGE_FILTERS.values()):
+            values = numeric_values(listings, field)
+            # NaN fica no fim da ordenação e fora de qualquer intervalo
+            order = np.argsort(values, kind='stable')
+            self.ranges[field] = (order, values[order])
+
+    def _range_rows(self, field, low, high):
+        order, values = self.ranges[field]
+        start = 0 if low is None else np.searchsorted(values, low, 'left')
+        stop = np.searchsorted(values, np.inf if high is None else high, 'right')
+        return np.sort(order[start:stop]) if stop > start else EMPTY_ROWS
+
+    def _position(self, cursor):
+        # Primeira posição da ordem de listagem depois do (preço, listId) do cursor
+        price, listing_id = decode_cursor(cursor)
+        start = np.searchsorted(self.sorted_prices, price, 'left')
+        stop = np.searchsorted(self.sorted_prices, price, 'right')
+        return start + np.searchsorted(self.sorted_ids[start:stop], listing_id, 'right')
+
+    def query(self, filters=None, ranges=None, cursor=None, limit=LISTINGS_PAGE_SIZE):
+        """Uma página de resultados em ordem de preço: (linhas, cursor da próxima página ou None, total)
+
+        filters: {campo: valor}; ranges: {campo: (mínimo, máximo)}, com None para um lado
+        aberto; cursor: o next_cursor de uma página anterior (InvalidCursor se for inválido).
+        """
+        rows = None
+        for field, value in (filters or {}).items():
+            matches = self.attributes[field].get(value, EMPTY_ROWS)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        for field, (low, high) in (ranges or {}).items():
+            matches = self._range_rows(field, low, high)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+
+        begin = 0 if cursor is None else self._position(cursor)
+        if rows is None:
+            total = self.size
+            page = np.arange(begin, min(begin + limit, total))
+        else:
+            # Posições das linhas filtradas na ordem de listagem
+            positions = np.sort(self.rank[rows])
+            total = len(positions)
+            start = np.searchsorted(positions, begin, 'left')
+            page = positions[start:start + limit]
+        next_cursor = None
+        if len(page) == limit and page[-1] < (self.size - 1 if rows is None else positions[-1]):
+            next_cursor = encode_cursor(self.sorted_prices[page[-1]], self.sorted_ids[page[-1]])
+        return self.order[page], next_cursor, total
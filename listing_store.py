@@ -0,0 +1,279 @@
+import json
+from collections.abc import Mapping, Sequence
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele os campos pesados são codificados com o módulo json
+    orjson = None
+
+# Campos com poucos valores distintos: códigos int32 e uma lista de categorias
+CATEGORICAL_FIELDS = ('estado', 'cilindrada', 'marca', 'modelo', 'ano', 'status_financeiro')
+# Campos numéricos calculados por normalize.prepare_frame
+NUMERIC_FIELDS = {'price_value': np.float64, 'km': np.int64}
+# Textos curtos: bytes UTF-8 concatenados com offsets
+TEXT_FIELDS = ('listId', 'title', 'price', 'url', 'quilometragem', 'locations')
+# Campos pesados guardados como JSON compacto e decodificados apenas quando lidos
+LAZY_FIELDS = ('imagens',)
+# Nomes alternativos expostos pela visão ('images' mantém as keys em inglês)
+ALIASES = {'images': 'imagens'}
+
+# Anúncios codificados por vez em from_listings (limita as listas temporárias)
+APPEND_CHUNK = 10000
+# Marca os valores ausentes em append_frame (o pandas trata None e NaN como ausentes)
+_MISSING = object()
+
+# Ordem dos campos na visão, a mesma de motos_data.json seguida dos campos calculados
+FIELDS = ('listId', 'title', 'price', 'estado', 'url', 'cilindrada', 'marca', 'modelo', 'ano',
+          'quilometragem', 'status_financeiro', 'locations', 'imagens', 'price_value', 'km', 'images')
+
+
+def _dumps(value):
+    # JSON compacto dos campos pesados e dos campos fora do esquema
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'))
+
+
+class TextColumn:
+    """Strings (ou None) de uma coluna em um único buffer de bytes UTF-8"""
+
+    __slots__ = ('data', 'offsets', 'null')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.null = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.null)
+
+    def append(self, values):
+        encoded = [b'' if value is None else value.encode('utf-8') for value in values]
+        if not isinstance(self.data, bytearray):
+            # Buffer somente leitura (ex.: mapeado de um arquivo Arrow): copia antes de crescer
+            self.data = bytearray(self.data)
+        self.data += b''.join(encoded)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        self.null = np.concatenate([self.null, np.fromiter((value is None for value in values), dtype=bool,
+                                                           count=len(values))])
+
+    def get_bytes(self, i):
+        return None if self.null[i] else bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def get(self, i):
+        value = self.get_bytes(i)
+        return None if value is None else value.decode('utf-8')
+
+    def get_json(self, i):
+        value = self.get_bytes(i)
+        return None if value is None else json.loads(value)
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.nbytes + self.null.nbytes
+
+    def take(self, rows):
+        column = TextColumn()
+        column.append([self.get(i) for i in rows])
+        return column
+
+
+class ListingStore(Sequence):
+    """Anúncios em colunas: arrays tipados, categorias codificadas e textos em buffers
+
+    Cada anúncio é acessado pelo índice da linha; store[i] devolve uma ListingView, que
+    se comporta como o dicionário original (somente leitura) sem copiar os dados. Os
+    anúncios devem já ter price_value e km (normalize.prepare_frame). Campos fora do
+    esquema são guardados como JSON e também aparecem na visão.
+    """
+
+    def __init__(self):
+        self.categories = {field: [] for field in CATEGORICAL_FIELDS}
+        self._codes = {field: {} for field in CATEGORICAL_FIELDS}
+        self.categorical = {field: np.empty(0, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self.numeric = {field: np.empty(0, dtype=dtype) for field, dtype in NUMERIC_FIELDS.items()}
+        self.text = {field: TextColumn() for field in TEXT_FIELDS + LAZY_FIELDS}
+        self.extra = TextColumn()
+
+    @classmethod
+    def from_listings(cls, listings):
+        store = cls()
+        iterator = iter(listings)
+        while chunk := list(islice(iterator, APPEND_CHUNK)):
+            store.append(chunk)
+        return store
+
+    @classmethod
+    def from_frame(cls, frame):
+        store = cls()
+        store.append_frame(frame)
+        return store
+
+    def __len__(self):
+        return len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ListingView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('índice de anúncio fora do intervalo')
+        return ListingView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ListingView(self, i)
+
+    def append(self, listings):
+        """Anexa anúncios (dicionários) ao final do armazenamento"""
+        listings = list(listings)
+        for field in CATEGORICAL_FIELDS:
+            codes = self._codes[field]
+            categories = self.categories[field]
+            new = []
+            for m in listings:
+                value = m.get(field)
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(categories)
+                    categories.append(value)
+                new.append(code)
+            self.categorical[field] = np.concatenate([self.categorical[field], np.asarray(new, dtype=np.int32)])
+        for field, dtype in NUMERIC_FIELDS.items():
+            values = np.asarray([m.get(field) or 0 for m in listings], dtype=dtype)
+            self.numeric[field] = np.concatenate([self.numeric[field], values])
+        for field in TEXT_FIELDS:
+            self.text[field].append([None if m.get(field) is None else str(m.get(field)) for m in listings])
+        for field in LAZY_FIELDS:
+            self.text[field].append([None if m.get(field) is None else _dumps(m[field])
+                                     for m in listings])
+        self.extra.append([self._extra_json(m) for m in listings])
+
+    def append_frame(self, frame):
+        """Anexa os anúncios de um DataFrame (normalize.prepare_frame) coluna a coluna
+
+        Mesmo resultado de append com os mesmos anúncios: as categorias novas recebem
+        códigos na ordem em que aparecem, com None como uma categoria.
+        """
+        n = len(frame)
+        if not n:
+            return
+        missing = pd.Series([None] * n, index=frame.index, dtype=object)
+        column = lambda field: frame[field] if field in frame else missing
+        for field in CATEGORICAL_FIELDS:
+            values = column(field).to_numpy(dtype=object).copy()
+            values[pd.isna(values)] = _MISSING
+            new_codes, uniques = pd.factorize(values)
+            codes = self._codes[field]
+            categories = self.categories[field]
+            mapping = np.empty(len(uniques), dtype=np.int32)
+            for k, value in enumerate(uniques):
+                value = None if value is _MISSING else value
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(categories)
+                    categories.append(value)
+                mapping[k] = code
+            self.categorical[field] = np.concatenate([self.categorical[field], mapping[new_codes]])
+        for field, dtype in NUMERIC_FIELDS.items():
+            values = column(field).fillna(0).to_numpy(dtype=dtype) if field in frame else np.zeros(n, dtype=dtype)
+            self.numeric[field] = np.concatenate([self.numeric[field], values])
+        for field in TEXT_FIELDS:
+            self.text[field].append([None if value is None else str(value) for value in column(field).tolist()])
+        for field in LAZY_FIELDS:
+            self.text[field].append([None if value is None else _dumps(value)
+                                     for value in column(field).tolist()])
+        extra = [field for field in frame.columns if field not in FIELDS]
+        if extra:
+            self.extra.append([self._extra_json(m) for m in frame[extra].to_dict('records')])
+        else:
+            self.extra.append([None] * n)
+
+    @staticmethod
+    def _extra_json(m):
+        extra = {key: value for key, value in m.items() if key not in FIELDS}
+        return _dumps(extra) if extra else None
+
+    def take(self, rows):
+        """Novo armazenamento apenas com as linhas rows, na ordem dada"""
+        rows = np.asarray(rows, dtype=np.int64)
+        store = ListingStore()
+        store.categories = {field: list(values) for field, values in self.categories.items()}
+        store._codes = {field: dict(codes) for field, codes in self._codes.items()}
+        store.categorical = {field: codes[rows] for field, codes in self.categorical.items()}
+        store.numeric = {field: values[rows] for field, values in self.numeric.items()}
+        store.text = {field: column.take(rows.tolist()) for field, column in self.text.items()}
+        store.extra = self.extra.take(rows.tolist())
+        return store
+
+    def get(self, i, field):
+        """Valor de um campo da linha i (KeyError se o campo não existir)"""
+        field = ALIASES.get(field, field)
+        if field in self.categorical:
+            return self.categories[field][self.categorical[field][i]]
+        if field in self.numeric:
+            return self.numeric[field][i].item()
+        if field in LAZY_FIELDS:
+            return self.text[field].get_json(i)
+        if field in self.text:
+            return self.text[field].get(i)
+        extra = self._extra(i)
+        if field in extra:
+            return extra[field]
+        raise KeyError(field)
+
+    def _extra(self, i):
+        value = self.extra.get_bytes(i)
+        return {} if value is None else json.loads(value)
+
+    def keys(self, i):
+        return FIELDS + tuple(self._extra(i))
+
+    def column(self, field):
+        """Todos os valores de um campo, em ordem (mais rápido que ler linha a linha)"""
+        if field in self.categorical:
+            categories = self.categories[field]
+            return [categories[code] for code in self.categorical[field].tolist()]
+        if field in self.numeric:
+            return self.numeric[field].tolist()
+        return [self.get(i, field) for i in range(len(self))]
+
+    def to_dict(self, i):
+        return {key: self.get(i, key) for key in self.keys(i)}
+
+    def nbytes(self):
+        """Bytes ocupados pelos arrays e buffers (sem as listas de categorias)"""
+        total = sum(a.nbytes for a in self.categorical.values()) + sum(a.nbytes for a in self.numeric.values())
+        for column in list(self.text.values()) + [self.extra]:
+            total += column.nbytes()
+        return total
+
+
+class ListingView(Mapping):
+    """Visão somente leitura de uma linha do ListingStore, com a interface de um dicionário"""
+
+    __slots__ = ('_store', 'row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self.row = row
+
+    def __getitem__(self, key):
+        return self._store.get(self.row, key)
+
+    def __iter__(self):
+        return iter(self._store.keys(self.row))
+
+    def __len__(self):
+        return len(self._store.keys(self.row))
+
+    def to_dict(self):
+        return self._store.to_dict(self.row)
+
+    def __repr__(self):
+        return f'ListingView({self.to_dict()!r})'
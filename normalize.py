@@ -0,0 +1,185 @@
+"""Limpeza dos anúncios do spider, usada pelo initial_populate e pelo GrafoOlx (carga e atualizações)
+
+FeedNormalizer.clean aplica as regras anúncio a anúncio: descarta financiados, anúncios
+sem listId, de preço inválido e listIds repetidos, normaliza listId, quilometragem e ano
+para strings de dígitos e registra cada descarte com o motivo. prepare_frame monta o
+DataFrame dos anúncios limpos, com preço e quilometragem numéricos, para o
+ListingStore.append_frame.
+
+Preço, quilometragem e cilindrada são convertidos em colunas com o pyarrow.compute
+(parse_prices, parse_kms e parse_cilindrada): cada lista de valores vira uma coluna de
+strings Arrow e as substituições, a validação por expressão regular e a conversão
+numérica rodam em C++. As operações .str do pandas 1.5 sobre as mesmas strings custaram
+mais que o laço anúncio a anúncio. Valores fora do formato do site passam por
+parse_price/parse_km, então o resultado é o mesmo das funções escalares; sem o pyarrow
+todos os valores passam por elas.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+from ingest import normalize_listing_id
+from listing_arrow import pa
+
+try:
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow é opcional; sem ele os campos são convertidos anúncio a anúncio
+    pc = None
+
+# Anúncios brutos por bloco normalizado
+NORMALIZE_CHUNK_ROWS = 100000
+
+# Preço no formato do site depois de tirar 'R$ ' e os separadores de milhar ('62000' ou '62000.50')
+PRICE_NUMBER = r'^[0-9]+(\.[0-9]+)?$'
+
+# Motivos de descarte, na ordem em que são verificados
+REJECT_FINANCED = 'financiado'
+REJECT_MISSING_ID = 'sem listId'
+REJECT_PRICE = 'preço inválido'
+REJECT_DUPLICATE = 'listId repetido'
+REJECTED_COLUMNS = ('row', 'listId', 'reason')
+
+
+def _arrow_strings(values):
+    # Coluna de strings Arrow (None como nulo); None sem o pyarrow ou se houver valores que não são strings
+    if pc is None:
+        return None
+    try:
+        return pa.array(values, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def parse_price(value):
+    """Preço de um anúncio ('R$ 62.000') em float, 0.0 quando ausente e None quando não é um número"""
+    if not value or not isinstance(value, str):
+        return 0.0
+    try:
+        price = float(value.replace('R$ ', '').replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+    return price if math.isfinite(price) else None
+
+
+def parse_km(value):
+    """Quilometragem de um anúncio em inteiro, 0 quando não é uma string de dígitos"""
+    if value and isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return 0
+
+
+def _price_or_nan(value):
+    price = parse_price(value)
+    return np.nan if price is None else price
+
+
+def parse_prices(values):
+    """Preços em float64 como parse_price em cada valor, com NaN no lugar de None"""
+    values = list(values)
+    strings = _arrow_strings(values)
+    if strings is None:
+        return np.array([_price_or_nan(value) for value in values], dtype=np.float64)
+    number = pc.replace_substring(pc.replace_substring(pc.replace_substring(strings, 'R$ ', ''), '.', ''), ',', '.')
+    valid = pc.fill_null(pc.match_substring_regex(number, PRICE_NUMBER), False)
+    prices = pc.cast(pc.if_else(valid, number, '0'), pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+    # Ausentes (None ou '') e textos fora do formato, que float ainda pode aceitar
+    for i in np.flatnonzero(~valid.to_numpy(zero_copy_only=False)).tolist():
+        prices[i] = _price_or_nan(values[i])
+    prices[np.isinf(prices)] = np.nan
+    return prices
+
+
+def parse_kms(values):
+    """Quilometragens em int64 como parse_km em cada valor"""
+    values = list(values)
+    strings = _arrow_strings(values)
+    if strings is None:
+        return np.array([parse_km(value) for value in values], dtype=np.int64)
+    digits = pc.fill_null(pc.match_substring_regex(strings, r'^[0-9]+$'), False)
+    return pc.cast(pc.if_else(digits, strings, '0'), pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def parse_cilindrada(values):
+    """Dígitos da cilindrada em inteiros ('Acima de 1.000' -> 1000), -1 quando não há dígitos"""
+    # None também vira texto ('None', sem dígitos), como em str(value)
+    values = [str(value) for value in values]
+    if pc is None:
+        digits = [re.sub(r'[^0-9]+', '', value) for value in values]
+        return np.array([int(value) if value else -1 for value in digits], dtype=np.int64)
+    digits = pc.replace_substring_regex(pa.array(values, pa.string()), r'[^0-9]+', '')
+    return pc.cast(pc.if_else(pc.equal(digits, ''), '-1', digits), pa.int64()).to_numpy(zero_copy_only=False)
+
+
+class FeedNormalizer:
+    """Limpeza do feed do spider por blocos, guardando os ids aceitos e os anúncios descartados
+
+    clean recebe um bloco (lista) de anúncios brutos e devolve só os aceitos, na ordem
+    do feed, como dicionários no formato de motos_data.json (os mesmos objetos,
+    alterados). Descarta os financiados, os sem listId, os de preço inválido e os listIds
+    já aceitos, inclusive em blocos anteriores. rejected() traz as linhas descartadas de
+    todos os blocos: posição no feed, listId e motivo.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.rows = 0
+        self._rejected = []
+
+    def clean(self, records):
+        cleaned = []
+        rejected = self._rejected
+        seen = self.seen
+        # Preços do bloco validados de uma vez, em coluna
+        invalid_prices = np.isnan(parse_prices([m.get('price') for m in records])).tolist()
+        for row, m, invalid_price in zip(range(self.rows, self.rows + len(records)), records, invalid_prices):
+            listing_id = normalize_listing_id(m.get('listId'))
+            if m.get('status_financeiro') == 'Financiado':
+                rejected.append((row, listing_id, REJECT_FINANCED))
+            elif not listing_id:
+                rejected.append((row, listing_id, REJECT_MISSING_ID))
+            elif invalid_price:
+                rejected.append((row, listing_id, REJECT_PRICE))
+            elif listing_id in seen:
+                rejected.append((row, listing_id, REJECT_DUPLICATE))
+            else:
+                seen.add(listing_id)
+                m['listId'] = listing_id
+                m['quilometragem'] = normalize_listing_id(m.get('quilometragem'))
+                m['ano'] = normalize_listing_id(m.get('ano'))
+                cleaned.append(m)
+        self.rows += len(records)
+        return cleaned
+
+    def rejected(self):
+        """Anúncios descartados até aqui (colunas row, listId e reason)"""
+        return pd.DataFrame(self._rejected, columns=REJECTED_COLUMNS)
+
+    def rejected_counts(self):
+        """{motivo: quantidade} dos anúncios descartados"""
+        return self.rejected()['reason'].value_counts().to_dict()
+
+
+def prepare_frame(records):
+    """Anúncios limpos (FeedNormalizer.clean) em um DataFrame, com price_value, km e 'images'
+
+    Os campos são mantidos como objetos Python, no formato do ListingStore.append_frame.
+    """
+    # O spider grava sempre as mesmas chaves; dando as colunas o pandas não precisa uni-las
+    columns = dict.fromkeys(records[0]) if records else {}
+    uniform = all(m.keys() == columns.keys() for m in records)
+    if not uniform:
+        columns = dict.fromkeys(key for m in records for key in m)
+    frame = pd.DataFrame(records, columns=list(columns), dtype=object)
+    if not uniform:
+        # Chaves ausentes em parte dos anúncios viram NaN; o restante do código espera None
+        frame = frame.replace({np.nan: None})
+    prices = frame['price'].tolist() if 'price' in frame else [None] * len(frame)
+    km = frame['quilometragem'].tolist() if 'quilometragem' in frame else [None] * len(frame)
+    frame['price_value'] = parse_prices(prices)
+    frame['km'] = parse_kms(km)
+    # Mapeia 'imagens' para 'images' para manter as keys em inglês
+    if 'imagens' in frame and 'images' not in frame:
+        frame['images'] = frame['imagens']
+    return frame
@@ -0,0 +1,190 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Padrões do cache de /visualize: 64 MB de imagens, válidas por uma hora
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RENDER_CACHE_TTL = 3600
+
+
+class _Entry:
+    __slots__ = ('path', 'size', 'created')
+
+    def __init__(self, path, size, created):
+        self.path = path
+        self.size = size
+        self.created = created
+
+
+class _Flight:
+    # Renderização em andamento de uma chave; as requisições concorrentes esperam por ela
+    __slots__ = ('done', 'data', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+
+
+class RenderCache:
+    """Cache em disco de imagens renderizadas, limitado em bytes (LRU) e em idade (TTL)
+
+    Cada chave é renderizada uma única vez mesmo com requisições simultâneas: a primeira
+    renderiza e as demais aguardam o mesmo resultado. Os arquivos são gravados em um
+    temporário e renomeados, então um leitor nunca vê uma imagem pela metade. Imagens já
+    presentes no diretório (de execuções anteriores) são reaproveitadas até expirarem.
+    """
+
+    def __init__(self, directory, max_bytes=RENDER_CACHE_MAX_BYTES, ttl=RENDER_CACHE_TTL, suffix='.png',
+                 clock=time.time):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.renders = 0
+        self.evictions = 0
+        self.expirations = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.tmp'):
+                # Gravação interrompida de uma execução anterior
+                os.remove(path)
+            elif name.endswith(self.suffix):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(self.suffix)], path, stat.st_size))
+        with self._lock:
+            # Do mais antigo para o mais recente, como se tivessem sido usados nessa ordem
+            for created, key, path, size in sorted(files):
+                self._entries[key] = _Entry(path, size, created)
+                self.total_bytes += size
+            self._cleanup()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}{self.suffix}')
+
+    def get_or_render(self, key, render):
+        """Bytes da imagem da chave, renderizando com render() apenas se não estiver em cache"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._clock() - entry.created >= self.ttl:
+                    self._remove(key)
+                    self.expirations += 1
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    path = entry.path
+                else:
+                    flight = self._inflight.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self._inflight[key] = _Flight()
+                        self.misses += 1
+                    else:
+                        self.coalesced += 1
+            if entry is None:
+                break
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                # Arquivo apagado por fora do cache: esquece a entrada e renderiza de novo
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        self._remove(key)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.data
+
+        try:
+            data = render()
+            self._store(key, data)
+            flight.data = data
+            return data
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _store(self, key, data):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.renders += 1
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key).size
+            self._entries[key] = _Entry(path, len(data), self._clock())
+            self.total_bytes += len(data)
+            self._cleanup()
+
+    def _cleanup(self):
+        # Remove as entradas expiradas e, acima do limite de bytes, as usadas há mais tempo
+        now = self._clock()
+        for key in [key for key, entry in self._entries.items() if now - entry.created >= self.ttl]:
+            self._remove(key)
+            self.expirations += 1
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self):
+        """Remove as imagens expiradas (também feito a cada nova renderização)"""
+        with self._lock:
+            self._cleanup()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'renders': self.renders,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
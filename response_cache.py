@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele as respostas vão apenas em gzip
+    brotli = None
+
+
+class CachedResponse:
+    """Corpo JSON já comprimido, com o ETag calculado sobre o conteúdo descomprimido"""
+
+    __slots__ = ('etag', 'gzip_body', 'brotli_body', 'size')
+
+    def __init__(self, body):
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.brotli_body = brotli.compress(body, quality=5) if brotli else None
+        self.size = len(body)
+
+    def body(self, encoding):
+        """Corpo na codificação pedida ('br', 'gzip' ou None para o JSON sem compressão)"""
+        if encoding == 'br':
+            return self.brotli_body
+        if encoding == 'gzip':
+            return self.gzip_body
+        return gzip.decompress(self.gzip_body)
+
+
+class ResponseCache:
+    """Cache em memória de respostas comprimidas, com no máximo max_entries entradas (LRU)
+
+    Cada chave guarda a resposta da última versão do grafo para a qual foi gerada. Em
+    get_or_build com revalidate, uma resposta de versão anterior é servida enquanto a
+    nova é gerada em segundo plano (stale-while-revalidate); sem revalidate ela é
+    gerada na hora.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, version, build, revalidate=None):
+        """Retorna a resposta em cache para key ou a cria com build() (bytes JSON)
+
+        revalidate(nome, função) agenda uma função fora da requisição (ex.: JobScheduler.submit).
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+            stale = cached is not None and revalidate is not None
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+
+        if stale:
+            revalidate(f'response:{key!r}', lambda: self._build(key, version, build))
+            return cached[1]
+
+        # A serialização é feita fora do lock para não bloquear outras chaves
+        return self._build(key, version, build)
+
+    def _build(self, key, version, build):
+        entry = CachedResponse(build())
+        with self._lock:
+            cached = self._entries.get(key)
+            # Não substitui uma resposta de versão mais nova gerada enquanto esta era criada
+            if cached is None or cached[0] <= version:
+                self._entries[key] = (version, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(len(entry.gzip_body) for _, entry in self._entries.values()),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,90 @@
+import os
+import pickle
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Palavras vazias do português, sem acentos pois os documentos são normalizados antes
+# (palavras de uma letra já são descartadas pelo tokenizador)
+PORTUGUESE_STOP_WORDS = frozenset('''
+ao aos as ate com como da das de dela delas dele deles depois do dos ela elas ele eles
+em entre era eram essa essas esse esses esta estao estas este estes eu foi foram ha isso
+isto ja la lhe lhes mais mas me mesmo meu meus minha minhas muito na nao nas nem no nos
+nossa nossas nosso nossos num numa os ou para pela pelas pelo pelos por qual quando que
+quem se sem ser seu seus so sua suas tambem te tem tinha tu tua tuas um uma umas uns voce
+voces vos
+'''.split())
+
+
+def listing_document(m):
+    """Texto indexado de um anúncio"""
+    return f"{m['title']} {m['marca']} {m['modelo']} {m['cilindrada']} {m['ano']}"
+
+
+class SearchIndex:
+    """Índice TF-IDF dos anúncios, ajustado uma vez e consultado por produto esparso
+
+    A matriz é mantida em CSC (colunas = termos), funcionando como um índice invertido:
+    uma consulta lê apenas as colunas dos seus termos. Anúncios adicionados depois do
+    ajuste usam o vocabulário e os pesos IDF existentes; termos novos só passam a ser
+    indexados no próximo fit.
+    """
+
+    def __init__(self):
+        self.vectorizer = TfidfVectorizer(strip_accents='unicode', lowercase=True,
+                                          stop_words=sorted(PORTUGUESE_STOP_WORDS))
+        self.matrix = None
+
+    def __len__(self):
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def fit(self, listings):
+        """Ajusta o vocabulário e indexa os anúncios (linha i = anúncio i)"""
+        self.matrix = self.vectorizer.fit_transform([listing_document(m) for m in listings]).tocsc()
+        return self
+
+    def add(self, listings):
+        """Anexa anúncios ao índice sem reajustar o vocabulário"""
+        rows = self.vectorizer.transform([listing_document(m) for m in listings])
+        self.matrix = sp.vstack([self.matrix, rows], format='csc')
+
+    def take(self, rows):
+        """Novo índice apenas com as linhas informadas (ex.: após remover anúncios), com o mesmo vocabulário"""
+        index = SearchIndex()
+        index.vectorizer = self.vectorizer
+        index.matrix = self.matrix.tocsr()[rows].tocsc()
+        return index
+
+    def search(self, query_text, top_n=10):
+        """Retorna [(linha, similaridade)] dos top_n anúncios com similaridade positiva"""
+        if not len(self):
+            return []
+        # As linhas TF-IDF já são normalizadas, então o produto escalar é a similaridade do cosseno
+        query_vector = self.vectorizer.transform([query_text])
+        scores = np.asarray(self.matrix[:, query_vector.indices] @ query_vector.data).ravel()
+        candidates = np.flatnonzero(scores > 0)
+        if top_n < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], top_n)[:top_n]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(i), float(scores[i])) for i in candidates]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'search_vectorizer.pkl'), 'wb') as f:
+            pickle.dump(self.vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        sp.save_npz(os.path.join(path, 'search_matrix.npz'), self.matrix)
+
+    @classmethod
+    def load(cls, path):
+        """Carrega um índice salvo com save; retorna None se não existir"""
+        try:
+            with open(os.path.join(path, 'search_vectorizer.pkl'), 'rb') as f:
+                vectorizer = pickle.load(f)
+            matrix = sp.load_npz(os.path.join(path, 'search_matrix.npz')).tocsc()
+        except FileNotFoundError:
+            return None
+        index = cls()
+        index.vectorizer = vectorizer
+        index.matrix = matrix
+        return index
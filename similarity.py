@@ -0,0 +1,398 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from normalize import parse_cilindrada
+
+# Limiar mínimo de similaridade para que dois anúncios sejam ligados por uma aresta
+SIMILARITY_THRESHOLD = 0.7
+
+# Número máximo de pares avaliados de uma só vez (limita a memória dos blocos)
+TILE_SIZE = 1 << 20
+
+# Faixas de preço: dois preços com diferença relativa <= 0.3 (min/max >= 0.7) caem na mesma
+# faixa logarítmica ou em faixas vizinhas. A folga evita erros de arredondamento no limite.
+PRICE_BAND_WIDTH = np.log(1 / 0.7) * (1 + 1e-6)
+
+
+# Colunas usadas por score_pairs (compartilhadas com os processos do build paralelo)
+COLUMN_NAMES = ('marca', 'modelo', 'estado', 'cilindrada', 'cil_value', 'price_value', 'ano')
+
+
+class ListingColumns:
+    """Anúncios codificados em colunas NumPy para o cálculo vetorizado de similaridade"""
+
+    def __init__(self):
+        # Dicionários de codificação {valor: código}, mantidos para permitir anexar novos anúncios
+        self.encoders = {'marca': {}, 'modelo': {}, 'estado': {}, 'cilindrada': {}}
+        self.marca = np.empty(0, dtype=np.int32)
+        self.modelo = np.empty(0, dtype=np.int32)
+        self.estado = np.empty(0, dtype=np.int32)
+        self.cilindrada = np.empty(0, dtype=np.int32)
+        # Cilindrada numérica (-1 quando não há dígitos)
+        self.cil_value = np.empty(0, dtype=np.int64)
+        self.price_value = np.empty(0, dtype=np.float64)
+        # Ano numérico (-1 quando ausente ou inválido)
+        self.ano = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.price_value)
+
+    def append(self, listings):
+        """Codifica e anexa anúncios ao final das colunas"""
+        new = {name: [] for name in COLUMN_NAMES}
+        for m in listings:
+            for field in self.encoders:
+                codes = self.encoders[field]
+                # Igualdade dos códigos equivale à igualdade (==) dos valores originais, inclusive None
+                new[field].append(codes.setdefault(m[field], len(codes)))
+            new['price_value'].append(m['price_value'])
+            new['cil_value'].append(m['cilindrada'])
+            new['ano'].append(parse_ano(m['ano']))
+        new['cil_value'] = parse_cilindrada(new['cil_value'])
+
+        for name, values in new.items():
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.asarray(values, dtype=column.dtype)]))
+
+    def take(self, rows):
+        """Colunas apenas com os anúncios de índices rows (mesmos códigos de categoria)"""
+        columns = ListingColumns()
+        # Cópia dos codificadores: append nas colunas novas não altera as originais
+        columns.encoders = {field: dict(codes) for field, codes in self.encoders.items()}
+        for name in COLUMN_NAMES:
+            setattr(columns, name, getattr(self, name)[rows])
+        return columns
+
+
+def parse_ano(value):
+    if value and isinstance(value, str) and value.isdigit():
+        try:
+            return int(value)
+        except ValueError:
+            return -1
+    return -1
+
+
+def encode_listings(listings):
+    """Codifica uma lista de anúncios em colunas"""
+    columns = ListingColumns()
+    columns.append(listings)
+    return columns
+
+
+def score_pairs(columns, i, j):
+    """Versão vetorizada de GrafoOlx.calculate_similarity para os pares (i, j)
+
+    i e j são arrays de índices com formatos compatíveis para broadcasting. As parcelas
+    são somadas na mesma ordem da versão escalar para que os pesos sejam idênticos.
+    """
+    same_marca = columns.marca[i] == columns.marca[j]
+    same_modelo = columns.modelo[i] == columns.modelo[j]
+    same_cil = columns.cilindrada[i] == columns.cilindrada[j]
+    same_estado = columns.estado[i] == columns.estado[j]
+    shape = np.broadcast(same_marca, same_modelo).shape
+
+    similarity = np.zeros(shape, dtype=np.float64)
+    similarity += np.where(same_marca, 0.1, 0.0)
+    similarity += np.where(same_modelo, 0.3, 0.0)
+
+    # Cilindradas diferentes mas ambas numéricas sempre somam 0.3 na versão escalar
+    cil_parsed = (columns.cil_value[i] >= 0) & (columns.cil_value[j] >= 0)
+    similarity += np.where(same_cil, 0.4, np.where(cil_parsed, 0.3, 0.0))
+
+    similarity += np.where(same_estado, 0.2, -0.1)
+
+    # Similaridade de preço
+    p1 = columns.price_value[i]
+    p2 = columns.price_value[j]
+    has_price = (p1 > 0) & (p2 > 0)
+    max_price = np.maximum(p1, p2)
+    ratio = np.abs(p1 - p2) / np.where(has_price, max_price, 1.0)
+    price_term = np.where(ratio > 0.7, -0.5,
+                 np.where(ratio > 0.5, -0.3,
+                 np.where(ratio > 0.3, -0.2, 0.1 * (1 - np.minimum(ratio, 1)))))
+    similarity += np.where(has_price, price_term, 0.0)
+
+    # Similaridade de ano (diferenças acima de 3 anos somam zero na versão escalar)
+    a1 = columns.ano[i]
+    a2 = columns.ano[j]
+    year_diff = np.abs(a1 - a2)
+    has_year = (a1 >= 0) & (a2 >= 0) & (year_diff <= 3)
+    similarity += np.where(has_year, 0.1 * (1 - np.minimum(year_diff / 3, 1)), 0.0)
+    return similarity
+
+
+def _sorted_edges(sources, targets, weights):
+    # Ordena as arestas por (origem, destino) para reproduzir a ordem do laço escalar
+    if not sources:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    weights = np.concatenate(weights)
+    order = np.lexsort((targets, sources))
+    return sources[order], targets[order], weights[order]
+
+
+def iter_tiles(n, tile_size=TILE_SIZE):
+    """Divide o triângulo superior da matriz de pares em blocos (linhas, colunas)"""
+    rows = max(1, min(n, int(np.sqrt(tile_size))))
+    for r0 in range(0, n, rows):
+        r1 = min(n, r0 + rows)
+        cols = max(rows, tile_size // (r1 - r0))
+        for c0 in range(r0 + 1, n, cols):
+            yield r0, r1, c0, min(n, c0 + cols)
+
+
+def score_tile(columns, r0, r1, c0, c1, threshold=SIMILARITY_THRESHOLD):
+    """Calcula as arestas de um bloco de pares com j > i"""
+    i = np.arange(r0, r1)[:, None]
+    j = np.arange(c0, c1)[None, :]
+    similarity = score_pairs(columns, i, j)
+    ii, jj = np.nonzero((similarity > threshold) & (j > i))
+    return ii + r0, jj + c0, similarity[ii, jj]
+
+
+def blocking_supported(threshold):
+    """Verifica se os pares descartados pela indexação nunca alcançam o limiar
+
+    Cada limite é a maior similaridade possível (em score_pairs) de um par fora dos blocos:
+    marca 0.1, modelo 0.3, cilindrada 0.4 (ou 0.3 se ambas numéricas), estado 0.2 (ou -0.1),
+    preço 0.1 (ou no máximo -0.2 se a diferença relativa passa de 0.3) e ano 0.1.
+    """
+    bounds = [
+        # Modelos e estados diferentes
+        0.1 + 0.4 - 0.1 + 0.1 + 0.1,
+        # Modelos diferentes e preços distantes
+        0.1 + 0.4 + 0.2 - 0.2 + 0.1,
+        # Mesmo modelo, estados diferentes e preços distantes
+        0.1 + 0.3 + 0.4 - 0.1 - 0.2 + 0.1,
+        # Modelos diferentes e cilindradas sem pontuação (uma numérica e outra não)
+        0.1 + 0.2 + 0.1 + 0.1,
+    ]
+    return max(bounds) < threshold - 1e-9
+
+
+def _groups(*keys):
+    # Agrupa índices por chaves: {(k1, k2, ...): array de índices em ordem crescente}
+    if len(keys[0]) == 0:
+        return {}
+    order = np.lexsort(keys[::-1])
+    sorted_keys = np.stack([k[order] for k in keys])
+    starts = np.flatnonzero(np.any(sorted_keys[:, 1:] != sorted_keys[:, :-1], axis=0)) + 1
+    bounds = np.concatenate([[0], starts, [len(order)]])
+    return {tuple(sorted_keys[:, a].tolist()): np.sort(order[a:b]) for a, b in zip(bounds[:-1], bounds[1:])}
+
+
+def _pairs_within(idx, tile_size):
+    # Todos os pares i < j dentro de um grupo, em blocos
+    n = len(idx)
+    rows = max(1, tile_size // max(n, 1))
+    for r0 in range(0, n - 1, rows):
+        r1 = min(n - 1, r0 + rows)
+        local_i, local_j = np.nonzero(np.arange(r0, r1)[:, None] < np.arange(n)[None, :])
+        yield idx[local_i + r0], idx[local_j]
+
+
+def _pairs_between(a, b, tile_size):
+    # Todos os pares entre dois grupos disjuntos, orientados com i < j
+    if len(a) == 0 or len(b) == 0:
+        return
+    rows = max(1, tile_size // len(b))
+    for r0 in range(0, len(a), rows):
+        i = np.repeat(a[r0:r0 + rows], len(b))
+        j = np.tile(b, len(a[r0:r0 + rows]))
+        yield np.minimum(i, j), np.maximum(i, j)
+
+
+def _price_compatible_pairs(idx, band, tile_size):
+    # Pares de um grupo cujos preços podem somar pontuação positiva: faixas iguais ou
+    # vizinhas, ou algum preço ausente (sem parcela de preço)
+    zero = idx[band[idx] < 0]
+    priced = idx[band[idx] >= 0]
+    yield from _pairs_within(zero, tile_size)
+    yield from _pairs_between(zero, priced, tile_size)
+    by_band = _groups(band[priced])
+    for (b,), members in by_band.items():
+        yield from _pairs_within(priced[members], tile_size)
+        if (b + 1,) in by_band:
+            yield from _pairs_between(priced[members], priced[by_band[(b + 1,)]], tile_size)
+
+
+def price_bands(columns):
+    """Faixa logarítmica de preço de cada anúncio (-1 quando não há preço)"""
+    prices = columns.price_value
+    bands = np.full(len(prices), -1, dtype=np.int64)
+    positive = prices > 0
+    bands[positive] = np.floor(np.log(prices[positive]) / PRICE_BAND_WIDTH).astype(np.int64)
+    return bands
+
+
+def candidate_pairs(columns, tile_size=TILE_SIZE, shard=0, shards=1):
+    """Gera apenas os pares que podem superar o limiar (ver blocking_supported)
+
+    Os conjuntos gerados são disjuntos:
+    - mesmo modelo e mesmo estado: todos os pares;
+    - mesmo modelo e estados diferentes: apenas preços compatíveis;
+    - modelos diferentes e mesmo estado: apenas preços e cilindradas compatíveis.
+
+    Com shards > 1 apenas os grupos de número shard (módulo shards) são percorridos.
+    """
+    band = price_bands(columns)
+    # Cilindradas numéricas sempre pontuam entre si; as demais só quando iguais
+    cil_class = np.where(columns.cil_value >= 0, -1, columns.cilindrada)
+
+    groups = [(members, None) for members in _groups(columns.modelo, columns.estado).values()]
+    groups += [(members, columns.estado) for members in _groups(columns.modelo).values()]
+    groups += [(members, columns.modelo) for members in _groups(columns.estado, cil_class).values()]
+
+    for members, must_differ in groups[shard::shards]:
+        if must_differ is None:
+            yield from _pairs_within(members, tile_size)
+            continue
+        for i, j in _price_compatible_pairs(members, band, tile_size):
+            keep = must_differ[i] != must_differ[j]
+            yield i[keep], j[keep]
+
+
+def _score_edges(columns, threshold, tile_size, blocking, shard=0, shards=1):
+    # Avalia a fração shard/shards dos pares e retorna as arestas acima do limiar
+    sources, targets, weights = [], [], []
+    if blocking:
+        for i, j in candidate_pairs(columns, tile_size, shard, shards):
+            similarity = score_pairs(columns, i, j)
+            keep = similarity > threshold
+            sources.append(i[keep])
+            targets.append(j[keep])
+            weights.append(similarity[keep])
+    else:
+        for r0, r1, c0, c1 in list(iter_tiles(len(columns), tile_size))[shard::shards]:
+            s, t, w = score_tile(columns, r0, r1, c0, c1, threshold)
+            sources.append(s)
+            targets.append(t)
+            weights.append(w)
+    return sources, targets, weights
+
+
+def _share_columns(columns):
+    # Copia as colunas para um único segmento de memória compartilhada
+    arrays = [getattr(columns, name) for name in COLUMN_NAMES]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(a.nbytes for a in arrays)))
+    layout = []
+    offset = 0
+    for name, array in zip(COLUMN_NAMES, arrays):
+        np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=offset)[:] = array
+        layout.append((name, array.dtype.str, offset, len(array)))
+        offset += array.nbytes
+    return shm, layout
+
+
+# Estado de cada processo do build paralelo
+_worker_shm = None
+_worker_columns = None
+
+
+def _attach_columns(name, layout):
+    global _worker_shm, _worker_columns
+    _worker_shm = shared_memory.SharedMemory(name=name)
+    _worker_columns = ListingColumns()
+    for attr, dtype, offset, length in layout:
+        setattr(_worker_columns, attr, np.ndarray((length,), dtype, buffer=_worker_shm.buf, offset=offset))
+
+
+def _score_shard(shard, shards, threshold, tile_size, blocking):
+    sources, targets, weights = _score_edges(_worker_columns, threshold, tile_size, blocking, shard, shards)
+    return _sorted_edges(sources, targets, weights)
+
+
+def build_edges(columns, threshold=SIMILARITY_THRESHOLD, tile_size=TILE_SIZE, blocking=True, workers=1):
+    """Calcula todas as arestas com similaridade acima do limiar
+
+    Com blocking=True (e um limiar compatível) apenas os pares candidatos são avaliados;
+    caso contrário a matriz inteira de pares é percorrida em blocos. Com workers > 1 os
+    pares são divididos em fatias avaliadas por processos que leem as colunas de memória
+    compartilhada. Retorna três arrays (origem, destino, peso) com origem < destino,
+    ordenados como o laço de pares de GrafoOlx.build_graph, independente de workers.
+    """
+    blocking = blocking and blocking_supported(threshold)
+    if workers <= 1 or len(columns) < 2:
+        return _sorted_edges(*_score_edges(columns, threshold, tile_size, blocking))
+
+    # Mais fatias que processos para equilibrar grupos de tamanhos diferentes
+    shards = workers * 4
+    shm, layout = _share_columns(columns)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_columns,
+                                 initargs=(shm.name, layout)) as pool:
+            futures = [pool.submit(_score_shard, shard, shards, threshold, tile_size, blocking)
+                       for shard in range(shards)]
+            parts = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+    return _sorted_edges(*(list(part) for part in zip(*parts)))
+
+
+def _delta_pairs(columns, changed, tile_size):
+    # Pares candidatos (ver candidate_pairs) com ao menos um anúncio em changed
+    band = price_bands(columns)
+    cil_class = np.where(columns.cil_value >= 0, -1, columns.cilindrada)
+    is_changed = np.zeros(len(columns), dtype=bool)
+    is_changed[changed] = True
+
+    groups = [(members, None) for members in _groups(columns.modelo, columns.estado).values()]
+    groups += [(members, columns.estado) for members in _groups(columns.modelo).values()]
+    groups += [(members, columns.modelo) for members in _groups(columns.estado, cil_class).values()]
+
+    for members, must_differ in groups:
+        sources = members[is_changed[members]]
+        if len(sources) == 0:
+            continue
+        rows = max(1, tile_size // len(members))
+        for r0 in range(0, len(sources), rows):
+            i = np.repeat(sources[r0:r0 + rows], len(members))
+            j = np.tile(members, len(sources[r0:r0 + rows]))
+            # Pares entre dois anúncios alterados aparecem nos dois sentidos; mantém um só
+            keep = (i != j) & (~is_changed[j] | (i < j))
+            if must_differ is not None:
+                keep &= must_differ[i] != must_differ[j]
+                keep &= (band[i] < 0) | (band[j] < 0) | (np.abs(band[i] - band[j]) <= 1)
+            i, j = i[keep], j[keep]
+            yield np.minimum(i, j), np.maximum(i, j)
+
+
+def build_edges_for(columns, changed, threshold=SIMILARITY_THRESHOLD, tile_size=TILE_SIZE, blocking=True):
+    """Calcula apenas as arestas que envolvem os anúncios de índices changed
+
+    Usado nas atualizações incrementais: os anúncios novos ou alterados são comparados
+    com todos os demais (e entre si), com a mesma indexação de build_edges. Retorna
+    arrays (origem, destino, peso) com origem < destino, na ordem de build_edges.
+    """
+    changed = np.unique(np.asarray(changed, dtype=np.int64))
+    sources, targets, weights = [], [], []
+    if len(changed) == 0 or len(columns) < 2:
+        return _sorted_edges(sources, targets, weights)
+
+    if blocking and blocking_supported(threshold):
+        pairs = _delta_pairs(columns, changed, tile_size)
+    else:
+        is_changed = np.zeros(len(columns), dtype=bool)
+        is_changed[changed] = True
+        others = np.arange(len(columns))
+        rows = max(1, tile_size // len(columns))
+        pairs = []
+        for r0 in range(0, len(changed), rows):
+            i = changed[r0:r0 + rows, None]
+            keep = (i != others) & (~is_changed[others] | (i < others))
+            ii, jj = np.nonzero(keep)
+            i, j = i[ii, 0], others[jj]
+            pairs.append((np.minimum(i, j), np.maximum(i, j)))
+
+    for i, j in pairs:
+        similarity = score_pairs(columns, i, j)
+        keep = similarity > threshold
+        sources.append(i[keep])
+        targets.append(j[keep])
+        weights.append(similarity[keep])
+    return _sorted_edges(sources, targets, weights)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from search_index import SearchIndex
+
+# Versão do formato; alterar invalida todos os snapshots existentes
+SNAPSHOT_VERSION = 5
+
+
+def snapshot_key(data_file, **params):
+    """Hash do conteúdo do arquivo de dados e dos parâmetros de similaridade"""
+    digest = hashlib.sha256()
+    with open(data_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(json.dumps({'version': SNAPSHOT_VERSION, **params}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def snapshot_path(snapshot_dir, data_file, key):
+    # Um diretório por (arquivo de dados, hash); o prefixo permite remover versões antigas
+    return os.path.join(snapshot_dir, f"{os.path.basename(data_file)}-{key[:16]}")
+
+
+def graph_to_csr(G, node_ids):
+    """Converte as arestas do grafo em arrays CSR simétricos (indptr, indices, weights)"""
+    if hasattr(G, 'csr'):
+        # GrafoCompacto já armazena o CSR na ordem de inserção dos nós
+        return G.csr()
+    index = {node: i for i, node in enumerate(node_ids)}
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    for i, node in enumerate(node_ids):
+        row = sorted((index[neighbor], weight) for neighbor, weight in G.neighbors_with_weights(node))
+        indices.extend(j for j, _ in row)
+        weights.extend(w for _, w in row)
+        indptr[i + 1] = len(indices)
+    return indptr, np.asarray(indices, dtype=np.int32), np.asarray(weights, dtype=np.float64)
+
+
+def write_snapshot(path, listings, G, positions, partition, search_index, top_k_table):
+    """Grava o grafo construído: tabela de nós, arestas CSR, layout, comunidades, top-k e índice de busca
+
+    A gravação é feita em um diretório temporário renomeado ao final, para que um
+    processo concorrente nunca leia um snapshot incompleto.
+    """
+    node_ids = listings.column('listId')
+    indptr, indices, weights = graph_to_csr(G, node_ids)
+
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    os.makedirs(tmp_path, exist_ok=True)
+    with open(os.path.join(tmp_path, 'nodes.pkl'), 'wb') as f:
+        pickle.dump(listings, f, protocol=pickle.HIGHEST_PROTOCOL)
+    np.save(os.path.join(tmp_path, 'indptr.npy'), indptr)
+    np.save(os.path.join(tmp_path, 'indices.npy'), indices)
+    np.save(os.path.join(tmp_path, 'weights.npy'), weights)
+    np.save(os.path.join(tmp_path, 'positions.npy'), np.asarray([positions[node] for node in node_ids], dtype=np.float64).reshape(-1, 2))
+    np.save(os.path.join(tmp_path, 'communities.npy'), np.asarray([partition[node] for node in node_ids], dtype=np.int64))
+    np.save(os.path.join(tmp_path, 'topk_neighbors.npy'), top_k_table.neighbors)
+    np.save(os.path.join(tmp_path, 'topk_weights.npy'), top_k_table.weights)
+    search_index.save(tmp_path)
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': SNAPSHOT_VERSION,
+            'nodes': len(node_ids),
+            'edges': int(len(indices) // 2),
+            'top_k': top_k_table.k,
+            'created': time.time(),
+        }, f)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Outro processo gravou o mesmo snapshot primeiro
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # Remove versões antigas do mesmo arquivo de dados
+    prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+    parent = os.path.dirname(path)
+    for name in os.listdir(parent):
+        if name.startswith(prefix) and os.path.join(parent, name) != path and '.tmp-' not in name:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def load_snapshot(path):
+    """Carrega um snapshot; os arrays são mapeados em memória. Retorna None se não existir"""
+    try:
+        with open(os.path.join(path, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+
+    with open(os.path.join(path, 'nodes.pkl'), 'rb') as f:
+        listings = pickle.load(f)
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+              for name in ('indptr', 'indices', 'weights', 'positions', 'communities',
+                           'topk_neighbors', 'topk_weights')}
+    return {'manifest': manifest, 'listings': listings, 'search_index': SearchIndex.load(path), **arrays}
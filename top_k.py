@@ -0,0 +1,114 @@
+import numpy as np
+
+# Número padrão de vizinhos mais similares guardados por anúncio
+TOP_K = 10
+
+
+class TopKTable:
+    """Tabela fixa com os k vizinhos de maior peso de cada nó
+
+    neighbors[i] guarda os índices dos vizinhos do nó i (-1 nas posições vazias) e
+    weights[i] os pesos, em ordem decrescente de peso; empates seguem a ordem das
+    listas de adjacência, como na ordenação estável de get_similar_listings.
+    """
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.neighbors = np.full((0, k), -1, dtype=np.int32)
+        self.weights = np.zeros((0, k), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    def build(self, indptr, indices, weights):
+        """Calcula a tabela inteira a partir dos arrays CSR simétricos do grafo"""
+        n = len(indptr) - 1
+        self.neighbors = np.full((n, self.k), -1, dtype=np.int32)
+        self.weights = np.zeros((n, self.k), dtype=np.float32)
+        self._fill(np.arange(n), indptr, indices, weights)
+        return self
+
+    @classmethod
+    def from_arrays(cls, neighbors, weights):
+        """Tabela a partir de arrays já calculados (ex.: mapeados de um snapshot)"""
+        table = cls(neighbors.shape[1])
+        table.neighbors, table.weights = neighbors, weights
+        return table
+
+    def update_rows(self, rows, indptr, indices, weights):
+        """Recalcula apenas as linhas informadas (ex.: nós afetados por uma atualização)"""
+        n = len(indptr) - 1
+        if not self.neighbors.flags.writeable:
+            # Arrays mapeados de um snapshot são somente leitura
+            self.neighbors, self.weights = np.array(self.neighbors), np.array(self.weights)
+        if n > len(self):
+            # Novos nós entram no fim da tabela
+            extra = n - len(self)
+            self.neighbors = np.vstack([self.neighbors, np.full((extra, self.k), -1, dtype=np.int32)])
+            self.weights = np.vstack([self.weights, np.zeros((extra, self.k), dtype=np.float32)])
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        self.neighbors[rows] = -1
+        self.weights[rows] = 0
+        self._fill(rows, indptr, indices, weights)
+
+    def take(self, keep):
+        """Nova tabela apenas com as linhas keep (índices crescentes), com os vizinhos renumerados
+
+        Retorna (tabela, linhas novas que perderam algum vizinho e precisam ser recalculadas);
+        esta tabela não é alterada.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        mapping = np.full(len(self) + 1, -1, dtype=np.int64)
+        mapping[keep] = np.arange(len(keep))
+        neighbors = self.neighbors[keep]
+        # O índice -1 (posição vazia) aponta para a última posição de mapping, que vale -1
+        remapped = mapping[neighbors]
+        stale = ((neighbors >= 0) & (remapped < 0)).any(axis=1)
+        table = TopKTable.from_arrays(remapped.astype(np.int32), np.array(self.weights[keep]))
+        return table, np.flatnonzero(stale)
+
+    def rows_changed_by(self, sources, targets, weights):
+        """Linhas já existentes cuja lista top-k pode mudar com as novas arestas
+
+        Vizinhos novos ficam depois dos antigos na ordem de adjacência, então só entram
+        na tabela de uma linha cheia se tiverem peso maior ou igual ao k-ésimo.
+        """
+        rows = np.concatenate([sources, targets])
+        values = np.concatenate([weights, weights])
+        existing = rows < len(self)
+        rows, values = rows[existing], values[existing]
+        full = self.neighbors[rows, -1] >= 0
+        changed = ~full | (values >= self.weights[rows, -1])
+        return np.unique(rows[changed])
+
+    def _fill(self, rows, indptr, indices, weights):
+        # Entradas CSR das linhas pedidas, agrupadas por linha na ordem de rows
+        starts, ends = indptr[rows], indptr[rows + 1]
+        sizes = ends - starts
+        offsets = np.cumsum(sizes) - sizes
+        group = np.repeat(np.arange(len(rows)), sizes)
+        positions = np.repeat(starts - offsets, sizes) + np.arange(sizes.sum())
+        entry_weights = np.asarray(weights[positions], dtype=np.float64)
+        if not len(positions):
+            return
+
+        # Ordena por (linha, peso decrescente) com uma única chave float: o intervalo de cada
+        # linha é maior que a faixa de pesos, e a ordenação estável preserva a ordem da
+        # adjacência nos empates (bem mais rápido que lexsort com várias chaves)
+        top = entry_weights.max()
+        span = top - entry_weights.min() + 1.0
+        order = np.argsort(group * span + (top - entry_weights), kind='stable')
+        positions = positions[order]
+
+        # Posição de cada entrada dentro da sua linha; mantém apenas as k primeiras
+        rank = np.arange(len(order)) - np.repeat(offsets, sizes)
+        keep = rank < self.k
+        entry_rows = np.repeat(rows, sizes)[keep]
+        self.neighbors[entry_rows, rank[keep]] = indices[positions[keep]]
+        self.weights[entry_rows, rank[keep]] = weights[positions[keep]]
+
+    def row(self, i, top_n=None):
+        """Pares (índice do vizinho, peso) do nó i, limitados a top_n"""
+        neighbors = self.neighbors[i, :top_n]
+        valid = neighbors >= 0
+        return list(zip(neighbors[valid].tolist(), self.weights[i, :top_n][valid].tolist()))
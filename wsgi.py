@@ -0,0 +1,26 @@
+"""Entrada WSGI de produção
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Com preload_app (gunicorn.conf.py) este módulo é importado uma única vez no processo
+principal: o grafo é construído ou carregado do snapshot (arrays mapeados em memória)
+e os dados calculados sob demanda são gerados antes de criar os workers, que os herdam
+pelo fork sem copiar (copy-on-write).
+"""
+import gc
+import logging
+import os
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+
+from app import app, graph_ready, mg
+
+mg.warm_up()
+
+# Os objetos criados até aqui deixam de ser percorridos pelo coletor de lixo; do contrário
+# cada worker escreveria nos cabeçalhos desses objetos e copiaria as páginas compartilhadas
+gc.freeze()
+
+# Só agora o /readyz responde 200 (os workers herdam o Event já marcado)
+graph_ready.set()